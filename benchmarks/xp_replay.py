@@ -0,0 +1,412 @@
+"""Rejeu de trafic synthétique sur le pipeline XP, sans connexion Discord.
+
+    python -m benchmarks.xp_replay --profile medium --output bench.json
+    python -m benchmarks.xp_replay --profile medium --baseline bench.json
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+# Profils de trafic : serveurs, membres par serveur (loi de Zipf), messages, vocal et commandes
+PROFILES: Dict[str, Dict[str, Any]] = {
+    'small': {
+        'guilds': 5, 'users_per_guild': 500, 'zipf_s': 1.1, 'messages': 5000, 'rate': 0,
+        'concurrency': 16, 'cooldown': 0, 'voice_population': 50, 'voice_sweeps': 5, 'voice_churn': 0.05,
+        'command_ratio': 0.02, 'commands': {'rank': 4, 'level': 4, 'scoreboard': 2, 'profile': 1},
+    },
+    'medium': {
+        'guilds': 50, 'users_per_guild': 5000, 'zipf_s': 1.1, 'messages': 50000, 'rate': 0,
+        'concurrency': 64, 'cooldown': 0, 'voice_population': 1000, 'voice_sweeps': 10, 'voice_churn': 0.05,
+        'command_ratio': 0.02, 'commands': {'rank': 4, 'level': 4, 'scoreboard': 2, 'profile': 1},
+    },
+    'large': {
+        'guilds': 200, 'users_per_guild': 20000, 'zipf_s': 1.05, 'messages': 200000, 'rate': 0,
+        'concurrency': 128, 'cooldown': 30, 'voice_population': 10000, 'voice_sweeps': 10, 'voice_churn': 0.05,
+        'command_ratio': 0.01, 'commands': {'rank': 4, 'level': 4, 'scoreboard': 2, 'profile': 1},
+    },
+}
+
+GUILD_BASE = 700000000000000000
+USER_BASE = 300000000000000000
+CHANNEL_BASE = 900000000000000000
+
+
+class FakeRole:
+    def __init__(self, role_id: int):
+        self.id = role_id
+        self.mention = f'<@&{role_id}>'
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild: 'FakeGuild'):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f'<#{channel_id}>'
+        self.members: List[FakeMember] = []
+
+    async def send(self, content=None, **kwargs):
+        pass
+
+
+class FakeMember:
+    def __init__(self, user_id: int, guild: 'FakeGuild'):
+        self.id = user_id
+        self.guild = guild
+        self.bot = False
+        self.name = f'user{user_id % 100000}'
+        self.display_name = self.name
+        self.mention = f'<@{user_id}>'
+        self.roles: List[FakeRole] = []
+
+    async def add_roles(self, *roles):
+        self.roles.extend(roles)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.text_channel = FakeChannel(CHANNEL_BASE + guild_id % 100000 * 10, self)
+        self.voice_channels = [FakeChannel(self.text_channel.id + i, self) for i in range(1, 4)]
+        self.stage_channels: List[FakeChannel] = []
+        self._members: Dict[int, FakeMember] = {}
+
+    def member(self, index: int) -> FakeMember:
+        # Membres créés à la demande : seuls ceux qui parlent occupent de la mémoire
+        user_id = USER_BASE + index
+        member = self._members.get(user_id)
+        if member is None:
+            member = self._members[user_id] = FakeMember(user_id, self)
+        return member
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self._members.get(user_id)
+
+    async def query_members(self, *, user_ids: List[int], limit: int = 5, cache: bool = True) -> List[FakeMember]:
+        return [self._members[user_id] for user_id in user_ids if user_id in self._members]
+
+    def get_channel(self, channel_id: int) -> Optional[FakeChannel]:
+        return self.text_channel if channel_id == self.text_channel.id else None
+
+    def get_role(self, role_id: int) -> FakeRole:
+        return FakeRole(role_id)
+
+
+class FakeMessage:
+    def __init__(self, author: FakeMember, channel: FakeChannel):
+        self.author = author
+        self.guild = author.guild
+        self.channel = channel
+
+
+class FakeVoiceState:
+    def __init__(self, channel: Optional[FakeChannel]):
+        self.channel = channel
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    def is_done(self) -> bool:
+        return self._done
+
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, member: FakeMember):
+        self.user = member
+        self.guild = member.guild
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+    async def original_response(self):
+        return None
+
+
+class FakeBot:
+    def __init__(self, guilds: List[FakeGuild]):
+        self.guilds = guilds
+        self.ready = asyncio.Event()
+
+    def get_user(self, user_id: int):
+        return None
+
+    def is_ready(self) -> bool:
+        return self.ready.is_set()
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'max_ms': round(max(samples, default=0.0) * 1000, 3),
+    }
+
+
+def db_size(path: str) -> int:
+    return sum(os.path.getsize(path + ext) for ext in ('', '-wal') if os.path.exists(path + ext))
+
+
+class Replay:
+    def __init__(self, profile: Dict[str, Any], seed: int, db_path: str):
+        from cogs.xp import XPCog
+
+        self.profile = profile
+        self.random = random.Random(seed)
+        self.guilds = [FakeGuild(GUILD_BASE + i * 7919) for i in range(profile['guilds'])]
+        self.bot = FakeBot(self.guilds)
+        self.cog = XPCog(self.bot, db_path)
+        self.db_path = db_path
+        # Poids cumulés de Zipf : le membre de rang k parle avec une probabilité proportionnelle à 1/k^s
+        s = profile['zipf_s']
+        self.user_weights = list(itertools.accumulate(1 / k ** s for k in range(1, profile['users_per_guild'] + 1)))
+        self.guild_weights = list(itertools.accumulate(1 / k for k in range(1, profile['guilds'] + 1)))
+        commands = profile['commands']
+        self.command_names = list(commands)
+        self.command_weights = list(itertools.accumulate(commands.values()))
+        self.latencies: Dict[str, List[float]] = {}
+        self.lag: List[float] = []
+        self.in_voice: Dict[tuple, FakeChannel] = {}
+
+    def _pick(self, cumulative: List[float]) -> int:
+        return bisect.bisect(cumulative, self.random.random() * cumulative[-1])
+
+    def _random_member(self) -> FakeMember:
+        guild = self.guilds[self._pick(self.guild_weights)]
+        return guild.member(self._pick(self.user_weights))
+
+    async def _timed(self, kind: str, coro):
+        started = time.perf_counter()
+        await coro
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    async def _command(self, name: str, member: FakeMember):
+        cog = self.cog
+        interaction = FakeInteraction(member)
+        # discord.py diffuse on_interaction à la réception de chaque commande
+        await cog.on_interaction(interaction)
+        if name == 'rank':
+            await cog.rank_slash.callback(cog, interaction, 'text', None)
+        elif name == 'level':
+            await cog.level_slash.callback(cog, interaction, None)
+        elif name == 'scoreboard':
+            await cog.scoreboard_slash.callback(cog, interaction, self.random.choice(('text', 'voice', 'messages')))
+        elif name == 'profile':
+            await cog.profile_slash.callback(cog, interaction, None)
+
+    async def _voice_event(self, member: FakeMember):
+        # Arrivée, départ ou changement de salon d'un membre
+        key = (member.guild.id, member.id)
+        before = self.in_voice.get(key)
+        if before is None:
+            after = self.random.choice(member.guild.voice_channels)
+            self.in_voice[key] = after
+        elif self.random.random() < 0.5:
+            after = None
+            del self.in_voice[key]
+        else:
+            after = self.random.choice(member.guild.voice_channels)
+            self.in_voice[key] = after
+        await self.cog.on_voice_state_update(member, FakeVoiceState(before), FakeVoiceState(after))
+
+    def _events(self) -> List[tuple]:
+        profile = self.profile
+        events = []
+        sweep_every = max(1, profile['messages'] // max(1, profile['voice_sweeps']))
+        for i in range(profile['messages']):
+            member = self._random_member()
+            events.append(('message', member))
+            if self.random.random() < profile['command_ratio']:
+                events.append((self.command_names[self._pick(self.command_weights)], self._random_member()))
+            if self.random.random() < profile['voice_churn']:
+                events.append(('voice_state', self._random_member()))
+            if profile['voice_sweeps'] and (i + 1) % sweep_every == 0:
+                events.append(('voice_sweep', None))
+        return events
+
+    async def _monitor_lag(self, interval: float = 0.01):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.lag.append(max(0.0, time.perf_counter() - started - interval))
+
+    async def setup(self):
+        await self.cog.cog_load()
+        # Les boucles périodiques sont pilotées par le rejeu (balayage vocal) ou gardées telles quelles (flush)
+        self.cog.voice_xp_task.cancel()
+        self.cog.history_compaction_task.cancel()
+        self.bot.ready.set()
+        for guild in self.guilds:
+            await self.cog.db.set_cooldown(guild.id, self.profile['cooldown'])
+        # Population vocale initiale
+        for _ in range(self.profile['voice_population']):
+            member = self._random_member()
+            if (member.guild.id, member.id) not in self.in_voice:
+                await self._voice_event(member)
+
+    async def run(self) -> Dict[str, Any]:
+        profile = self.profile
+        events = self._events()
+        await self.setup()
+        await self.cog.db.flush()
+        size_before = db_size(self.db_path)
+        voice_now = int(time.time())
+        cursor = iter(enumerate(events))
+        rate = profile['rate']
+        started = time.perf_counter()
+
+        async def worker():
+            nonlocal voice_now
+            for index, (kind, member) in cursor:
+                if rate:
+                    delay = started + index / rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                if kind == 'message':
+                    await self._timed(kind, self.cog.on_message(FakeMessage(member, member.guild.text_channel)))
+                elif kind == 'voice_state':
+                    await self._timed(kind, self._voice_event(member))
+                elif kind == 'voice_sweep':
+                    # Chaque balayage simule une minute écoulée pour créditer les membres en vocal
+                    voice_now += 60
+                    await self._timed(kind, self.cog.voice.sweep(voice_now))
+                else:
+                    await self._timed(kind, self._command(kind, member))
+
+        monitor = asyncio.create_task(self._monitor_lag())
+        await asyncio.gather(*(worker() for _ in range(profile['concurrency'])))
+        elapsed = time.perf_counter() - started
+        flush_started = time.perf_counter()
+        await self.cog.db.flush()
+        final_flush = time.perf_counter() - flush_started
+        monitor.cancel()
+        size_after = db_size(self.db_path)
+        messages = len(self.latencies.get('message', []))
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'messages_per_s': round(messages / elapsed, 1) if elapsed else 0.0,
+            'events': len(events),
+            'handlers': {kind: summarize(samples) for kind, samples in sorted(self.latencies.items())},
+            'loop_lag': summarize(self.lag),
+            'final_flush_ms': round(final_flush * 1000, 3),
+            'db_bytes_before': size_before,
+            'db_bytes_after': size_after,
+            'db_growth_bytes': size_after - size_before,
+            'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'cooldown': self.cog.cooldowns.stats(),
+            'notifications': self.cog.notifier.stats(),
+            'admission': self.cog.admission.stats(),
+        }
+
+    async def close(self):
+        await self.cog.cog_unload()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    # Écart relatif des indicateurs principaux par rapport à un rejeu précédent
+    lines = []
+    current, previous = result['results'], baseline['results']
+    metrics = [('messages_per_s', current['messages_per_s'], previous['messages_per_s']),
+               ('loop_lag p99_ms', current['loop_lag']['p99_ms'], previous['loop_lag']['p99_ms']),
+               ('db_growth_bytes', current['db_growth_bytes'], previous['db_growth_bytes']),
+               ('peak_rss_mib', current['peak_rss_mib'], previous['peak_rss_mib'])]
+    for kind, stats in current['handlers'].items():
+        if kind in previous['handlers']:
+            metrics.append((f'{kind} p99_ms', stats['p99_ms'], previous['handlers'][kind]['p99_ms']))
+    for name, now, before in metrics:
+        change = f'{(now - before) / before * 100:+.1f}%' if before else 'n/a'
+        lines.append(f'{name:<24} {before:>12} -> {now:>12}  ({change})')
+    return lines
+
+
+async def replay(profile: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='xp_replay_')
+    bench = Replay(profile, seed, os.path.join(workdir, 'xp_replay.db'))
+    try:
+        return await bench.run()
+    finally:
+        await bench.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejeu de trafic synthétique sur le pipeline XP.")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    parser.add_argument('--set', action='append', default=[], metavar='CLÉ=VALEUR',
+                        help="surcharge un paramètre du profil (ex. messages=20000, rate=2000)")
+    parser.add_argument('--env', action='append', default=[], metavar='XP_REGLAGE=VALEUR',
+                        help="réglage de cogs/xp_core/settings.py appliqué avant l'import du bot")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="fichier JSON où enregistrer les résultats")
+    parser.add_argument('--baseline', help="résultats JSON d'un rejeu précédent à comparer")
+    args = parser.parse_args()
+
+    profile = json.loads(json.dumps(PROFILES[args.profile]))
+    for item in args.set:
+        key, _, value = item.partition('=')
+        profile[key] = json.loads(value)
+    for item in args.env:
+        key, _, value = item.partition('=')
+        os.environ[key] = value
+
+    result = {
+        'profile': args.profile,
+        'parameters': profile,
+        'seed': args.seed,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': int(time.time()),
+        'results': asyncio.run(replay(profile, args.seed)),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            print('\n'.join(compare(result, json.load(f))), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
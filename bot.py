@@ -1,9 +1,17 @@
+import time
+_started_at = time.perf_counter()
+
 import os
 from dotenv import load_dotenv
 import discord
 from discord.ext import commands
 import asyncio
-from typing import cast
+import hashlib
+import json
+import signal
+from typing import Any, Dict, List
+
+_imports_done_at = time.perf_counter()
 
 load_dotenv()
 raw_token = os.getenv('DISCORD_TOKEN')
@@ -11,25 +19,111 @@ if not raw_token:
     raise ValueError("Le token Discord n'est pas défini dans le fichier .env.")
 token: str = raw_token
 
+# Extensions du bot ; celles listées dans BOT_LAZY_EXTENSIONS ne sont chargées qu'après le premier ready
+EXTENSIONS = ['cogs.utils', 'cogs.stats', 'cogs.xp']
+LAZY_EXTENSIONS = {name.strip() for name in os.getenv('BOT_LAZY_EXTENSIONS', '').split(',') if name.strip()}
+
+# Empreinte de l'arbre de commandes déjà synchronisé avec Discord
+TREE_HASH_FILE = os.getenv('BOT_TREE_HASH_FILE', '.command_tree.hash')
+
+# Mode mémoire réduite : ni présences, ni chargement des membres au démarrage, seuls les membres
+# en vocal restent en cache ; les noms du classement sont résolus à la demande (query_members)
+LOW_MEMORY = os.getenv('BOT_LOW_MEMORY', '0') == '1'
+
+# Worker du lanceur multi-processus (launcher.py) : shards Discord servis par ce processus
+SHARD_IDS = [int(shard) for shard in os.getenv('BOT_SHARD_IDS', '').split(',') if shard.strip()]
+SHARD_COUNT = int(os.getenv('BOT_SHARD_COUNT', '0') or 0)
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-intents.presences = True
+intents.presences = not LOW_MEMORY
+
+options: Dict[str, Any] = {}
+if LOW_MEMORY:
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    options.update(chunk_guilds_at_startup=False, member_cache_flags=member_cache_flags, max_messages=None)
+if SHARD_IDS:
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_ids=SHARD_IDS,
+                                  shard_count=SHARD_COUNT or max(SHARD_IDS) + 1, **options)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents, **options)
+
+startup_timings: Dict[str, float] = {'imports': _imports_done_at - _started_at}
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+async def load_extensions(names: List[str]):
+    for name in names:
+        started = time.perf_counter()
+        await bot.load_extension(name)
+        startup_timings[name] = time.perf_counter() - started
 
-async def load_cogs():
-    for filename in os.listdir('./cogs'):
-        if filename.endswith('.py'):
-            await bot.load_extension(f'cogs.{filename[:-3]}')
+def syncs_commands() -> bool:
+    # Commandes globales : synchronisées par un seul worker, celui du shard 0
+    return not SHARD_IDS or 0 in SHARD_IDS
+
+def command_tree_hash() -> str:
+    # Forme sérialisée envoyée à Discord par tree.sync(), triée pour être stable d'un démarrage à l'autre
+    payload = sorted((command.to_dict(bot.tree) for command in bot.tree.get_commands()), key=lambda c: (c['type'], c['name']))
+    data = json.dumps({'application_id': bot.application_id, 'commands': payload}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+async def sync_commands_if_changed():
+    if not syncs_commands():
+        return
+    digest = command_tree_hash()
+    try:
+        with open(TREE_HASH_FILE, 'r', encoding='utf-8') as f:
+            previous = f.read().strip()
+    except FileNotFoundError:
+        previous = None
+    if digest == previous:
+        print("[startup] Arbre de commandes inchangé, synchronisation ignorée")
+        return
+    started = time.perf_counter()
+    await bot.tree.sync()
+    startup_timings['sync'] = time.perf_counter() - started
+    with open(TREE_HASH_FILE, 'w', encoding='utf-8') as f:
+        f.write(digest)
+
+async def setup_hook():
+    started = time.perf_counter()
+    await load_extensions([name for name in EXTENSIONS if name not in LAZY_EXTENSIONS])
+    startup_timings['extensions'] = time.perf_counter() - started
+    xp_cog = bot.get_cog('XPCog')
+    if xp_cog is not None:
+        startup_timings['db_init'] = xp_cog.db.init_seconds
+    if not LAZY_EXTENSIONS:
+        await sync_commands_if_changed()
+
+bot.setup_hook = setup_hook
+
+def startup_report() -> str:
+    # Import tardif : les réglages de cogs.xp_core sont lus après load_dotenv()
+    from cogs.xp_core.metrics import rss_bytes
+    parts = [f"{name} {seconds * 1000:.0f} ms" for name, seconds in startup_timings.items()]
+    parts.append(f"RSS {rss_bytes() / 1024 / 1024:.0f} Mio ({'mémoire réduite' if LOW_MEMORY else 'cache complet'}, "
+                 f"{len(bot.users)} utilisateurs en cache)")
+    return "[startup] " + " | ".join(parts)
 
 @bot.event
 async def on_ready():
     print(f'Connecté en tant que {bot.user}!')
-    await bot.tree.sync()
+    # on_ready est rappelé à chaque reconnexion : le travail de démarrage n'est fait qu'une fois
+    if 'first_ready' in startup_timings:
+        return
+    startup_timings['first_ready'] = time.perf_counter() - _started_at
+    if LAZY_EXTENSIONS:
+        started = time.perf_counter()
+        await load_extensions([name for name in EXTENSIONS if name in LAZY_EXTENSIONS])
+        startup_timings['lazy_extensions'] = time.perf_counter() - started
+        await sync_commands_if_changed()
+    print(startup_report())
 
 if __name__ == "__main__":
     async def main():
-        await load_cogs()
-        await bot.start(token)
+        async with bot:
+            # Arrêt demandé par le lanceur : fermeture propre, les cogs vident leurs tampons
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+            await bot.start(token)
     asyncio.run(main())
@@ -0,0 +1,114 @@
+import asyncio
+import math
+import time
+from typing import Optional
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+from .xp_core import settings
+from .xp_core.metrics import REGISTRY, record_handler, rss_bytes, sample_loop_lag, start_http_server
+
+
+def _ms(seconds: Optional[float]) -> str:
+    if seconds is None or math.isnan(seconds):
+        return "-"
+    return "> 5 s" if seconds == float('inf') else f"{seconds * 1000:g} ms"
+
+
+class Stats(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self._lag_task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._previous_check = bot.tree.interaction_check
+        self._previous_error = bot.tree.on_error
+
+    async def cog_load(self):
+        # Chronométrage de toutes les commandes slash : départ au contrôle global de l'arbre,
+        # fin à la complétion ou dans le gestionnaire d'erreurs de l'arbre pour les commandes en échec
+        self.bot.tree.interaction_check = self._interaction_check
+        self.bot.tree.on_error = self._on_tree_error
+        REGISTRY.register_collector('bot', self.collect_metrics)
+        self._lag_task = asyncio.create_task(sample_loop_lag(settings.METRICS_LAG_INTERVAL_MS / 1000))
+        if settings.METRICS_PORT:
+            try:
+                self._server = await start_http_server(settings.METRICS_HOST, settings.METRICS_PORT)
+                print(f"[Stats] Métriques sur http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics")
+            except OSError as e:
+                print(f"[Stats] Erreur: {e}")
+
+    async def cog_unload(self):
+        self.bot.tree.interaction_check = self._previous_check
+        self.bot.tree.on_error = self._previous_error
+        REGISTRY.unregister_collector('bot')
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['metrics_started_at'] = time.perf_counter()
+        return await self._previous_check(interaction)
+
+    async def _on_tree_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        started = interaction.extras.pop('metrics_started_at', None)
+        if started is not None and interaction.command is not None:
+            name = f"/{interaction.command.qualified_name}"
+            record_handler(name, time.perf_counter() - started, interaction.guild)
+            REGISTRY.handler_errors.inc(handler=name)
+        await self._previous_error(interaction, error)
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        started = interaction.extras.pop('metrics_started_at', None)
+        if started is not None:
+            record_handler(f"/{command.qualified_name}", time.perf_counter() - started, interaction.guild)
+
+    def collect_metrics(self):
+        latency = self.bot.latency
+        yield 'xpbot_gateway_latency_seconds', {}, latency if math.isfinite(latency) else None
+        yield 'xpbot_guilds', {}, len(self.bot.guilds)
+        yield 'xpbot_uptime_seconds', {}, time.time() - REGISTRY.started_at
+        yield 'xpbot_asyncio_tasks', {}, len(asyncio.all_tasks())
+        yield 'xpbot_rss_bytes', {}, rss_bytes()
+        yield 'xpbot_cached_users', {}, len(self.bot.users)
+
+    @app_commands.command(name="botstats", description="Statistiques de fonctionnement du bot (admin).")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def botstats_slash(self, interaction: discord.Interaction):
+        try:
+            lines = [f"**Statistiques** — en ligne depuis {int(time.time() - REGISTRY.started_at) // 60} min, "
+                     f"latence gateway {_ms(self.bot.latency)}, "
+                     f"retard de boucle p99 {_ms(REGISTRY.loop_lag.quantile(0.99))}"]
+            handlers = sorted(REGISTRY.handler_latency.series.items(), key=lambda item: item[1].total, reverse=True)
+            lines.append("\n**Handlers** (temps total, nombre, p50 / p99) :")
+            for key, series in handlers[:10]:
+                name = dict(key)['handler']
+                lines.append(f"- {name} : {series.total:.1f} s, {series.count}, "
+                             f"{_ms(REGISTRY.handler_latency.quantile(0.5, handler=name))} / "
+                             f"{_ms(REGISTRY.handler_latency.quantile(0.99, handler=name))}")
+            queries = sorted(REGISTRY.query_latency.series.items(), key=lambda item: item[1].total, reverse=True)
+            lines.append("\n**Requêtes SQL** (temps total, nombre, p99) :")
+            for key, series in queries[:8]:
+                name = dict(key)['query']
+                lines.append(f"- {name} : {series.total:.1f} s, {series.count}, "
+                             f"{_ms(REGISTRY.query_latency.quantile(0.99, query=name))}")
+            lines.append(f"\n**Verrou d'écriture** p99 {_ms(REGISTRY.write_wait.quantile(0.99))}")
+            lines.append("\n**Serveurs les plus coûteux** :")
+            for guild_id, seconds, events in REGISTRY.guild_load.top(5):
+                guild = self.bot.get_guild(guild_id)
+                lines.append(f"- {guild.name if guild else guild_id} : {seconds:.1f} s sur {events} évènements")
+            gauges = ", ".join(f"{name.removeprefix('xpbot_')}{'/' + '/'.join(labels.values()) if labels else ''}="
+                               f"{round(value, 3) if isinstance(value, float) else value}"
+                               for name, labels, value in REGISTRY.gauges() if value is not None)
+            lines.append(f"\n**Jauges** : {gauges}")
+            await interaction.response.send_message("\n".join(lines)[:2000], ephemeral=True)
+        except Exception as e:
+            print(f"[botstats_slash] Erreur: {e}")
+            await interaction.response.send_message("Erreur lors de la récupération des statistiques.", ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(Stats(bot))
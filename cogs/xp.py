@@ -1,165 +1,243 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
-import json
 import os
+import tempfile
 import time
-from typing import Dict, Optional, Union
-from PIL import Image, ImageDraw, ImageFont
+from typing import Optional, Union
 import aiosqlite
 
-from .xp_db import XPDatabase
-
-XP_FILE = 'xp_data.json'
-CONFIG_FILE = 'xp_config.json'
-
-# Chargement et sauvegarde des données XP
-class XPStorage:
-    def __init__(self):
-        self.data = self.load()
-
-    def load(self) -> Dict:
-        if os.path.exists(XP_FILE):
-            with open(XP_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-
-    def save(self):
-        with open(XP_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-
-    def add_xp(self, user_id: str, amount: int, mode: str) -> int:
-        if user_id not in self.data:
-            self.data[user_id] = {"text": 0, "voice": 0, "messages": 0, "voice_time": 0, "text_level": 1, "voice_level": 1}
-        self.data[user_id][mode] += amount
-        # Calcul du niveau (exponentiel)
-        xp_total = self.data[user_id][mode]
-        level = 1
-        while xp_total >= 50 * (level ** 2):
-            level += 1
-        if level > self.data[user_id].get(f"{mode}_level", 1):
-            self.data[user_id][f"{mode}_level"] = level
-            self.save()
-            return level  # Level up
-        self.data[user_id][f"{mode}_level"] = level
-        self.save()
-        return 0  # Pas de level up
-
-    def add_message(self, user_id: str):
-        if user_id not in self.data:
-            self.data[user_id] = {"text": 0, "voice": 0, "messages": 0, "voice_time": 0, "text_level": 1, "voice_level": 1}
-        self.data[user_id]["messages"] = self.data[user_id].get("messages", 0) + 1
-        self.save()
-
-    def add_voice_time(self, user_id: str, minutes: int):
-        if user_id not in self.data:
-            self.data[user_id] = {"text": 0, "voice": 0, "messages": 0, "voice_time": 0, "text_level": 1, "voice_level": 1}
-        self.data[user_id]["voice_time"] = self.data[user_id].get("voice_time", 0) + minutes
-        self.save()
-
-    def get_xp(self, user_id: str, mode: str) -> int:
-        return self.data.get(user_id, {}).get(mode, 0)
-
-    def get_level(self, user_id: str, mode: str) -> int:
-        return self.data.get(user_id, {}).get(f"{mode}_level", 1)
-
-    def get_messages(self, user_id: str) -> int:
-        return self.data.get(user_id, {}).get("messages", 0)
-
-    def get_voice_time(self, user_id: str) -> int:
-        return self.data.get(user_id, {}).get("voice_time", 0)
-
-    def get_leaderboard(self, mode: str):
-        if mode == "text":
-            return sorted(self.data.items(), key=lambda x: x[1].get("text", 0), reverse=True)
-        elif mode == "voice":
-            return sorted(self.data.items(), key=lambda x: x[1].get("voice", 0), reverse=True)
-        elif mode == "messages":
-            return sorted(self.data.items(), key=lambda x: x[1].get("messages", 0), reverse=True)
-        elif mode == "voice_time":
-            return sorted(self.data.items(), key=lambda x: x[1].get("voice_time", 0), reverse=True)
-        else:
-            return []
-
-class ConfigStorage:
-    def __init__(self):
-        self.data = self.load()
-
-    def load(self) -> Dict:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-
-    def save(self):
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-
-    def get_cooldown(self, guild_id: str) -> int:
-        return self.data.get(guild_id, {}).get('cooldown', 30)
-
-    def set_cooldown(self, guild_id: str, value: int):
-        if guild_id not in self.data:
-            self.data[guild_id] = {}
-        self.data[guild_id]['cooldown'] = value
-        self.save()
-
-    def get_notify_channel(self, guild_id: str) -> Optional[int]:
-        return self.data.get(guild_id, {}).get('notify_channel')
-
-    def set_notify_channel(self, guild_id: str, channel_id: int):
-        if guild_id not in self.data:
-            self.data[guild_id] = {}
-        self.data[guild_id]['notify_channel'] = channel_id
-        self.save()
+from .xp_db import DB_PATH, RemoteXPDatabase, XPDatabase
+from .xp_core import settings
+from .xp_core.admission import AdmissionController
+from .xp_core.cooldown import CooldownTracker
+from .xp_core.levels import LEVEL_BASE, LEVEL_EXPONENT, MAX_LEVEL_BASE, MAX_LEVEL_EXPONENT
+from .xp_core.metrics import REGISTRY, instrumented
+from .xp_core.names import NameResolver
+from .xp_core.notify import LevelUp, LevelUpDispatcher
+from .xp_core.render import ProfileRenderer
+from .xp_core.restore import POLICIES
+from .xp_core.voice import VoiceTracker
+from .xp_core.views import ScoreboardView
+
+# Titre et format des valeurs de chaque classement
+SCOREBOARD_FORMATS = {
+    "messages": ("Messages", lambda value: f"{value} messages"),
+    "voice_time": ("Vocal (heures)", lambda value: f"{round(value / 60, 2)} heures"),
+    "text": ("XP Texte", lambda value: f"{value} XP"),
+    "voice": ("XP Vocal", lambda value: f"{value} XP"),
+}
+
+# Fenêtre de chaque classement (option period de /scoreboard)
+SCOREBOARD_PERIODS = {
+    "all": "",
+    "week": " de la semaine",
+    "month": " du mois",
+}
 
 class XPCog(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, db_path: str = DB_PATH):
         self.bot = bot
-        self.db = XPDatabase(bot)
-        self.voice_tracking = {}
+        # Worker du lanceur multi-processus : écritures confiées au processus de stockage
+        self.db = RemoteXPDatabase(bot, db_path) if settings.STORAGE_SOCKET else XPDatabase(bot, db_path)
+        # Gains passifs mis en attente en cas de surcharge, commandes slash prioritaires
+        self.admission = AdmissionController(self._settle_deferred)
+        self.voice = VoiceTracker(self.db, record=self._record_xp)
+        self.cooldowns = CooldownTracker()
+        self.renderer = ProfileRenderer()
+        self.names = NameResolver()
         self.voice_xp_task.start()
+        self.flush_task.start()
+        self.history_compaction_task.start()
         self.levelup_roles = {5: 123456789012345678, 10: 234567890123456789}  # exemple: {niveau: role_id}
+        self.notifier = LevelUpDispatcher(self.levelup_roles)
 
     async def cog_load(self):
         await self.db.init()
+        self.notifier.start()
+        self.admission.start()
+        REGISTRY.register_collector('xp', self.collect_metrics)
+        # Extension chargée après le premier ready : les sessions vocales sont reconstruites tout de suite
+        if self.bot.is_ready():
+            await self.on_ready()
+
+    async def cog_unload(self):
+        REGISTRY.unregister_collector('xp')
+        self.voice_xp_task.cancel()
+        self.flush_task.cancel()
+        self.history_compaction_task.cancel()
+        self.renderer.close()
+        await self.admission.close()
+        await self.notifier.close()
+        await self.db.close()
+
+    def collect_metrics(self):
+        # Jauges lues au moment de la collecte : files d'attente, caches et compteurs des composants
+        yield 'xpbot_write_buffer_pending', {}, len(self.db.buffer.pending)
+        yield 'xpbot_write_buffer_events', {}, self.db.buffer.events
+        yield 'xpbot_totals_cached', {}, len(self.db.buffer.totals)
+        yield 'xpbot_totals_hits', {}, self.db.buffer.hits
+        yield 'xpbot_totals_misses', {}, self.db.buffer.misses
+        for pool in self.db.shards.pools:
+            yield 'xpbot_db_idle_readers', {'shard': os.path.basename(pool.db_path)}, pool.idle_readers
+        yield 'xpbot_schema_version', {}, self.db.schema_version
+        yield 'xpbot_voice_sessions', {}, len(self.voice.sessions)
+        if isinstance(self.db, RemoteXPDatabase):
+            yield 'xpbot_storage_calls', {}, self.db.storage.calls
+            yield 'xpbot_storage_failures', {}, self.db.storage.failures
+            yield 'xpbot_storage_outbox', {}, self.db.pending_batches
+        for name, cache in (('members', self.db.buffer), ('rank', self.db.rank_cache),
+                            ('config', self.db.config_cache), ('scoreboard', self.db.scoreboard.entries),
+                            ('render', self.renderer.cache), ('names', self.names.cache)):
+            stats = cache.stats()
+            yield 'xpbot_cache_size', {'cache': name}, stats['size']
+            yield 'xpbot_cache_hit_ratio', {'cache': name}, stats['hit_ratio']
+        for key, value in self.cooldowns.stats().items():
+            yield f'xpbot_cooldown_{key}', {}, value
+        for key, value in self.admission.stats().items():
+            yield f'xpbot_admission_{key}', {}, value
+        for key, value in self.notifier.stats().items():
+            yield f'xpbot_levelup_{key}', {}, value
+        yield 'xpbot_name_queries', {}, self.names.queries
+        yield 'xpbot_name_query_failures', {}, self.names.failures
 
     @commands.Cog.listener()
+    @instrumented('on_message')
     async def on_message(self, message):
         if message.author.bot or not message.guild:
             return
-        user_id = str(message.author.id)
-        guild_id = str(message.guild.id)
-        await self.db.add_message(user_id, guild_id)
-        level_up = await self.db.add_xp(user_id, guild_id, 5, "text")
-        await self.db.log_xp_history(user_id, guild_id, "text", 5)
+        user_id = message.author.id
+        guild_id = message.guild.id
+        # Anti-spam : un message encore sous cooldown est ignoré sans aucun accès à la base
+        now = time.monotonic()
+        if not self.cooldowns.acquire((guild_id, user_id), now):
+            return
+        try:
+            self.cooldowns.commit((guild_id, user_id), await self.db.get_cooldown(guild_id), now)
+        except Exception:
+            self.cooldowns.release((guild_id, user_id))
+            raise
+        level_up = await self._record_xp(user_id, guild_id, 5, "text", messages=1, channel_id=message.channel.id)
         if level_up:
-            notify_channel_id = await self.db.get_notify_channel(guild_id)
-            channel = message.guild.get_channel(notify_channel_id) if notify_channel_id else message.channel
-            await channel.send(f"🎉 {message.author.mention} passe niveau {await self.db.get_level(user_id, guild_id, 'text')} en texte !")
-            # Attribution de rôle si palier atteint
-            if level_up in self.levelup_roles:
-                role = message.guild.get_role(self.levelup_roles[level_up])
-                if role:
-                    await message.author.add_roles(role)
-                    await channel.send(f"{message.author.mention} a débloqué le rôle {role.mention} !")
+            await self._announce_level_up(message.guild, message.author, message.channel, level_up)
+
+    async def _record_xp(self, user_id: int, guild_id: int, amount: int, mode: str,
+                         messages: int = 0, voice_time: int = 0, channel_id: Optional[int] = None) -> int:
+        # Surcharge : le gain rejoint l'arriéré sans aucun accès à la base, il sera crédité plus tard
+        if not self.admission.admit():
+            self.admission.defer(guild_id, user_id, mode, amount, messages, voice_time, channel_id)
+            return 0
+        try:
+            return await self.db.record_xp(user_id, guild_id, amount, mode, messages=messages, voice_time=voice_time)
+        finally:
+            self.admission.release()
+
+    async def _announce_level_up(self, guild, member, fallback_channel, level: int):
+        # Lectures servies par les caches ; l'annonce et les rôles partent en arrière-plan
+        notify_channel_id = await self.db.get_notify_channel(guild.id)
+        channel = (guild.get_channel(notify_channel_id) if notify_channel_id else None) or fallback_channel
+        notify = await self.db.get_notify_enabled(member.id, guild.id)
+        if channel is not None:
+            self.notifier.submit(LevelUp(channel, member, level, notify))
+
+    async def _settle_deferred(self, items):
+        # Totaux chargés en quelques requêtes, puis un seul crédit par membre et par mode ;
+        # chaque mode crédité est remis à zéro : une erreur plus loin ne le remet pas en attente
+        await self.db.preload_totals([(user_id, guild_id) for (guild_id, user_id), _ in items])
+        for (guild_id, user_id), entry in items:
+            if entry.voice_xp or entry.voice_time:
+                await self.db.record_xp(user_id, guild_id, entry.voice_xp, "voice", voice_time=entry.voice_time)
+                entry.voice_xp = entry.voice_time = 0
+            if not (entry.text_xp or entry.messages):
+                continue
+            level_up = await self.db.record_xp(user_id, guild_id, entry.text_xp, "text", messages=entry.messages)
+            entry.text_xp = entry.messages = 0
+            guild = self.bot.get_guild(guild_id)
+            if not level_up or guild is None:
+                continue
+            channel = guild.get_channel(entry.channel_id) if entry.channel_id else None
+            try:
+                # Membre absent du cache (mode mémoire réduite) : demandé à l'API, les level-ups sont rares
+                member = guild.get_member(user_id) or await guild.fetch_member(user_id)
+                await self._announce_level_up(guild, member, channel, level_up)
+            except discord.NotFound:
+                # Parti du serveur entre-temps : le niveau est crédité sans annonce
+                continue
+            except Exception as e:
+                # Le gain est déjà crédité : une erreur d'annonce ne doit pas le remettre en attente
+                print(f"[settle_deferred] Erreur: {e}")
+
+    @staticmethod
+    def _interaction_member(interaction: discord.Interaction) -> Optional[discord.Member]:
+        # Dans un serveur, l'auteur d'une interaction est un Member complet tiré du payload, même hors cache
+        if isinstance(interaction.user, discord.Member):
+            return interaction.user
+        return interaction.guild.get_member(interaction.user.id)
 
     @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        # Reçue en même temps que la commande : les gains passifs lui laissent la place
+        self.admission.note_interaction()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Reconstruit les sessions à partir des salons vocaux (démarrage ou reconnexion)
+        present = {}
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels + guild.stage_channels:
+                for member in channel.members:
+                    if not member.bot:
+                        present[(guild.id, member.id)] = channel.id
+        try:
+            await self.voice.sync(present, guild_ids={guild.id for guild in self.bot.guilds})
+        except Exception as e:
+            print(f"[voice sync] Erreur: {e}")
+
+    @commands.Cog.listener()
+    @instrumented('on_voice_state_update')
     async def on_voice_state_update(self, member, before, after):
         if member.bot:
             return
+        guild_id = member.guild.id
+        user_id = member.id
         if after.channel and not before.channel:
-            self.voice_tracking[member.id] = str(member.guild.id)
+            await self.voice.join(guild_id, user_id, after.channel.id)
         elif before.channel and not after.channel:
-            self.voice_tracking.pop(member.id, None)
+            await self.voice.leave(guild_id, user_id)
+        elif before.channel and after.channel and before.channel.id != after.channel.id:
+            await self.voice.move(guild_id, user_id, after.channel.id)
 
-    @tasks.loop(minutes=1)
+    @tasks.loop(minutes=settings.VOICE_SWEEP_MINUTES)
+    @instrumented('voice_xp_task')
     async def voice_xp_task(self):
-        for user_id in list(self.voice_tracking.keys()):
-            guild_id = self.voice_tracking[user_id]
-            await self.db.add_xp(str(user_id), guild_id, 10, "voice")
-            await self.db.add_voice_time(str(user_id), guild_id, 1)
-            await self.db.log_xp_history(str(user_id), guild_id, "voice", 10)
+        try:
+            await self.voice.sweep()
+        except Exception as e:
+            print(f"[voice_xp_task] Erreur: {e}")
+
+    @voice_xp_task.before_loop
+    async def before_voice_xp(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=settings.FLUSH_INTERVAL_SECONDS)
+    @instrumented('flush_task')
+    async def flush_task(self):
+        try:
+            await self.db.flush()
+        except Exception as e:
+            print(f"[flush_task] Erreur: {e}")
+
+    @tasks.loop(hours=1)
+    @instrumented('history_compaction_task')
+    async def history_compaction_task(self):
+        try:
+            await self.db.compact_history()
+        except Exception as e:
+            print(f"[history_compaction_task] Erreur: {e}")
+
+    @history_compaction_task.before_loop
+    async def before_history_compaction(self):
+        await self.bot.wait_until_ready()
 
     @app_commands.command(name="notifyxp", description="Active ou désactive les notifications de level-up pour vous.")
     async def notifyxp_slash(self, interaction: discord.Interaction, enabled: bool):
@@ -167,8 +245,8 @@ class XPCog(commands.Cog):
             if not interaction.guild:
                 await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
                 return
-            user_id = str(interaction.user.id)
-            guild_id = str(interaction.guild.id)
+            user_id = interaction.user.id
+            guild_id = interaction.guild.id
             await self.db.set_notify_enabled(user_id, guild_id, enabled)
             await interaction.response.send_message(f"Notifications de level-up {'activées' if enabled else 'désactivées'}.", ephemeral=True)
         except Exception as e:
@@ -181,38 +259,105 @@ class XPCog(commands.Cog):
             if not interaction.guild:
                 await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
                 return
-            resolved_member = member or interaction.guild.get_member(interaction.user.id)
+            resolved_member = member or self._interaction_member(interaction)
             if not resolved_member:
                 await interaction.response.send_message("Impossible de trouver le membre.", ephemeral=True)
                 return
-            guild_id = str(interaction.guild.id)
-            leaderboard = await self.db.get_leaderboard(guild_id, mode)
-            user_id = str(resolved_member.id)
-            rank = next((i+1 for i, (uid, _) in enumerate(leaderboard) if uid == user_id), None)
+            guild_id = interaction.guild.id
+            user_id = resolved_member.id
+            rank = await self.db.get_rank(user_id, guild_id, mode)
             if rank:
-                await interaction.response.send_message(f"{resolved_member.display_name} est classé #{rank} en mode {mode}.")
+                await interaction.response.send_message(f"{resolved_member.display_name} est classé #{rank[0]} sur {rank[1]} en mode {mode}.")
             else:
-                await interaction.response.send_message(f"{resolved_member.display_name} n'est pas classé dans le top {len(leaderboard)} en mode {mode}.")
+                await interaction.response.send_message(f"{resolved_member.display_name} n'est pas classé en mode {mode}.")
         except Exception as e:
             print(f"[rank_slash] Erreur: {e}")
             await interaction.response.send_message("Erreur lors de la récupération du rang.", ephemeral=True)
 
-    @app_commands.command(name="backupxp", description="Exporte la base de données XP.")
+    @app_commands.command(name="backupxp", description="Exporte les données XP de ce serveur.")
     @app_commands.checks.has_permissions(administrator=True)
-    async def backupxp_slash(self, interaction: discord.Interaction):
+    async def backupxp_slash(self, interaction: discord.Interaction, compression: bool = True):
         try:
-            backup_path = f"xp_backup_{int(time.time())}.db"
-            await self.db.backup(backup_path)
-            if os.path.exists(backup_path):
-                with open(backup_path, 'rb') as f:
-                    file = discord.File(f, filename=backup_path)
-                    await interaction.response.send_message("Backup de la base de données XP :", file=file, ephemeral=True)
-                os.remove(backup_path)
-            else:
-                await interaction.response.send_message("Erreur lors de la création du backup.", ephemeral=True)
+            if not interaction.guild:
+                await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
+                return
+            # La sauvegarde peut dépasser le délai de réponse de 3 secondes
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            backup = await self.db.backup_to_buffer(interaction.guild.id, compression)
+            filename = f"xp_backup_{interaction.guild.id}_{int(time.time())}.db" + (".gz" if compression else "")
+            with backup:
+                await interaction.followup.send("Backup de la base de données XP :", file=discord.File(backup, filename=filename), ephemeral=True)
         except Exception as e:
             print(f"[backupxp_slash] Erreur: {e}")
-            await interaction.response.send_message("Erreur lors de l'export de la base de données.", ephemeral=True)
+            if interaction.response.is_done():
+                await interaction.followup.send("Erreur lors de l'export de la base de données.", ephemeral=True)
+            else:
+                await interaction.response.send_message("Erreur lors de l'export de la base de données.", ephemeral=True)
+
+    @app_commands.command(name="importxp", description="Fusionne une sauvegarde XP de ce serveur (replace, max ou sum).")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def importxp_slash(self, interaction: discord.Interaction, file: discord.Attachment, policy: str = "max"):
+        if not interaction.guild:
+            await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
+            return
+        if policy not in POLICIES:
+            await interaction.response.send_message(f"Politique inconnue. Valeurs possibles : {', '.join(POLICIES)}.", ephemeral=True)
+            return
+        fd, path = tempfile.mkstemp(prefix="xp_import_", suffix=".db")
+        os.close(fd)
+        try:
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            await file.save(path)
+            # Seules les données de ce serveur sont fusionnées, les autres serveurs de la sauvegarde sont ignorés
+            result = await self.db.import_db(path, policy,
+                                             lambda table, rows: print(f"[importxp] {table} : {rows} lignes fusionnées"),
+                                             [interaction.guild.id])
+            summary = "\n".join(f"- {table} : {rows} lignes" for table, rows in result.items())
+            await interaction.followup.send(f"Import terminé (politique {policy}) :\n{summary}", ephemeral=True)
+        except ValueError as e:
+            # Base source invalide (schéma, version)
+            await interaction.followup.send(f"Import refusé : {e}", ephemeral=True)
+        except Exception as e:
+            print(f"[importxp_slash] Erreur: {e}")
+            if interaction.response.is_done():
+                await interaction.followup.send("Erreur lors de l'import de la base de données.", ephemeral=True)
+            else:
+                await interaction.response.send_message("Erreur lors de l'import de la base de données.", ephemeral=True)
+        finally:
+            os.remove(path)
+
+    @app_commands.command(name="importjson", description="Importe les anciens fichiers JSON d'XP et de configuration.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def importjson_slash(self, interaction: discord.Interaction, xp_file: Optional[discord.Attachment] = None,
+                               config_file: Optional[discord.Attachment] = None):
+        if not interaction.guild:
+            await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
+            return
+        if not xp_file and not config_file:
+            await interaction.response.send_message("Joignez au moins un fichier (xp_data.json ou xp_config.json).", ephemeral=True)
+            return
+        paths = {}
+        try:
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            for name, attachment in (("xp", xp_file), ("config", config_file)):
+                if attachment:
+                    fd, paths[name] = tempfile.mkstemp(prefix=f"xp_import_{name}_", suffix=".json")
+                    os.close(fd)
+                    await attachment.save(paths[name])
+            result = await self.db.import_legacy_json(paths.get("xp"), paths.get("config"), interaction.guild.id,
+                                                      lambda label, rows: print(f"[importjson] {label} : {rows} lignes importées"))
+            summary = "\n".join(f"- {label} : {stats['rows']} lignes fusionnées, {stats['skipped']} ignorées"
+                                 for label, stats in result.items())
+            await interaction.followup.send(f"Import terminé :\n{summary}", ephemeral=True)
+        except Exception as e:
+            print(f"[importjson_slash] Erreur: {e}")
+            if interaction.response.is_done():
+                await interaction.followup.send("Erreur lors de l'import des fichiers JSON.", ephemeral=True)
+            else:
+                await interaction.response.send_message("Erreur lors de l'import des fichiers JSON.", ephemeral=True)
+        finally:
+            for path in paths.values():
+                os.remove(path)
 
     @app_commands.command(name="level", description="Affiche votre niveau et XP.")
     async def level_slash(self, interaction: discord.Interaction, member: Optional[discord.Member] = None):
@@ -220,15 +365,16 @@ class XPCog(commands.Cog):
             if not interaction.guild:
                 await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
                 return
-            resolved_member = member or interaction.guild.get_member(interaction.user.id)
+            resolved_member = member or self._interaction_member(interaction)
             if not resolved_member:
                 await interaction.response.send_message("Impossible de trouver le membre.", ephemeral=True)
                 return
-            text_xp = await self.db.get_xp(str(resolved_member.id), str(interaction.guild.id), "text")
-            voice_xp = await self.db.get_xp(str(resolved_member.id), str(interaction.guild.id), "voice")
-            text_level = await self.db.get_level(str(resolved_member.id), str(interaction.guild.id), "text")
-            voice_level = await self.db.get_level(str(resolved_member.id), str(interaction.guild.id), "voice")
-            await interaction.response.send_message(f"{resolved_member.display_name} - Texte: {text_xp} XP (Niveau {text_level}) | Vocal: {voice_xp} XP (Niveau {voice_level})")
+            # Une seule lecture, servie par le cache des totaux pour les membres actifs
+            stats = await self.db.get_member_stats(resolved_member.id, interaction.guild.id)
+            curve = self.db.curve_for(interaction.guild.id)
+            await interaction.response.send_message(
+                f"{resolved_member.display_name} - Texte: {stats.text_xp} XP (Niveau {stats.text_level}, prochain dans {curve.xp_to_next_level(stats.text_xp)} XP)"
+                f" | Vocal: {stats.voice_xp} XP (Niveau {stats.voice_level}, prochain dans {curve.xp_to_next_level(stats.voice_xp)} XP)")
         except Exception as e:
             print(f"[level_slash] Erreur: {e}")
             await interaction.response.send_message("Erreur lors de la récupération du niveau.", ephemeral=True)
@@ -239,30 +385,32 @@ class XPCog(commands.Cog):
             if not interaction.guild:
                 await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
                 return
-            resolved_member = member or interaction.guild.get_member(interaction.user.id)
+            resolved_member = member or self._interaction_member(interaction)
             if not resolved_member:
                 await interaction.response.send_message("Impossible de trouver le membre.", ephemeral=True)
                 return
-            text_xp = await self.db.get_xp(str(resolved_member.id), str(interaction.guild.id), "text")
-            text_level = await self.db.get_level(str(resolved_member.id), str(interaction.guild.id), "text")
-            img = Image.new('RGB', (400, 100), color=(73, 109, 137))
-            d = ImageDraw.Draw(img)
-            font = ImageFont.load_default()
-            d.text((10,10), f"{resolved_member.display_name}", font=font, fill=(255,255,0))
-            d.text((10,40), f"Niveau: {text_level}", font=font, fill=(255,255,255))
-            d.text((10,70), f"XP: {text_xp}", font=font, fill=(255,255,255))
-            img_path = f"profile_{resolved_member.id}.png"
-            img.save(img_path)
-            with open(img_path, 'rb') as f:
-                file = discord.File(f, filename=img_path)
-                await interaction.response.send_message(file=file)
-            os.remove(img_path)
+            stats = await self.db.get_member_stats(resolved_member.id, interaction.guild.id)
+            card = await self.renderer.render(resolved_member.id, resolved_member.display_name, stats.text_level, stats.text_xp,
+                                              self.db.curve_for(interaction.guild.id))
+            await interaction.response.send_message(file=discord.File(card, filename=f"profile_{resolved_member.id}.png"))
         except Exception as e:
             print(f"[profile_slash] Erreur: {e}")
             await interaction.response.send_message("Erreur lors de la génération du profil.", ephemeral=True)
 
+    async def _format_scoreboard(self, guild, mode: str, period: str, rows, page: int) -> str:
+        title, fmt = SCOREBOARD_FORMATS[mode]
+        title += SCOREBOARD_PERIODS[period]
+        size = settings.SCOREBOARD_PAGE_SIZE
+        # Seuls les membres de la page sont résolus, sans dépendre du cache complet des membres
+        names = await self.names.resolve(guild, [user_id for user_id, _ in rows])
+        msg = f"Top {size} {title} :\n" if page == 0 else f"{title} (page {page + 1}) :\n"
+        for i, (user_id, value) in enumerate(rows, page * size + 1):
+            name = names.get(user_id) or user_id
+            msg += f"{i}. {name}: {fmt(value)}\n"
+        return msg
+
     @app_commands.command(name="scoreboard", description="Affiche le classement XP/messages/vocal.")
-    async def scoreboard_slash(self, interaction: discord.Interaction, mode: str = "text"):
+    async def scoreboard_slash(self, interaction: discord.Interaction, mode: str = "text", period: str = "all"):
         try:
             if not interaction.guild:
                 await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
@@ -270,34 +418,16 @@ class XPCog(commands.Cog):
             if mode not in ("text", "voice", "messages", "voice_time"):
                 await interaction.response.send_message("Mode invalide. Utilisez 'text', 'voice', 'messages' ou 'voice_time'.", ephemeral=True)
                 return
-            guild_id = str(interaction.guild.id)
-            leaderboard = await self.db.get_leaderboard(guild_id, mode)
-            if mode == "messages":
-                msg = f"Top 10 Messages :\n"
-                for i, (user_id, value) in enumerate(leaderboard, 1):
-                    user = self.bot.get_user(int(user_id))
-                    name = user.name if user else user_id
-                    msg += f"{i}. {name}: {value} messages\n"
-            elif mode == "voice_time":
-                msg = f"Top 10 Vocal (heures) :\n"
-                for i, (user_id, value) in enumerate(leaderboard, 1):
-                    user = self.bot.get_user(int(user_id))
-                    name = user.name if user else user_id
-                    hours = round(value / 60, 2)
-                    msg += f"{i}. {name}: {hours} heures\n"
-            elif mode == "text":
-                msg = f"Top 10 XP Texte :\n"
-                for i, (user_id, value) in enumerate(leaderboard, 1):
-                    user = self.bot.get_user(int(user_id))
-                    name = user.name if user else user_id
-                    msg += f"{i}. {name}: {value} XP\n"
-            elif mode == "voice":
-                msg = f"Top 10 XP Vocal :\n"
-                for i, (user_id, value) in enumerate(leaderboard, 1):
-                    user = self.bot.get_user(int(user_id))
-                    name = user.name if user else user_id
-                    msg += f"{i}. {name}: {value} XP\n"
-            await interaction.response.send_message(msg)
+            if period not in SCOREBOARD_PERIODS:
+                await interaction.response.send_message("Période invalide. Utilisez 'all', 'week' ou 'month'.", ephemeral=True)
+                return
+            guild_id = interaction.guild.id
+            leaderboard = await self.db.get_top(guild_id, mode, period)
+            view = ScoreboardView(self.db, guild_id, mode, interaction.user.id, leaderboard,
+                                  lambda rows, page: self._format_scoreboard(interaction.guild, mode, period, rows, page),
+                                  settings.SCOREBOARD_PAGE_SIZE, period=period)
+            await interaction.response.send_message(await self._format_scoreboard(interaction.guild, mode, period, leaderboard, 0), view=view)
+            view.message = await interaction.original_response()
         except Exception as e:
             print(f"[scoreboard_slash] Erreur: {e}")
             await interaction.response.send_message("Erreur lors de la récupération du classement.", ephemeral=True)
@@ -308,8 +438,9 @@ class XPCog(commands.Cog):
         if not interaction.guild:
             await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
             return
-        guild_id = str(interaction.guild.id)
+        guild_id = interaction.guild.id
         await self.db.set_cooldown(guild_id, seconds)
+        self.cooldowns.clear_guild(guild_id)
         await interaction.response.send_message(f"Cooldown anti-spam XP défini à {seconds} secondes.")
 
     @app_commands.command(name="setnotif", description="Configure le salon de notification de level up")
@@ -318,10 +449,30 @@ class XPCog(commands.Cog):
         if not interaction.guild:
             await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
             return
-        guild_id = str(interaction.guild.id)
+        guild_id = interaction.guild.id
         await self.db.set_notify_channel(guild_id, channel.id)
         await interaction.response.send_message(f"Salon de notification défini sur {channel.mention}.")
 
+    @app_commands.command(name="setlevelcurve", description="Configure la courbe de progression des niveaux (admin)")
+    @app_commands.describe(base="XP du niveau 2 (défaut 50)", exponent="Exposant de la courbe : 1 linéaire, 2 quadratique (défaut)...")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def setlevelcurve_slash(self, interaction: discord.Interaction, base: int = LEVEL_BASE, exponent: int = LEVEL_EXPONENT):
+        if not interaction.guild:
+            await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
+            return
+        if not 1 <= base <= MAX_LEVEL_BASE or not 1 <= exponent <= MAX_LEVEL_EXPONENT:
+            await interaction.response.send_message(
+                f"Courbe invalide : base entre 1 et {MAX_LEVEL_BASE}, exposant entre 1 et {MAX_LEVEL_EXPONENT}.", ephemeral=True)
+            return
+        try:
+            await self.db.set_level_curve(interaction.guild.id, base, exponent)
+            await interaction.response.send_message(
+                f"Courbe de niveaux définie : {base} × (niveau - 1)^{exponent} XP. "
+                "Les niveaux des membres sont recalculés en arrière-plan.")
+        except Exception as e:
+            print(f"[setlevelcurve_slash] Erreur: {e}")
+            await interaction.response.send_message("Erreur lors de la configuration de la courbe.", ephemeral=True)
+
     @app_commands.command(name="xp", description="Informations sur le système d'XP.")
     async def xpinfo_slash(self, interaction: discord.Interaction):
         xp_text = (
@@ -339,11 +490,15 @@ class XPCog(commands.Cog):
         help_text = (
             "**Commandes principales : **\n"
             "/level [membre] — Affiche le niveau et l'XP d'un membre.\n"
-            "/scoreboard [text|voice|messages|voice_time] — Affiche le classement XP/messages/vocal.\n"
+            "/scoreboard [text|voice|messages|voice_time] [all|week|month] — Affiche le classement XP/messages/vocal, général, de la semaine ou du mois.\n"
             "/profile [membre] — Affiche une image de profil XP.\n"
             "/xp — Informations sur le système d'XP.\n"
             "/setcooldown <secondes> — Configure le cooldown anti-spam XP (admin).\n"
             "/setnotif <salon> — Configure le salon de notification de level up (admin).\n"
+            "/setlevelcurve [base] [exposant] — Configure la courbe de progression des niveaux (admin).\n"
+            "/botstats — Statistiques de fonctionnement du bot (admin).\n"
+            "/importxp <file> [replace|max|sum] — Fusionne une sauvegarde XP (admin).\n"
+            "/importjson [xp_file] [config_file] — Importe les anciens fichiers JSON (admin).\n"
         )
         await interaction.response.send_message(help_text, ephemeral=True)
 
@@ -357,8 +512,9 @@ class XPCog(commands.Cog):
             if confirmation != "oui":
                 await interaction.response.send_message(f"⚠️ Cette action va supprimer définitivement l'XP de {member.display_name}.\nPour confirmer, relancez la commande avec le paramètre confirmation=oui.", ephemeral=True)
                 return
-            user_id = str(member.id)
-            guild_id = str(interaction.guild.id)
+            user_id = member.id
+            guild_id = interaction.guild.id
+            self.admission.discard(guild_id, user_id)
             await self.db.reset_user(user_id, guild_id)
             await interaction.response.send_message(f"XP de {member.display_name} réinitialisé.", ephemeral=True)
         except Exception as e:
@@ -371,12 +527,12 @@ class XPCog(commands.Cog):
             if not interaction.guild:
                 await interaction.response.send_message("Cette commande doit être utilisée dans un serveur.", ephemeral=True)
                 return
-            resolved_member = member or interaction.guild.get_member(interaction.user.id)
+            resolved_member = member or self._interaction_member(interaction)
             if not resolved_member:
                 await interaction.response.send_message("Impossible de trouver le membre.", ephemeral=True)
                 return
-            user_id = str(resolved_member.id)
-            guild_id = str(interaction.guild.id)
+            user_id = resolved_member.id
+            guild_id = interaction.guild.id
             history = await self.db.get_xp_history(user_id, guild_id, mode)
             if not history:
                 await interaction.response.send_message("Aucun historique d'XP trouvé.", ephemeral=True)
@@ -392,6 +548,5 @@ class XPCog(commands.Cog):
             await interaction.response.send_message("Erreur lors de la récupération de l'historique.", ephemeral=True)
 
 async def setup(bot):
-    cog = XPCog(bot)
-    await cog.cog_load()
-    await bot.add_cog(cog)
+    # add_cog appelle lui-même cog_load
+    await bot.add_cog(XPCog(bot))
@@ -0,0 +1,2 @@
+# Briques internes du système d'XP (stockage, caches, tâches de fond).
+# Ce package n'est pas une extension : bot.py ne charge que les fichiers .py de cogs/.
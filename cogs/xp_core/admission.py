@@ -0,0 +1,194 @@
+import asyncio
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import settings
+
+Key = Tuple[int, int]  # (guild_id, user_id)
+
+
+class DeferredXP:
+    """Gains d'un membre mis en attente pendant une surcharge, cumulés."""
+
+    __slots__ = ('text_xp', 'voice_xp', 'messages', 'voice_time', 'channel_id')
+
+    def __init__(self):
+        self.text_xp = 0
+        self.voice_xp = 0
+        self.messages = 0
+        self.voice_time = 0
+        # Dernier salon où le membre a écrit : reçoit l'annonce d'un level-up au règlement
+        self.channel_id: Optional[int] = None
+
+    def add(self, mode: str, amount: int, messages: int = 0, voice_time: int = 0, channel_id: Optional[int] = None):
+        if mode == 'text':
+            self.text_xp += amount
+        else:
+            self.voice_xp += amount
+        self.messages += messages
+        self.voice_time += voice_time
+        if channel_id is not None:
+            self.channel_id = channel_id
+
+    @property
+    def pending(self) -> bool:
+        # Le règlement remet chaque mode à zéro dès qu'il est crédité
+        return bool(self.text_xp or self.voice_xp or self.messages or self.voice_time)
+
+    def merge(self, other: 'DeferredXP'):
+        self.add('text', other.text_xp, other.messages, 0, other.channel_id)
+        self.add('voice', other.voice_xp, 0, other.voice_time)
+
+
+# Remet à zéro les gains de chaque entrée au fur et à mesure qu'ils sont crédités
+Settle = Callable[[List[Tuple[Key, DeferredXP]]], Awaitable[None]]
+
+
+class AdmissionController:
+    """Admission des gains d'XP passifs devant la base, selon le travail en cours et le retard de la boucle.
+
+    En surcharge, les gains ne touchent plus la base : ils sont cumulés par membre dans un arriéré
+    borné, réglé par tranches quand la charge retombe. Les commandes slash ne passent jamais par ici ;
+    une commande récente réserve au contraire la moitié de la capacité et ralentit le règlement.
+    """
+
+    def __init__(self, settle: Settle,
+                 max_inflight: int = settings.ADMISSION_MAX_INFLIGHT,
+                 lag_threshold: float = settings.ADMISSION_LAG_MS / 1000,
+                 interval: float = settings.ADMISSION_LAG_INTERVAL_MS / 1000,
+                 interactive_window: float = settings.ADMISSION_INTERACTIVE_WINDOW_MS / 1000,
+                 backlog_size: int = settings.ADMISSION_BACKLOG_SIZE,
+                 settle_chunk: int = settings.ADMISSION_SETTLE_CHUNK):
+        self.settle = settle
+        self.max_inflight = max(2, max_inflight)
+        self.lag_threshold = lag_threshold
+        self.interval = interval
+        self.interactive_window = interactive_window
+        self.backlog_size = backlog_size
+        self.settle_chunk = max(1, settle_chunk)
+        self.backlog: Dict[Key, DeferredXP] = {}
+        self.inflight = 0
+        # Retard de la boucle d'évènements, moyenne glissante en secondes
+        self.lag = 0.0
+        self._interactive_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.admitted = 0
+        self.deferred = 0
+        self.shed = 0
+        self.shed_xp = 0
+        self.settled = 0
+        self.interactions = 0
+
+    @property
+    def interactive(self) -> bool:
+        return time.monotonic() < self._interactive_until
+
+    @property
+    def overloaded(self) -> bool:
+        # Une commande slash doit répondre en 3 s : pendant sa fenêtre, les seuils sont divisés par deux
+        divisor = 2 if self.interactive else 1
+        return self.inflight >= self.max_inflight // divisor or self.lag >= self.lag_threshold / divisor
+
+    def _calm(self) -> bool:
+        # Règlement sous la moitié des seuils, le quart pendant la fenêtre d'une commande slash :
+        # un trafic de commandes continu ne doit pas bloquer l'arriéré indéfiniment
+        divisor = 4 if self.interactive else 2
+        return self.inflight < self.max_inflight // divisor and self.lag < self.lag_threshold / divisor
+
+    def note_interaction(self):
+        self.interactions += 1
+        self._interactive_until = time.monotonic() + self.interactive_window
+
+    def admit(self) -> bool:
+        """True si le gain peut être traité tout de suite ; release() est alors dû une fois terminé."""
+        if self.overloaded:
+            return False
+        self.inflight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.inflight -= 1
+
+    def defer(self, guild_id: int, user_id: int, mode: str, amount: int, messages: int = 0,
+              voice_time: int = 0, channel_id: Optional[int] = None) -> bool:
+        """Met un gain en attente ; False s'il est abandonné parce que l'arriéré est plein."""
+        key = (guild_id, user_id)
+        entry = self.backlog.get(key)
+        if entry is None:
+            if len(self.backlog) >= self.backlog_size:
+                # Arriéré plein : seuls les membres déjà en attente cumulent encore, la mémoire reste bornée
+                self.shed += 1
+                self.shed_xp += amount
+                return False
+            entry = self.backlog[key] = DeferredXP()
+        entry.add(mode, amount, messages, voice_time, channel_id)
+        self.deferred += 1
+        return True
+
+    def discard(self, guild_id: int, user_id: int):
+        # XP réinitialisée : les gains en attente ne doivent pas revenir après coup
+        self.backlog.pop((guild_id, user_id), None)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            # Moyenne glissante : un pic isolé ne suffit pas à basculer en mise en attente
+            self.lag = self.lag * 0.7 + lag * 0.3
+            if self.backlog and self._calm():
+                await self._settle_chunk()
+
+    async def _settle_chunk(self) -> bool:
+        # Les plus anciens d'abord : le dict garde l'ordre d'arrivée dans l'arriéré
+        items = [(key, self.backlog.pop(key)) for key in list(itertools.islice(self.backlog, self.settle_chunk))]
+        try:
+            await self.settle(items)
+        except BaseException as e:
+            # Seuls les gains pas encore crédités reviennent, au-delà de la borne s'il le faut :
+            # rien n'est perdu sur une erreur de base ou une annulation, rien n'est crédité deux fois
+            remaining = [(key, entry) for key, entry in items if entry.pending]
+            for key, entry in remaining:
+                current = self.backlog.get(key)
+                if current is None:
+                    self.backlog[key] = entry
+                else:
+                    current.merge(entry)
+            self.settled += len(items) - len(remaining)
+            if not isinstance(e, Exception):
+                raise
+            print(f"[AdmissionController] Erreur: {e}")
+            return False
+        self.settled += len(items)
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'inflight': self.inflight,
+            'lag_seconds': self.lag,
+            'overloaded': int(self.overloaded),
+            'backlog': len(self.backlog),
+            'admitted': self.admitted,
+            'deferred': self.deferred,
+            'shed': self.shed,
+            'shed_xp': self.shed_xp,
+            'settled': self.settled,
+            'interactions': self.interactions,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Arrêt : tout l'arriéré est crédité avant la fermeture de la base
+        while self.backlog:
+            if not await self._settle_chunk():
+                print(f"[AdmissionController] {len(self.backlog)} membres en attente non crédités")
+                return
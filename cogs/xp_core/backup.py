@@ -0,0 +1,59 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from typing import IO, Callable, Optional
+
+import aiosqlite
+
+from . import settings
+from .pool import ConnectionPool
+
+_COPY_CHUNK = 1024 * 1024
+
+
+async def online_backup(pool: ConnectionPool, target_path: str,
+                        progress: Optional[Callable[[int, int, int], None]] = None):
+    # API de sauvegarde incrémentale de SQLite : N pages par étape, depuis une connexion de lecture dédiée.
+    # Sa transaction reste ouverte pendant toute la copie : en WAL elle fige un instantané cohérent,
+    # la copie ne redémarre pas et l'écrivain continue de valider (ses écritures ne sont pas sauvegardées)
+    target = sqlite3.connect(target_path, check_same_thread=False)
+    try:
+        async with aiosqlite.connect(f'file:{pool.db_path}?mode=ro', uri=True) as source:
+            await source.execute(f'PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}')
+            await source.execute('BEGIN')
+            async with source.execute('SELECT COUNT(*) FROM sqlite_master') as cursor:
+                await cursor.fetchone()
+            await source.backup(target, pages=settings.BACKUP_PAGES_PER_STEP, progress=progress)
+            await source.rollback()
+    finally:
+        target.close()
+
+
+def spool_file(path: str, compress: bool) -> IO[bytes]:
+    """Copie un fichier dans un tampon en mémoire (sur disque au-delà du seuil), compressé ou non."""
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.BACKUP_SPOOL_BYTES)
+    with open(path, 'rb') as source:
+        if compress:
+            with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=6) as target:
+                shutil.copyfileobj(source, target, _COPY_CHUNK)
+        else:
+            shutil.copyfileobj(source, spool, _COPY_CHUNK)
+    spool.seek(0)
+    return spool
+
+
+def unpack_file(source_path: str, target_path: str):
+    """Copie une sauvegarde vers target_path, en la décompressant si elle est au format gzip."""
+    with open(source_path, 'rb') as source:
+        compressed = source.read(2) == b'\x1f\x8b'
+    opener = gzip.open if compressed else open
+    with opener(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        shutil.copyfileobj(source, target, _COPY_CHUNK)
+
+
+def temp_db_path() -> str:
+    fd, path = tempfile.mkstemp(prefix='xp_backup_', suffix='.db')
+    os.close(fd)
+    return path
@@ -0,0 +1,240 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import settings
+from .levels import LevelCurve
+from .periods import PERIODS, period_start
+
+Key = Tuple[int, int]  # (user_id, guild_id)
+
+
+class MemberTotals:
+    """Totaux connus d'un membre : valeurs en base + deltas pas encore écrits."""
+
+    __slots__ = ('messages', 'text_xp', 'voice_xp', 'voice_time', 'text_level', 'voice_level', 'notify_enabled',
+                 'loaded_at')
+
+    def __init__(self, messages=0, text_xp=0, voice_xp=0, voice_time=0, text_level=1, voice_level=1,
+                 notify_enabled=1):
+        self.messages = messages
+        self.text_xp = text_xp
+        self.voice_xp = voice_xp
+        self.voice_time = voice_time
+        self.text_level = text_level
+        self.voice_level = voice_level
+        self.notify_enabled = bool(notify_enabled)
+        self.loaded_at = time.monotonic()
+
+
+class PendingDelta:
+    __slots__ = ('messages', 'text_xp', 'voice_xp', 'voice_time', 'text_ts', 'voice_ts')
+
+    def __init__(self):
+        self.messages = 0
+        self.text_xp = 0
+        self.voice_xp = 0
+        self.voice_time = 0
+        self.text_ts = 0
+        self.voice_ts = 0
+
+    def merge(self, other: 'PendingDelta'):
+        self.messages += other.messages
+        self.text_xp += other.text_xp
+        self.voice_xp += other.voice_xp
+        self.voice_time += other.voice_time
+        self.text_ts = max(self.text_ts, other.text_ts)
+        self.voice_ts = max(self.voice_ts, other.voice_ts)
+
+
+class WriteBuffer:
+    """Regroupe en mémoire les gains d'XP par (membre, serveur) avant de les écrire en une transaction.
+
+    Les totaux chargés servent aussi de cache des statistiques des membres : tenus à jour à chaque
+    gain, ils ne sont relus en base qu'après ttl secondes (écritures faites hors de ce processus).
+    """
+
+    def __init__(self, curve_for: Callable[[int], LevelCurve],
+                 max_events: int = settings.FLUSH_MAX_EVENTS,
+                 max_totals: int = settings.TOTALS_CACHE_SIZE,
+                 ttl: float = settings.TOTALS_TTL_SECONDS):
+        # Courbe de progression du serveur (guild_id -> LevelCurve)
+        self.curve_for = curve_for
+        self.max_events = max_events
+        self.max_totals = max_totals
+        self.pending: Dict[Key, PendingDelta] = {}
+        # Lots retirés de pending mais pas encore validés en base : comptés dans les totaux rechargés
+        self.inflight: List[Dict[Key, PendingDelta]] = []
+        # Lots validés depuis le démarrage : une lecture qui en chevauche un peut avoir vu ses deltas ou non
+        self.commits = 0
+        self.totals: 'OrderedDict[Key, MemberTotals]' = OrderedDict()
+        self.events = 0
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def should_flush(self) -> bool:
+        return self.events >= self.max_events
+
+    def in_flight(self, key: Key) -> bool:
+        return any(key in batch for batch in self.inflight)
+
+    def _fresh(self, key: Key, totals: Optional[MemberTotals]) -> bool:
+        # Des deltas en attente ou en cours d'écriture rendent les totaux en mémoire plus récents que la base
+        return totals is not None and (not self.ttl or time.monotonic() - totals.loaded_at <= self.ttl
+                                       or key in self.pending or self.in_flight(key))
+
+    def get_totals(self, key: Key) -> Optional[MemberTotals]:
+        totals = self.totals.get(key)
+        if not self._fresh(key, totals):
+            self.misses += 1
+            return None
+        self.totals.move_to_end(key)
+        self.hits += 1
+        return totals
+
+    def peek_totals(self, key: Key) -> Optional[MemberTotals]:
+        # Lecture sans effet sur l'ordre d'éviction ni sur les compteurs
+        totals = self.totals.get(key)
+        return totals if self._fresh(key, totals) else None
+
+    def load_totals(self, key: Key, row: Optional[Tuple]) -> MemberTotals:
+        """Construit les totaux à partir de la ligne en base, deltas en attente et en cours d'écriture inclus."""
+        totals = MemberTotals(*row) if row else MemberTotals()
+        deltas = [batch[key] for batch in self.inflight if key in batch]
+        if key in self.pending:
+            deltas.append(self.pending[key])
+        for delta in deltas:
+            totals.messages += delta.messages
+            totals.text_xp += delta.text_xp
+            totals.voice_xp += delta.voice_xp
+            totals.voice_time += delta.voice_time
+        if deltas:
+            curve = self.curve_for(key[1])
+            totals.text_level = max(totals.text_level, curve.level_for_xp(totals.text_xp))
+            totals.voice_level = max(totals.voice_level, curve.level_for_xp(totals.voice_xp))
+        self.totals[key] = totals
+        self._evict()
+        return totals
+
+    def _evict(self):
+        # Les membres avec des deltas en attente restent en mémoire jusqu'au prochain flush
+        budget = len(self.totals)
+        while len(self.totals) > self.max_totals and budget > 0:
+            key, totals = self.totals.popitem(last=False)
+            if key in self.pending or self.in_flight(key):
+                self.totals[key] = totals
+            budget -= 1
+
+    def add(self, key: Key, totals: MemberTotals, mode: str, amount: int,
+            messages: int = 0, voice_time: int = 0, now: Optional[int] = None) -> int:
+        """Ajoute un gain et renvoie le nouveau niveau en cas de level up, 0 sinon."""
+        now = now if now is not None else int(time.time())
+        delta = self.pending.get(key)
+        if delta is None:
+            delta = self.pending[key] = PendingDelta()
+        delta.messages += messages
+        delta.voice_time += voice_time
+        totals.messages += messages
+        totals.voice_time += voice_time
+        self.events += 1
+        if mode == 'text':
+            delta.text_xp += amount
+            delta.text_ts = now
+            totals.text_xp += amount
+            level = self.curve_for(key[1]).level_for_xp(totals.text_xp)
+            if level > totals.text_level:
+                totals.text_level = level
+                return level
+        else:
+            delta.voice_xp += amount
+            delta.voice_ts = now
+            totals.voice_xp += amount
+            level = self.curve_for(key[1]).level_for_xp(totals.voice_xp)
+            if level > totals.voice_level:
+                totals.voice_level = level
+                return level
+        return 0
+
+    def drain(self) -> Dict[Key, PendingDelta]:
+        pending, self.pending = self.pending, {}
+        self.events = 0
+        return pending
+
+    def begin(self, batch: Dict[Key, PendingDelta]):
+        """Déclare un lot drainé en cours d'écriture ; à appeler sans await depuis drain()."""
+        self.inflight.append(batch)
+
+    def commit(self, batch: Dict[Key, PendingDelta]):
+        """Le lot est validé en base : ses deltas sont désormais dans les lignes relues."""
+        self.inflight = [other for other in self.inflight if other is not batch]
+        self.commits += 1
+
+    def restore(self, pending: Dict[Key, PendingDelta]):
+        """Remet en attente un lot dont l'écriture a échoué."""
+        self.inflight = [other for other in self.inflight if other is not pending]
+        for key, delta in pending.items():
+            current = self.pending.get(key)
+            if current is None:
+                self.pending[key] = delta
+            else:
+                current.merge(delta)
+            self.events += 1
+
+    def discard(self, key: Key):
+        self.pending.pop(key, None)
+        self.totals.pop(key, None)
+
+    def invalidate(self, key: Key):
+        self.totals.pop(key, None)
+
+    def invalidate_all(self):
+        self.totals.clear()
+
+    def invalidate_guild(self, guild_id: int):
+        for key in [key for key in self.totals if key[1] == guild_id]:
+            del self.totals[key]
+
+    def clear(self):
+        self.pending.clear()
+        self.inflight.clear()
+        self.totals.clear()
+        self.events = 0
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self.totals),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else None,
+        }
+
+    def rows(self, pending: Dict[Key, PendingDelta]) -> Tuple[List[Tuple], List[Tuple], List[Tuple], List[Tuple]]:
+        """Lignes pour executemany : UPSERT de la table xp, historique regroupé et compteurs par fenêtre
+        (texte et vocal séparés, pour ne modifier que les index des colonnes qui changent)."""
+        xp_rows = []
+        history_rows = []
+        text_period_rows = []
+        voice_period_rows = []
+        now = int(time.time())
+        for (user_id, guild_id), delta in pending.items():
+            # Niveaux utilisés seulement à l'insertion ; la mise à jour les recalcule en SQL avec la courbe du serveur
+            curve = self.curve_for(guild_id)
+            xp_rows.append((user_id, guild_id, delta.messages, delta.text_xp, delta.voice_xp, delta.voice_time,
+                            curve.level_for_xp(delta.text_xp), curve.level_for_xp(delta.voice_xp),
+                            curve.base, curve.exponent))
+            if delta.text_xp:
+                history_rows.append((user_id, guild_id, 'text', delta.text_xp, delta.text_ts))
+            if delta.voice_xp:
+                history_rows.append((user_id, guild_id, 'voice', delta.voice_xp, delta.voice_ts))
+            # Fenêtre du dernier gain : un lot ne couvre que quelques secondes
+            timestamp = max(delta.text_ts, delta.voice_ts) or now
+            for period in PERIODS.values():
+                bucket = period_start(period, timestamp)
+                if delta.text_xp or delta.messages:
+                    text_period_rows.append((period, bucket, guild_id, user_id, delta.text_xp, delta.messages))
+                if delta.voice_xp or delta.voice_time:
+                    voice_period_rows.append((period, bucket, guild_id, user_id, delta.voice_xp, delta.voice_time))
+        return xp_rows, history_rows, text_period_rows, voice_period_rows
@@ -0,0 +1,75 @@
+from typing import Dict, Hashable, Set
+
+from . import settings
+
+# Réservation posée pendant la lecture du cooldown du serveur
+_RESERVE_SECONDS = 5.0
+
+
+class CooldownTracker:
+    """Dates d'expiration du cooldown par (guild_id, user_id), purgées par tranches de temps."""
+
+    def __init__(self, bucket_seconds: int = settings.COOLDOWN_BUCKET_SECONDS):
+        self.bucket_seconds = max(1, bucket_seconds)
+        self.expires: Dict[Hashable, float] = {}
+        self.buckets: Dict[int, Set[Hashable]] = {}
+        self._last_bucket = 0
+        # Compteurs : messages vus, ignorés (écritures évitées) et récompensés
+        self.checked = 0
+        self.suppressed = 0
+        self.awarded = 0
+
+    def acquire(self, key: Hashable, now: float) -> bool:
+        """True si le message peut rapporter de l'XP ; le membre est alors réservé."""
+        self.checked += 1
+        expiry = self.expires.get(key)
+        if expiry is not None and now < expiry:
+            self.suppressed += 1
+            return False
+        self._set(key, now + _RESERVE_SECONDS)
+        return True
+
+    def commit(self, key: Hashable, cooldown: int, now: float):
+        self.awarded += 1
+        if cooldown > 0:
+            self._set(key, now + cooldown)
+        else:
+            self.release(key)
+        self._evict(now)
+
+    def release(self, key: Hashable):
+        expiry = self.expires.pop(key, None)
+        if expiry is not None:
+            bucket = self.buckets.get(int(expiry // self.bucket_seconds))
+            if bucket is not None:
+                bucket.discard(key)
+
+    def clear_guild(self, guild_id: int):
+        for key in [key for key in self.expires if key[0] == guild_id]:
+            self.release(key)
+
+    def _bucket(self, expiry: float) -> Set[Hashable]:
+        return self.buckets.setdefault(int(expiry // self.bucket_seconds), set())
+
+    def _set(self, key: Hashable, expiry: float):
+        self.release(key)
+        self.expires[key] = expiry
+        self._bucket(expiry).add(key)
+
+    def _evict(self, now: float):
+        # Au plus une purge par tranche : toutes les tranches passées sont expirées
+        current = int(now // self.bucket_seconds)
+        if current <= self._last_bucket:
+            return
+        self._last_bucket = current
+        for index in [index for index in self.buckets if index < current]:
+            for key in self.buckets.pop(index):
+                self.expires.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'checked': self.checked,
+            'suppressed': self.suppressed,
+            'awarded': self.awarded,
+            'tracked': len(self.expires),
+        }
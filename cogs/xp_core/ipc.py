@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import time
+from typing import Any, Dict, Optional, Set
+
+from . import settings
+from .cache import LRUCache
+
+# Protocole : une requête JSON par ligne {"id", "op", "args"}, réponse {"id", "result"} ou {"id", "error"}.
+# Méthodes de XPDatabase exécutables à distance : toutes les écritures d'un worker ;
+# write_rows (lot du tampon d'écriture différée) est traité à part pour être idempotent
+OPERATIONS = frozenset({
+    'add_message', 'add_voice_time', 'add_xp', 'log_xp_history',
+    'set_cooldown', 'set_notify_channel', 'set_notify_enabled', 'set_level_curve', 'wait_level_recalc',
+    'reset_user', 'save_voice_sessions', 'touch_voice_sessions', 'delete_voice_sessions',
+    'backup', 'import_db', 'import_legacy_json',
+})
+
+
+class StorageError(Exception):
+    """Erreur renvoyée par le processus de stockage, ou connexion perdue."""
+
+
+class StorageServer:
+    """Processus propriétaire des fichiers SQLite : applique les écritures envoyées par les workers.
+
+    Les requêtes d'une même connexion sont traitées en parallèle ; les écritures sont ensuite
+    sérialisées par l'écrivain de chaque shard, un lot de gains = une transaction par shard.
+    """
+
+    def __init__(self, db, path: str = settings.STORAGE_SOCKET):
+        self.db = db
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        # Lots appliqués ou en cours (tâche d'écriture) : un lot renvoyé après une coupure n'est pas compté deux fois
+        self._applied = LRUCache(settings.STORAGE_DEDUP_BATCHES)
+        # Posé une fois la base ouverte et migrée : le socket écoute dès le démarrage et répond « pas prêt » avant
+        self.ready = asyncio.Event()
+        self.requests = 0
+        self.batches = 0
+        self.duplicates = 0
+
+    async def start(self):
+        # Socket laissé par un arrêt brutal
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, self.path, limit=settings.STORAGE_MAX_MESSAGE_BYTES)
+        os.chmod(self.path, 0o600)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Connexions fermées de ce côté : chaque worker voit la coupure, ses requêtes en cours se terminent
+            connections = list(self._connections.items())
+            for writer, _ in connections:
+                writer.close()
+            await asyncio.gather(*(task for _, task in connections), return_exceptions=True)
+            # Écritures de lots dont la requête a été abandonnée : terminées avant la fermeture de la base
+            writes = [self._applied.peek(batch_id) for batch_id in list(self._applied.keys())]
+            await asyncio.gather(*(write for write in writes if not write.done()), return_exceptions=True)
+            await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks: Set[asyncio.Task] = set()
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._reply(writer, json.loads(line)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError) as e:
+            print(f"[StorageServer] Erreur: {e}")
+        finally:
+            # Les écritures reçues sont terminées même si le worker s'est déconnecté
+            await asyncio.gather(*tasks, return_exceptions=True)
+            del self._connections[writer]
+            writer.close()
+
+    async def _reply(self, writer: asyncio.StreamWriter, request: Dict[str, Any]):
+        self.requests += 1
+        try:
+            response = {'id': request['id'], 'result': await self._dispatch(request['op'], request.get('args', []))}
+        except Exception as e:
+            response = {'id': request.get('id'), 'error': f"{type(e).__name__}: {e}"}
+        if writer.is_closing():
+            return
+        writer.write(json.dumps(response).encode() + b'\n')
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _write_settled(self, batch_id: str, write: asyncio.Future):
+        if not write.cancelled() and write.exception() is None:
+            self.batches += 1
+        elif self._applied.peek(batch_id) is write:
+            # Échec : l'identifiant est oublié, un renvoi ultérieur retente l'écriture
+            self._applied.pop(batch_id)
+
+    async def _dispatch(self, op: str, args: list) -> Any:
+        if op == 'ready':
+            return self.ready.is_set()
+        if not self.ready.is_set():
+            raise StorageError("Processus de stockage pas encore prêt (migration en cours)")
+        if op == 'write_rows':
+            batch_id, *rows = args
+            write = self._applied.get(batch_id)
+            if write is not None:
+                # Lot renvoyé : on attend l'écriture d'origine, terminée ou en cours, et on en rend l'issue
+                self.duplicates += 1
+            else:
+                # Enregistrée avant de commencer : un renvoi après expiration du délai ne s'applique pas en parallèle
+                write = asyncio.ensure_future(self.db.write_rows(*rows))
+                write.add_done_callback(lambda done: self._write_settled(batch_id, done))
+                self._applied.set(batch_id, write)
+            # Coupure de la connexion : l'écriture se termine quand même, le renvoi suivant la retrouve
+            await asyncio.shield(write)
+            return None
+        if op not in OPERATIONS:
+            raise ValueError(f"Opération inconnue : {op}")
+        result = await getattr(self.db, op)(*args)
+        # set_level_curve renvoie la tâche de recalcul : le worker l'attend avec wait_level_recalc
+        return None if isinstance(result, asyncio.Task) else result
+
+
+class StorageClient:
+    """Connexion d'un worker au processus de stockage ; reconnexion automatique à l'appel suivant."""
+
+    def __init__(self, path: str = settings.STORAGE_SOCKET):
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._connect_lock = asyncio.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self, wait: float = 0):
+        # wait : délai laissé au processus de stockage pour démarrer (lancement simultané)
+        deadline = time.monotonic() + wait
+        async with self._connect_lock:
+            while not self.connected:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.path, limit=settings.STORAGE_MAX_MESSAGE_BYTES)
+                except OSError as e:
+                    if time.monotonic() >= deadline:
+                        raise StorageError(f"Processus de stockage injoignable ({self.path}) : {e}") from e
+                    await asyncio.sleep(0.5)
+                    continue
+                self._writer = writer
+                self._read_task = asyncio.create_task(self._read_loop(reader, writer))
+
+    async def wait_ready(self, wait: float = 0):
+        """Attend que le stockage ait ouvert et migré la base, sans limite tant qu'il répond."""
+        notified = False
+        while True:
+            # wait ne borne que l'absence du processus : une migration longue n'est pas une panne
+            await self.connect(wait)
+            try:
+                if await self.call('ready'):
+                    return
+            except StorageError as e:
+                if self.connected:
+                    raise
+                print(f"[StorageClient] Erreur: {e}")
+                continue
+            if not notified:
+                print("[StorageClient] Stockage en cours de migration, attente")
+                notified = True
+            await asyncio.sleep(1)
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response['id'], None)
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(StorageError(response['error']))
+                else:
+                    future.set_result(response.get('result'))
+        except (ConnectionError, ValueError) as e:
+            print(f"[StorageClient] Erreur: {e}")
+        finally:
+            self._disconnect(writer, StorageError("Connexion au processus de stockage perdue"))
+
+    def _disconnect(self, writer: asyncio.StreamWriter, error: Exception):
+        writer.close()
+        if self._writer is writer:
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def call(self, op: str, *args, timeout: Optional[float] = settings.STORAGE_TIMEOUT_SECONDS) -> Any:
+        """Exécute une écriture dans le processus de stockage ; timeout None pour les imports."""
+        await self.connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.calls += 1
+        try:
+            self._writer.write(json.dumps({'id': request_id, 'op': op, 'args': args}).encode() + b'\n')
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            self._pending.pop(request_id, None)
+            raise StorageError(f"{op} : {type(e).__name__} {e}") from e
+        except StorageError:
+            self.failures += 1
+            raise
+
+    async def close(self):
+        if self._writer is not None:
+            self._disconnect(self._writer, StorageError("Connexion fermée"))
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+
+
+async def _compaction_loop(db):
+    # Même rythme que la tâche de XPCog, qui ne fait rien dans les workers
+    while True:
+        try:
+            await db.compact_history()
+        except Exception as e:
+            print(f"[history_compaction] Erreur: {e}")
+        await asyncio.sleep(3600)
+
+
+async def serve(db_path: str, socket_path: str):
+    from ..xp_db import XPDatabase
+    db = XPDatabase(None, db_path)
+    # Socket ouvert avant la migration : les workers voient un stockage vivant et attendent qu'il soit prêt
+    server = StorageServer(db, socket_path)
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    compaction = None
+    try:
+        await db.init()
+        # Les workers lisent directement les fichiers : ils démarrent sur un schéma à jour
+        if db._migration_task is not None:
+            await db._migration_task
+        server.ready.set()
+        compaction = asyncio.create_task(_compaction_loop(db))
+        print(f"[storage] {db_path} servi sur {socket_path}")
+        await stop.wait()
+    finally:
+        await server.close()
+        if compaction is not None:
+            compaction.cancel()
+            await asyncio.gather(compaction, return_exceptions=True)
+        await db.close()
+        print(f"[storage] Arrêt : {server.batches} lots écrits, {server.duplicates} doublons ignorés")
+
+
+if __name__ == '__main__':
+    # python -m cogs.xp_core.ipc [--db xp_data.db] [--socket xp_storage.sock] ; lancé par launcher.py
+    parser = argparse.ArgumentParser(description="Processus d'écriture de la base XP pour les workers du bot.")
+    parser.add_argument('--db', default='xp_data.db', help="base SQLite principale (shard 0)")
+    parser.add_argument('--socket', default=settings.STORAGE_SOCKET or 'xp_storage.sock', help="socket Unix d'écoute")
+    args = parser.parse_args()
+    asyncio.run(serve(args.db, args.socket))
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import os
+from itertools import islice
+from typing import IO, Any, Callable, Collection, Dict, Iterator, List, Optional, Tuple
+
+from . import settings
+from .levels import DEFAULT_CURVE
+from .migrations import INDEXES, LEADERBOARD_INDEXES
+from .pool import ConnectionPool
+
+# Ancien stockage JSON (XPStorage / ConfigStorage) :
+#   xp_data.json     {"user_id": {"text", "voice", "messages", "voice_time", "text_level", "voice_level"}}
+#   xp_config.json   {"guild_id": {"cooldown", "notify_channel"}}
+XP_FILE = 'xp_data.json'
+CONFIG_FILE = 'xp_config.json'
+
+# Fusion idempotente : on garde le maximum de chaque compteur, relancer l'import ne double rien
+_MERGE_XP = '''INSERT INTO xp (guild_id, user_id, text_xp, voice_xp, messages, voice_time, text_level, voice_level)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        text_xp=MAX(text_xp, excluded.text_xp),
+        voice_xp=MAX(voice_xp, excluded.voice_xp),
+        messages=MAX(messages, excluded.messages),
+        voice_time=MAX(voice_time, excluded.voice_time),
+        text_level=xp_level(MAX(text_xp, excluded.text_xp)),
+        voice_level=xp_level(MAX(voice_xp, excluded.voice_xp))
+    WHERE excluded.text_xp > text_xp OR excluded.voice_xp > voice_xp
+        OR excluded.messages > messages OR excluded.voice_time > voice_time'''
+
+# La configuration déjà en base est plus récente que le JSON : on ne complète que le salon manquant
+_MERGE_CONFIG = '''INSERT INTO config (guild_id, cooldown, notify_channel) VALUES (?, ?, ?)
+    ON CONFLICT(guild_id) DO UPDATE SET notify_channel=COALESCE(notify_channel, excluded.notify_channel)'''
+
+Progress = Optional[Callable[[str, int], None]]
+
+_NUMBER_CHARS = frozenset('0123456789+-.eE')
+
+
+def iter_json_object(fp: IO[str], read_size: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+    """Parcourt les paires (clé, valeur) d'un objet JSON de premier niveau sans charger tout le fichier."""
+    decoder = json.JSONDecoder()
+    read_size = read_size or settings.LEGACY_READ_BYTES
+    buf = ''
+    pos = 0
+    eof = False
+
+    def skip_ws() -> str:
+        nonlocal buf, pos, eof
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return buf[pos] if pos < len(buf) else ''
+            buf, pos = fp.read(read_size), 0
+            eof = not buf
+
+    def decode() -> Any:
+        nonlocal buf, pos, eof
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # Une valeur qui touche la fin du tampon peut être tronquée (nombre coupé en deux) ;
+                # « -1 » décodé dans « -1.5e3 » aussi : la valeur doit être suivie d'un caractère qui ne la prolonge pas
+                if (end < len(buf) and buf[end] not in _NUMBER_CHARS) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            chunk = fp.read(read_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+    if skip_ws() != '{':
+        raise ValueError("Le fichier JSON doit contenir un objet")
+    pos += 1
+    if skip_ws() == '}':
+        return
+    while True:
+        skip_ws()
+        key = decode()
+        if skip_ws() != ':':
+            raise ValueError(f"JSON invalide après la clé {key!r}")
+        pos += 1
+        skip_ws()
+        yield key, decode()
+        sep = skip_ws()
+        pos += 1
+        if sep == '}':
+            return
+        if sep != ',':
+            raise ValueError(f"JSON invalide après la clé {key!r}")
+
+
+def _xp_row(guild_id: int, key: str, data: Dict[str, Any]) -> Tuple:
+    text_xp = int(data.get('text', 0))
+    voice_xp = int(data.get('voice', 0))
+    return (guild_id, int(key), text_xp, voice_xp, int(data.get('messages', 0)), int(data.get('voice_time', 0)),
+            DEFAULT_CURVE.level_for_xp(text_xp), DEFAULT_CURVE.level_for_xp(voice_xp))
+
+
+def _config_row(key: str, data: Dict[str, Any]) -> Tuple:
+    notify_channel = data.get('notify_channel')
+    return (int(key), int(data.get('cooldown', 30)),
+            int(notify_channel) if notify_channel is not None else None)
+
+
+def _batches(path: str, to_row: Callable[[str, Any], Optional[Tuple]], stats: Dict[str, int]) -> Iterator[List[Tuple]]:
+    # to_row renvoie None pour une entrée écartée (autre serveur), comptée comme ignorée
+    with open(path, 'r', encoding='utf-8') as fp:
+        pairs = iter_json_object(fp)
+        while True:
+            chunk = list(islice(pairs, settings.LEGACY_IMPORT_BATCH))
+            if not chunk:
+                return
+            batch = []
+            for key, data in chunk:
+                try:
+                    row = to_row(key, data)
+                except (TypeError, ValueError, AttributeError):
+                    row = None
+                if row is None:
+                    stats['skipped'] += 1
+                else:
+                    batch.append(row)
+            if batch:
+                yield batch
+
+
+async def _import(route: Callable[[int], ConnectionPool], path: str, sql: str, to_row: Callable[[str, Any], Optional[Tuple]],
+                  label: str, progress: Progress) -> Dict[str, int]:
+    stats = {'rows': 0, 'skipped': 0}
+    batches = _batches(path, to_row, stats)
+    # Lecture et décodage dans un thread : le lot suivant est préparé pendant l'écriture du précédent
+    pending = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+    while True:
+        batch = await pending
+        if batch is None:
+            return stats
+        pending = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+        try:
+            # Lignes regroupées par shard (guild_id en première colonne)
+            groups: Dict[ConnectionPool, List[Tuple]] = {}
+            for row in batch:
+                groups.setdefault(route(row[0]), []).append(row)
+            for pool, rows in groups.items():
+                async with pool.write() as db:
+                    await db.executemany(sql, rows)
+        except BaseException:
+            await asyncio.gather(pending, return_exceptions=True)
+            raise
+        stats['rows'] += len(batch)
+        if progress:
+            progress(label, stats['rows'])
+
+
+async def import_legacy_xp(pool: ConnectionPool, path: str, guild_id: int, progress: Progress = None,
+                           offline: bool = False) -> Dict[str, int]:
+    # L'ancien format n'avait qu'un serveur : le guild_id cible est fourni par l'appelant
+    # Base en service : insertion par lots avec les index en place, les classements des autres
+    # serveurs restent indexés. Hors ligne seulement (outil en ligne de commande), un gros fichier
+    # reconstruit les index de classement à la fin plutôt que de les mettre à jour ligne par ligne
+    rebuild = offline and os.path.getsize(path) >= settings.LEGACY_REBUILD_INDEX_BYTES
+    if rebuild:
+        async with pool.write() as db:
+            for name in LEADERBOARD_INDEXES:
+                await db.execute(f'DROP INDEX IF EXISTS {name}')
+    try:
+        return await _import(lambda _: pool, path, _MERGE_XP, lambda key, data: _xp_row(guild_id, key, data), 'xp', progress)
+    finally:
+        if rebuild:
+            async with pool.write() as db:
+                for ddl in INDEXES:
+                    await db.execute(ddl)
+
+
+async def import_legacy_config(route: Callable[[int], ConnectionPool], path: str, progress: Progress = None,
+                               guilds: Optional[Collection[int]] = None) -> Dict[str, int]:
+    # Plusieurs serveurs par fichier : route donne le pool (shard) de chacun.
+    # guilds limite l'import à ces serveurs (import depuis Discord) ; None : tout le fichier (outil hors ligne)
+    if guilds is None:
+        to_row = _config_row
+    else:
+        def to_row(key: str, data: Dict[str, Any]) -> Optional[Tuple]:
+            return _config_row(key, data) if int(key) in guilds else None
+    return await _import(route, path, _MERGE_CONFIG, to_row, 'config', progress)
+
+
+async def _main(args: argparse.Namespace):
+    from ..xp_db import XPDatabase
+    db = XPDatabase(None, args.db)
+    await db.init()
+    try:
+        if db._migration_task is not None:
+            await db._migration_task
+        result = await db.import_legacy_json(args.xp, args.config, args.guild,
+                                             lambda label, rows: print(f"{label} : {rows} lignes importées"),
+                                             offline=not args.online, all_guilds=True)
+        for label, stats in result.items():
+            print(f"{label} : {stats['rows']} lignes, {stats['skipped']} ignorées")
+    finally:
+        await db.close()
+
+
+if __name__ == '__main__':
+    # python -m cogs.xp_core.legacy --guild <id> [--xp xp_data.json] [--config xp_config.json] [--db xp_data.db] [--online]
+    parser = argparse.ArgumentParser(description="Importe les anciens fichiers JSON d'XP dans la base SQLite.")
+    parser.add_argument('--xp', help=f"fichier XP (ex. {XP_FILE})")
+    parser.add_argument('--config', help=f"fichier de configuration (ex. {CONFIG_FILE})")
+    parser.add_argument('--guild', type=int, help="serveur auquel rattacher l'XP du fichier")
+    parser.add_argument('--db', default='xp_data.db', help="base SQLite cible")
+    parser.add_argument('--online', action='store_true', help="le bot utilise la base : les index restent en place")
+    args = parser.parse_args()
+    if args.xp and args.guild is None:
+        parser.error("--guild est requis avec --xp")
+    if not args.xp and not args.config:
+        parser.error("--xp ou --config est requis")
+    asyncio.run(_main(args))
@@ -0,0 +1,105 @@
+from math import isqrt
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:  # facultatif : accélère seulement le recalcul en masse
+    numpy = None
+
+# Courbe de progression : il faut LEVEL_BASE * (niveau - 1)² XP pour atteindre un niveau
+LEVEL_BASE = 50
+LEVEL_EXPONENT = 2
+# Seuils précalculés par courbe jusqu'à ce niveau (barre de progression, XP avant le niveau suivant)
+MAX_TABLE_LEVEL = 1000
+
+# Bornes des courbes configurables par serveur (/setlevelcurve)
+MAX_LEVEL_BASE = 100000
+MAX_LEVEL_EXPONENT = 4
+
+
+def _iroot(value: int, exponent: int) -> int:
+    # Racine entière exacte : estimation flottante corrigée d'une unité au besoin
+    if exponent == 1:
+        return value
+    if exponent == 2:
+        return isqrt(value)
+    root = int(round(value ** (1 / exponent)))
+    while root ** exponent > value:
+        root -= 1
+    while (root + 1) ** exponent <= value:
+        root += 1
+    return root
+
+
+class LevelCurve:
+    """Courbe d'un serveur : il faut base * (niveau - 1)^exponent XP pour atteindre un niveau."""
+
+    __slots__ = ('base', 'exponent', '_thresholds')
+
+    def __init__(self, base: Optional[int] = None, exponent: Optional[int] = None):
+        # Colonnes NULL de la table config : courbe par défaut
+        self.base = base or LEVEL_BASE
+        self.exponent = exponent or LEVEL_EXPONENT
+        # Table construite au premier besoin : xp_level() crée une courbe par appel SQL
+        self._thresholds: Optional[Tuple[int, ...]] = None
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, LevelCurve) and (self.base, self.exponent) == (other.base, other.exponent)
+
+    def __hash__(self) -> int:
+        return hash((self.base, self.exponent))
+
+    def __repr__(self) -> str:
+        return f'LevelCurve({self.base}, {self.exponent})'
+
+    @property
+    def is_default(self) -> bool:
+        return self.base == LEVEL_BASE and self.exponent == LEVEL_EXPONENT
+
+    def level_for_xp(self, xp_total: int) -> int:
+        # base * (L - 1)^e <= xp  <=>  (L - 1)^e <= xp // base, pour des entiers
+        return _iroot(max(xp_total, 0) // self.base, self.exponent) + 1
+
+    @property
+    def thresholds(self) -> Tuple[int, ...]:
+        """thresholds[n] : XP minimale du niveau n (index 0 inutilisé), jusqu'à MAX_TABLE_LEVEL + 1."""
+        if self._thresholds is None:
+            self._thresholds = (0,) + tuple(self.base * (level - 1) ** self.exponent
+                                            for level in range(1, MAX_TABLE_LEVEL + 2))
+        return self._thresholds
+
+    def xp_for_level(self, level: int) -> int:
+        if 1 <= level <= MAX_TABLE_LEVEL + 1:
+            return self.thresholds[level]
+        return self.base * (max(level, 1) - 1) ** self.exponent
+
+    def xp_to_next_level(self, xp_total: int) -> int:
+        return self.xp_for_level(self.level_for_xp(xp_total) + 1) - xp_total
+
+    def level_progress(self, xp_total: int) -> Tuple[int, int, int]:
+        """(niveau, XP acquise dans le niveau, XP nécessaire pour le niveau suivant)."""
+        level = self.level_for_xp(xp_total)
+        floor = self.xp_for_level(level)
+        return level, xp_total - floor, self.xp_for_level(level + 1) - floor
+
+    def levels_for(self, xp_totals: Sequence[int]) -> List[int]:
+        """Niveaux d'une tranche de membres, calculés en un seul passage vectorisé si numpy est disponible."""
+        if numpy is None or not xp_totals:
+            return [_iroot(max(xp, 0) // self.base, self.exponent) + 1 for xp in xp_totals]
+        quotient = numpy.maximum(numpy.asarray(xp_totals, dtype=numpy.int64), 0) // self.base
+        if self.exponent == 1:
+            return (quotient + 1).tolist()
+        root = numpy.floor(quotient.astype(numpy.float64) ** (1 / self.exponent)).astype(numpy.int64)
+        # Les erreurs d'arrondi du flottant ne dépassent pas une unité
+        root -= root ** self.exponent > quotient
+        root += (root + 1) ** self.exponent <= quotient
+        return (root + 1).tolist()
+
+
+DEFAULT_CURVE = LevelCurve()
+
+
+def curve_level(xp_total: int, base: Optional[int] = None, exponent: Optional[int] = None) -> int:
+    """Fonction SQL xp_level(xp [, base, exposant]) ; sans paramètres, courbe par défaut."""
+    curve = LevelCurve(base, exponent) if base or exponent else DEFAULT_CURVE
+    return curve.level_for_xp(xp_total or 0)
@@ -0,0 +1,228 @@
+import asyncio
+import bisect
+import functools
+import resource
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import settings
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]  # (nom, labels, valeur)
+
+# Bornes des histogrammes de latence, en secondes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Histogramme à bornes fixes ; observe() ne fait qu'une recherche dichotomique et trois additions."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.series: Dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _labels(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        # Estimation par la borne supérieure du bucket atteint
+        series = self.series.get(_labels(labels))
+        if series is None or not series.count:
+            return None
+        target = q * series.count
+        seen = 0
+        for bound, count in zip(self.buckets, series.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket{_format_labels(key + (("le", le),))} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(key)} {series.total}'
+            yield f'{self.name}_count{_format_labels(key)} {series.count}'
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for key, value in self.values.items():
+            yield f'{self.name}{_format_labels(key)} {value}'
+
+
+class GuildLoad:
+    """Temps de traitement cumulé par serveur, pour repérer celui qui sature le processus."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.seconds: Dict[int, float] = {}
+        self.events: Dict[int, int] = {}
+
+    def add(self, guild_id: int, seconds: float):
+        if guild_id not in self.seconds and len(self.seconds) >= self.maxsize:
+            # Table pleine : on repart de zéro plutôt que de trier à chaque évènement
+            self.seconds.clear()
+            self.events.clear()
+        self.seconds[guild_id] = self.seconds.get(guild_id, 0.0) + seconds
+        self.events[guild_id] = self.events.get(guild_id, 0) + 1
+
+    def top(self, count: int) -> List[Tuple[int, float, int]]:
+        ranked = sorted(self.seconds.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [(guild_id, seconds, self.events[guild_id]) for guild_id, seconds in ranked]
+
+
+class Registry:
+    def __init__(self):
+        self.handler_latency = Histogram('xpbot_handler_seconds', "Durée des listeners et commandes slash")
+        self.handler_errors = Counter('xpbot_handler_errors_total', "Exceptions non gérées par handler")
+        self.query_latency = Histogram('xpbot_db_query_seconds', "Durée des requêtes SQL par appelant")
+        self.write_wait = Histogram('xpbot_db_write_wait_seconds', "Attente du verrou de l'écrivain SQLite")
+        self.loop_lag = Histogram('xpbot_event_loop_lag_seconds', "Retard de la boucle d'évènements")
+        self.guild_load = GuildLoad()
+        self._collectors: Dict[str, Callable[[], Iterable[Sample]]] = {}
+        self.started_at = time.time()
+
+    def register_collector(self, name: str, collector: Callable[[], Iterable[Sample]]):
+        # Jauges calculées à la lecture (tailles de files, ratios de cache...) : rien sur le chemin chaud
+        self._collectors[name] = collector
+
+    def unregister_collector(self, name: str):
+        self._collectors.pop(name, None)
+
+    def gauges(self) -> List[Sample]:
+        samples = []
+        for name, collector in list(self._collectors.items()):
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                print(f"[metrics.{name}] Erreur: {e}")
+        return samples
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.handler_latency, self.handler_errors, self.query_latency, self.write_wait, self.loop_lag):
+            lines.extend(metric.render())
+        declared = set()
+        for name, labels, value in self.gauges():
+            if value is None:
+                continue
+            if name not in declared:
+                declared.add(name)
+                lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{_format_labels(_labels(labels))} {value}')
+        lines.append('# TYPE xpbot_guild_handler_seconds gauge')
+        for guild_id, seconds, _ in self.guild_load.top(settings.METRICS_TOP_GUILDS):
+            lines.append(f'xpbot_guild_handler_seconds{{guild="{guild_id}"}} {seconds}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def rss_bytes() -> int:
+    # Mémoire résidente actuelle (Linux), à défaut le pic depuis le démarrage
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def record_handler(handler: str, elapsed: float, guild=None):
+    REGISTRY.handler_latency.observe(elapsed, handler=handler)
+    if guild is not None:
+        REGISTRY.guild_load.add(guild.id, elapsed)
+
+
+def instrumented(handler: str):
+    """Décorateur de listener ou de tâche : latence, erreurs et charge du serveur concerné."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                REGISTRY.handler_errors.inc(handler=handler)
+                raise
+            finally:
+                # Premier argument après self : message, membre ou interaction, qui portent tous .guild
+                record_handler(handler, time.perf_counter() - started,
+                               getattr(args[1], 'guild', None) if len(args) > 1 else None)
+        return wrapper
+    return decorator
+
+
+async def sample_loop_lag(interval: float):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        REGISTRY.loop_lag.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readline(), timeout=5)
+        # En-têtes ignorés, seule la ligne de requête compte
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+            pass
+        path = request.split(b' ')[1] if request.count(b' ') >= 2 else b''
+        if path == b'/metrics':
+            status, body = '200 OK', REGISTRY.render().encode()
+        else:
+            status, body = '404 Not Found', b'not found\n'
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(host: str, port: int) -> asyncio.AbstractServer:
+    return await asyncio.start_server(_handle_http, host, port)
@@ -0,0 +1,313 @@
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import aiosqlite
+
+from . import settings
+from .periods import PERIODS, period_start
+from .pool import ConnectionPool
+
+# Version du schéma stockée dans PRAGMA user_version (0 : schéma d'origine à clés TEXT)
+LATEST_VERSION = 4
+
+# Mode de l'historique stocké en petit entier
+MODE_IDS = {'text': 0, 'voice': 1}
+MODE_NAMES = {value: name for name, value in MODE_IDS.items()}
+
+LEADERBOARD_COLUMNS = ('text_xp', 'voice_xp', 'messages', 'voice_time')
+
+# Schéma courant ; {name} permet de créer une table de transition pendant une migration
+TABLES = {
+    'xp': '''CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        text_xp INTEGER DEFAULT 0,
+        voice_xp INTEGER DEFAULT 0,
+        messages INTEGER DEFAULT 0,
+        voice_time INTEGER DEFAULT 0,
+        text_level INTEGER DEFAULT 1,
+        voice_level INTEGER DEFAULT 1,
+        notify_enabled INTEGER DEFAULT 1,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID''',
+    'config': '''CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER PRIMARY KEY,
+        cooldown INTEGER DEFAULT 30,
+        notify_channel INTEGER,
+        level_base INTEGER,
+        level_exponent INTEGER
+    )''',
+    'xp_history': '''CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        mode INTEGER NOT NULL,
+        amount INTEGER,
+        timestamp INTEGER
+    )''',
+    # Historique agrégé par heure puis par jour (granularity = durée du bucket en secondes)
+    'xp_history_rollup': '''CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        mode INTEGER NOT NULL,
+        granularity INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        amount INTEGER,
+        PRIMARY KEY (guild_id, user_id, bucket, granularity, mode)
+    ) WITHOUT ROWID''',
+    'voice_sessions': '''CREATE TABLE IF NOT EXISTS {name} (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        channel_id INTEGER,
+        joined_at INTEGER,
+        credited_at INTEGER,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID''',
+    # Compteurs par fenêtre (semaine, mois) ; la fenêtre en tête de clé permet de purger par plage
+    'xp_periods': '''CREATE TABLE IF NOT EXISTS {name} (
+        period INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        text_xp INTEGER DEFAULT 0,
+        voice_xp INTEGER DEFAULT 0,
+        messages INTEGER DEFAULT 0,
+        voice_time INTEGER DEFAULT 0,
+        PRIMARY KEY (period, bucket, guild_id, user_id)
+    ) WITHOUT ROWID''',
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_xp_history_member ON xp_history (guild_id, user_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_xp_history_timestamp ON xp_history (timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_xp_history_rollup_bucket ON xp_history_rollup (granularity, bucket)',
+] + [f'CREATE INDEX IF NOT EXISTS idx_xp_guild_{col} ON xp (guild_id, {col}, user_id)' for col in LEADERBOARD_COLUMNS] + [
+    f'CREATE INDEX IF NOT EXISTS idx_xp_periods_{col} ON xp_periods (period, bucket, guild_id, {col}, user_id)'
+    for col in LEADERBOARD_COLUMNS]
+LEADERBOARD_INDEXES = [f'idx_xp_guild_{col}' for col in LEADERBOARD_COLUMNS]
+
+Progress = Optional[Callable[[str, int], None]]
+
+
+async def get_version(db: aiosqlite.Connection) -> int:
+    async with db.execute('PRAGMA user_version') as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def create_schema(db: aiosqlite.Connection):
+    # Crée uniquement ce qui manque : les tables d'une base à migrer restent intactes
+    for name, ddl in TABLES.items():
+        await db.execute(ddl.format(name=name))
+    for ddl in INDEXES:
+        await db.execute(ddl)
+
+
+async def _copy_by_rowid(pool: ConnectionPool, source: str, target: str, select: str, high: int, progress: Progress):
+    # Lignes présentes au démarrage seulement (rowid <= high) : les suivantes passent par les déclencheurs
+    async with pool.read() as db:
+        async with db.execute(f'SELECT MIN(rowid) FROM {source}') as cursor:
+            low = (await cursor.fetchone())[0]
+    if low is None:
+        return
+    copied = 0
+    chunk = settings.MIGRATION_CHUNK_ROWS
+    for start in range(low, high + 1, chunk):
+        # Verrou d'écriture pris par lot : les flush et commandes passent entre deux lots
+        async with pool.write() as db:
+            cursor = await db.execute(f'INSERT OR REPLACE INTO {target} {select} FROM {source} WHERE rowid >= ? AND rowid < ?',
+                                      (start, min(start + chunk, high + 1)))
+            copied += cursor.rowcount
+        if progress:
+            progress(source, copied)
+
+
+async def _copy_by_guild(pool: ConnectionPool, source: str, target: str, select: str, high: int, progress: Progress):
+    # Tables WITHOUT ROWID : un lot par serveur, en suivant le préfixe de la clé primaire
+    async with pool.read() as db:
+        async with db.execute(f'SELECT DISTINCT guild_id FROM {source}') as cursor:
+            guilds = [row[0] for row in await cursor.fetchall()]
+    copied = 0
+    for guild_id in guilds:
+        async with pool.write() as db:
+            cursor = await db.execute(f'INSERT OR REPLACE INTO {target} {select} FROM {source} WHERE guild_id = ?', (guild_id,))
+            copied += cursor.rowcount
+        if progress:
+            progress(source, copied)
+
+
+def mode_id_sql(column: str = 'mode') -> str:
+    # Conversion du mode (TEXT en v1) vers son identifiant entier
+    return f"CASE {column} WHEN 'voice' THEN 1 WHEN 1 THEN 1 ELSE 0 END"
+
+
+# Tables converties par la migration v2 : copie, colonnes converties, clé primaire de la nouvelle table
+# et son expression sur les colonnes de l'ancienne (None : table sans clé, uniquement alimentée par INSERT)
+_V2_COPIES = [
+    ('xp', _copy_by_rowid, '''SELECT CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), text_xp, voice_xp, messages,
+        voice_time, text_level, voice_level, notify_enabled''',
+     ('guild_id, user_id', 'CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER)')),
+    ('config', _copy_by_rowid, 'SELECT CAST(guild_id AS INTEGER), cooldown, notify_channel, NULL, NULL',
+     ('guild_id', 'CAST(guild_id AS INTEGER)')),
+    ('xp_history', _copy_by_rowid, f'''SELECT CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), {mode_id_sql()},
+        amount, timestamp''', None),
+    ('xp_history_rollup', _copy_by_guild, f'''SELECT CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), {mode_id_sql()},
+        granularity, bucket, amount''',
+     ('guild_id, user_id, mode, granularity, bucket',
+      f'CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), {mode_id_sql()}, granularity, bucket')),
+    ('voice_sessions', _copy_by_guild, '''SELECT CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), channel_id,
+        joined_at, credited_at''',
+     ('guild_id, user_id', 'CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER)')),
+]
+
+
+async def _mirror_triggers(db: aiosqlite.Connection, table: str, select: str, key, high: int):
+    """Déclencheurs temporaires (connexion de l'écrivain) qui recopient les écritures faites pendant la copie."""
+    async with db.execute(f'PRAGMA table_info({table})') as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    target = f'{table}_v2'
+
+    def row(alias: str) -> str:
+        return '(SELECT ' + ', '.join(f'{alias}.{column} AS {column}' for column in columns) + ')'
+
+    insert = f'INSERT OR REPLACE INTO {target} {select} FROM {row("NEW")};'
+    if key is None:
+        # Historique : seules les lignes ajoutées après le relevé de high, sans mise à jour ni suppression
+        await db.execute(f'''CREATE TEMP TRIGGER {target}_insert AFTER INSERT ON main.{table}
+            WHEN NEW.rowid > {high} BEGIN {insert} END''')
+        return
+    key_columns, key_select = key
+    delete = f'DELETE FROM {target} WHERE ({key_columns}) IN (SELECT {key_select} FROM {row("OLD")});'
+    await db.execute(f'CREATE TEMP TRIGGER {target}_insert AFTER INSERT ON main.{table} BEGIN {insert} END')
+    await db.execute(f'CREATE TEMP TRIGGER {target}_update AFTER UPDATE ON main.{table} BEGIN {delete} {insert} END')
+    await db.execute(f'CREATE TEMP TRIGGER {target}_delete AFTER DELETE ON main.{table} BEGIN {delete} END')
+
+
+async def _drop_mirror_triggers(db: aiosqlite.Connection):
+    for table, _, _, _ in _V2_COPIES:
+        for event in ('insert', 'update', 'delete'):
+            await db.execute(f'DROP TRIGGER IF EXISTS temp.{table}_v2_{event}')
+
+
+async def _prepare_v2(pool: ConnectionPool, progress: Progress):
+    # Clés snowflake en INTEGER, table xp en WITHOUT ROWID groupée par (guild_id, user_id), mode en entier.
+    # Nouvelles tables remplies par lots pendant que le bot écrit dans les anciennes ; les déclencheurs
+    # y reportent chaque écriture, la bascule se fait ensuite dans finish
+    try:
+        for table, copy, select, key in _V2_COPIES:
+            async with pool.write() as db:
+                await db.execute(f'DROP TABLE IF EXISTS {table}_v2')
+                await db.execute(TABLES[table].format(name=f'{table}_v2'))
+                async with db.execute(f"SELECT MAX(rowid) FROM {table}" if copy is _copy_by_rowid else 'SELECT 0') as cursor:
+                    high = (await cursor.fetchone())[0] or 0
+                await _mirror_triggers(db, table, select, key, high)
+            await copy(pool, table, f'{table}_v2', select, high, progress)
+    except BaseException:
+        async with pool.write() as db:
+            await _drop_mirror_triggers(db)
+        raise
+
+
+async def _finish_v2(db: aiosqlite.Connection):
+    # Bascule atomique : anciennes tables (et leurs index) remplacées par les nouvelles, validée avec le
+    # nouveau user_version ; les index sont recréés ensuite par migrate(), un par transaction
+    await _drop_mirror_triggers(db)
+    for table, _, _, _ in _V2_COPIES:
+        await db.execute(f'DROP TABLE {table}')
+        await db.execute(f'ALTER TABLE {table}_v2 RENAME TO {table}')
+
+
+_MAX_SNOWFLAKE = 2 ** 63 - 1
+
+
+async def _prepare_v3(pool: ConnectionPool, progress: Progress):
+    # Compteurs des fenêtres en cours reconstruits depuis l'historique (XP uniquement :
+    # messages et temps vocal n'y figurent pas et démarrent à zéro) ; une transaction par serveur et
+    # par tranche de MIGRATION_CHUNK_ROWS membres, sur les index (guild_id, user_id, ...) de l'historique
+    now = int(time.time())
+    async with pool.read() as db:
+        async with db.execute('SELECT DISTINCT guild_id FROM xp_history UNION SELECT DISTINCT guild_id FROM xp_history_rollup') as cursor:
+            guilds = [row[0] for row in await cursor.fetchall()]
+    rows = 0
+    for guild_id in guilds:
+        low = -1
+        while low < _MAX_SNOWFLAKE:
+            async with pool.read() as db:
+                async with db.execute('SELECT user_id FROM xp WHERE guild_id=? AND user_id > ? ORDER BY user_id LIMIT 1 OFFSET ?',
+                                      (guild_id, low, max(1, settings.MIGRATION_CHUNK_ROWS) - 1)) as cursor:
+                    row = await cursor.fetchone()
+            # Dernière tranche ouverte : couvre aussi les membres présents seulement dans l'historique
+            high = row[0] if row else _MAX_SNOWFLAKE
+            async with pool.write() as db:
+                for period in PERIODS.values():
+                    start = period_start(period, now)
+                    await db.execute('DELETE FROM xp_periods WHERE period=? AND bucket=? AND guild_id=? AND user_id > ? AND user_id <= ?',
+                                     (period, start, guild_id, low, high))
+                    async with db.execute('''INSERT INTO xp_periods (period, bucket, guild_id, user_id, text_xp, voice_xp)
+                        SELECT ?1, ?2, guild_id, user_id, SUM(CASE mode WHEN 0 THEN amount ELSE 0 END),
+                            SUM(CASE mode WHEN 1 THEN amount ELSE 0 END)
+                        FROM (SELECT guild_id, user_id, mode, amount FROM xp_history
+                                WHERE guild_id = ?3 AND user_id > ?4 AND user_id <= ?5 AND timestamp >= ?2
+                            UNION ALL
+                            SELECT guild_id, user_id, mode, amount FROM xp_history_rollup
+                                WHERE guild_id = ?3 AND user_id > ?4 AND user_id <= ?5 AND bucket >= ?2)
+                        GROUP BY guild_id, user_id''', (period, start, guild_id, low, high)) as cursor:
+                        rows += cursor.rowcount
+            low = high
+            if progress:
+                progress('xp_periods', rows)
+
+
+async def _finish_v4(db: aiosqlite.Connection):
+    # Courbe de progression par serveur : colonnes NULL = courbe par défaut, aucune ligne à réécrire.
+    # Une base passée par la migration v2 a déjà la table config au format courant
+    async with db.execute('PRAGMA table_info(config)') as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    for column in ('level_base', 'level_exponent'):
+        if column not in columns:
+            await db.execute(f'ALTER TABLE config ADD COLUMN {column} INTEGER')
+
+
+# Version -> (préparation par lots, verrou pris à chaque lot ; bascule finale, validée avec le user_version)
+MIGRATIONS: Dict[int, Tuple[Optional[Callable[[ConnectionPool, Progress], Awaitable[None]]],
+                            Optional[Callable[[aiosqlite.Connection], Awaitable[None]]]]] = {
+    2: (_prepare_v2, _finish_v2),
+    3: (_prepare_v3, None),
+    4: (None, _finish_v4),
+}
+
+
+async def migrate(pool: ConnectionPool, progress: Progress = None,
+                  on_version: Optional[Callable[[int], None]] = None) -> int:
+    """Applique les migrations manquantes sans bloquer les autres écritures plus d'un lot à la fois.
+
+    on_version est appelé dès qu'une version est validée, avant que la moindre autre écriture ne passe.
+    """
+    async with pool.read() as db:
+        version = max(await get_version(db), 1)
+    while version < LATEST_VERSION:
+        prepare, finish = MIGRATIONS[version + 1]
+        if prepare is not None:
+            await prepare(pool, progress)
+        async with pool.write() as db:
+            # sqlite3 n'ouvre pas de transaction avant un DDL : sans BEGIN explicite, chaque DROP / ALTER serait
+            # validé seul et un lecteur pourrait voir la base entre deux tables
+            await db.execute('BEGIN IMMEDIATE')
+            if finish is not None:
+                await finish(db)
+            await db.execute(f'PRAGMA user_version={version + 1}')
+        # Verrou relâché sans rendre la main : les écritures en attente voient déjà la nouvelle version
+        version += 1
+        if on_version:
+            on_version(version)
+        # Index supprimés avec les anciennes tables recréés avant l'étape suivante, un par transaction
+        for ddl in INDEXES:
+            async with pool.write() as db:
+                await db.execute(ddl)
+    return version
+
+
+async def vacuum(pool: ConnectionPool):
+    """Récupère l'espace libéré par les anciennes tables. Bloque les écritures pendant toute sa durée :
+    étape facultative (XP_MIGRATION_VACUUM=1), à réserver à une période creuse."""
+    async with pool.write() as db:
+        await db.commit()
+        await db.execute('VACUUM')
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional
+
+import discord
+
+from . import settings
+from .cache import LRUCache
+
+# Nombre maximal d'IDs par requête REQUEST_GUILD_MEMBERS
+QUERY_BATCH = 100
+
+
+class NameResolver:
+    """Noms d'affichage des membres à la demande, sans dépendre du cache de membres de discord.py.
+
+    Seuls les IDs d'une page de classement sont résolus : cache borné d'abord, puis cache de
+    discord.py, puis une requête query_members groupée pour les manquants.
+    """
+
+    def __init__(self, maxsize: int = settings.NAME_CACHE_SIZE, ttl: float = settings.NAME_CACHE_TTL_SECONDS):
+        # (guild_id, user_id) -> (nom ou None si le membre a quitté le serveur, expiration)
+        self.cache = LRUCache(maxsize)
+        self.ttl = ttl
+        self.queries = 0
+        self.failures = 0
+
+    def _store(self, guild_id: int, user_id: int, name: Optional[str], now: float):
+        self.cache.set((guild_id, user_id), (name, now + self.ttl))
+
+    async def resolve(self, guild, user_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        now = time.monotonic()
+        names: Dict[int, Optional[str]] = {}
+        missing: List[int] = []
+        for user_id in user_ids:
+            entry = self.cache.get((guild.id, user_id))
+            if entry is not None and entry[1] > now:
+                names[user_id] = entry[0]
+                continue
+            member = guild.get_member(user_id)
+            if member is not None:
+                names[user_id] = member.display_name
+                self._store(guild.id, user_id, member.display_name, now)
+            else:
+                missing.append(user_id)
+        for start in range(0, len(missing), QUERY_BATCH):
+            batch = missing[start:start + QUERY_BATCH]
+            try:
+                # cache=False : les membres trouvés ne sont gardés que dans ce cache borné
+                members = await guild.query_members(user_ids=batch, limit=len(batch), cache=False)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                self.failures += 1
+                print(f"[NameResolver] Erreur: {e}")
+                break
+            self.queries += 1
+            found = {member.id: member.display_name for member in members}
+            for user_id in batch:
+                # Un membre absent de la réponse a quitté le serveur : mémorisé pour ne pas le redemander
+                names[user_id] = found.get(user_id)
+                self._store(guild.id, user_id, names[user_id], now)
+        return names
@@ -0,0 +1,162 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from . import settings
+
+MESSAGE_LIMIT = 2000
+
+
+class LevelUp:
+    __slots__ = ('channel', 'member', 'level', 'notify')
+
+    def __init__(self, channel, member, level: int, notify: bool):
+        self.channel = channel
+        self.member = member
+        self.level = level
+        self.notify = notify
+
+
+class LevelUpDispatcher:
+    """File bornée de level-ups, un worker par salon qui regroupe les annonces et les rôles."""
+
+    def __init__(self, levelup_roles: Dict[int, int],
+                 queue_size: int = settings.NOTIFY_QUEUE_SIZE,
+                 window: float = settings.NOTIFY_COALESCE_SECONDS,
+                 idle_timeout: float = settings.NOTIFY_WORKER_IDLE_SECONDS):
+        self.levelup_roles = levelup_roles
+        self.window = window
+        self.idle_timeout = idle_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.channels: Dict[int, asyncio.Queue] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self._router: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.dropped = 0
+        self.messages_sent = 0
+
+    def start(self):
+        if self._router is None:
+            self._router = asyncio.create_task(self._route())
+
+    def submit(self, event: LevelUp) -> bool:
+        # Jamais bloquant pour le chemin d'écriture : la file pleine fait perdre l'annonce
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            # Le niveau est déjà en base : les rôles manquants sont attribués quand même, sans annonce
+            if self._missing_roles(event.member, event.level):
+                self._dispatch(LevelUp(event.channel, event.member, event.level, False))
+            return False
+        self.submitted += 1
+        return True
+
+    def _dispatch(self, event: LevelUp):
+        channel_id = event.channel.id
+        queue = self.channels.get(channel_id)
+        if queue is None:
+            queue = self.channels[channel_id] = asyncio.Queue()
+            self.workers[channel_id] = asyncio.create_task(self._channel_worker(channel_id, queue))
+        queue.put_nowait(event)
+
+    async def _route(self):
+        while True:
+            event = await self.queue.get()
+            self._dispatch(event)
+            self.queue.task_done()
+
+    async def _channel_worker(self, channel_id: int, queue: asyncio.Queue):
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        return
+                    continue
+                # Fenêtre de regroupement : les level-ups suivants partent dans le même message
+                await asyncio.sleep(self.window)
+                batch = [first]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                try:
+                    await self._deliver(batch)
+                except Exception as e:
+                    print(f"[LevelUpDispatcher] Erreur: {e}")
+                finally:
+                    for _ in batch:
+                        queue.task_done()
+        finally:
+            self.channels.pop(channel_id, None)
+            self.workers.pop(channel_id, None)
+
+    def _missing_roles(self, member, level: int) -> List[int]:
+        # Tous les paliers atteints, pas seulement le niveau exact : un gain groupé (arriéré réglé, crédit
+        # vocal, courbe raide) peut franchir plusieurs niveaux d'un coup
+        owned = {role.id for role in member.roles}
+        return [role_id for threshold, role_id in sorted(self.levelup_roles.items())
+                if threshold <= level and role_id not in owned]
+
+    async def _deliver(self, batch: List[LevelUp]):
+        channel = batch[0].channel
+        # Un seul niveau (le plus haut) et un seul appel add_roles par membre
+        members: Dict[int, LevelUp] = {}
+        for event in batch:
+            current = members.get(event.member.id)
+            if current is None or event.level > current.level:
+                members[event.member.id] = event
+        lines = []
+        for event in members.values():
+            granted = [role for role in map(channel.guild.get_role, self._missing_roles(event.member, event.level)) if role]
+            if granted:
+                # Permission manquante ou membre parti : les autres membres du lot gardent leurs rôles
+                try:
+                    await event.member.add_roles(*granted)
+                except Exception as e:
+                    print(f"[LevelUpDispatcher] Erreur: {e}")
+                    granted = []
+            if event.notify:
+                lines.append(f"🎉 {event.member.mention} passe niveau {event.level} en texte !")
+                lines.extend(f"{event.member.mention} a débloqué le rôle {role.mention} !" for role in granted)
+        await self._send(channel, lines)
+
+    async def _send(self, channel, lines: List[str]):
+        chunk = ''
+        for line in lines:
+            if chunk and len(chunk) + len(line) + 1 > MESSAGE_LIMIT:
+                await channel.send(chunk)
+                self.messages_sent += 1
+                chunk = ''
+            chunk = f"{chunk}\n{line}" if chunk else line
+        if chunk:
+            await channel.send(chunk)
+            self.messages_sent += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': self.queue.qsize() + sum(queue.qsize() for queue in self.channels.values()),
+            'workers': len(self.workers),
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'messages_sent': self.messages_sent,
+        }
+
+    async def _drain(self):
+        await self.queue.join()
+        for queue in list(self.channels.values()):
+            await queue.join()
+
+    async def close(self, timeout: float = settings.NOTIFY_CLOSE_TIMEOUT_SECONDS):
+        # Le niveau est déjà en base : les rôles et annonces en file partent avant l'arrêt
+        if self._router is not None:
+            try:
+                await asyncio.wait_for(self._drain(), timeout)
+            except asyncio.TimeoutError:
+                print(f"[LevelUpDispatcher] Arrêt : {self.stats()['queued']} level-ups non livrés")
+        tasks = list(self.workers.values())
+        if self._router is not None:
+            tasks.append(self._router)
+            self._router = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
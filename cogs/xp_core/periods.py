@@ -0,0 +1,33 @@
+import calendar
+import functools
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+# Fenêtres des classements périodiques, stockées en petit entier dans xp_periods.period
+PERIODS = {'week': 0, 'month': 1}
+PERIOD_NAMES = {value: name for name, value in PERIODS.items()}
+
+DAY = 86400
+WEEK = 7 * DAY
+# Le 1er janvier 1970 était un jeudi : décalage pour faire commencer les semaines le lundi (UTC)
+_MONDAY_OFFSET = 4 * DAY
+
+
+@functools.lru_cache(maxsize=64)
+def _month_start(day: int, back: int) -> int:
+    date = datetime.fromtimestamp(day * DAY, timezone.utc)
+    month = date.year * 12 + date.month - 1 - back
+    return calendar.timegm((month // 12, month % 12 + 1, 1, 0, 0, 0))
+
+
+def period_start(period: int, timestamp: int, back: int = 0) -> int:
+    """Début (UTC) de la fenêtre contenant timestamp, ou de la back-ième fenêtre précédente."""
+    if period == PERIODS['week']:
+        return (timestamp - _MONDAY_OFFSET) // WEEK * WEEK + _MONDAY_OFFSET - back * WEEK
+    return _month_start(timestamp // DAY, back)
+
+
+def current_buckets(now: Optional[int] = None) -> List[Tuple[int, int]]:
+    now = int(time.time()) if now is None else now
+    return [(period, period_start(period, now)) for period in PERIODS.values()]
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from . import settings
+from .metrics import REGISTRY
+
+# Pragmas appliqués à chaque connexion
+_COMMON_PRAGMAS = (
+    f'PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}',
+    f'PRAGMA cache_size=-{settings.DB_CACHE_KIB}',
+    f'PRAGMA mmap_size={settings.DB_MMAP_BYTES}',
+    'PRAGMA temp_store=MEMORY',
+)
+_WRITER_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+)
+_READER_PRAGMAS = (
+    'PRAGMA query_only=ON',
+)
+
+
+class ConnectionPool:
+    """Connexions SQLite longue durée : un écrivain unique et quelques lecteurs en WAL.
+
+    read_only : lecteurs seulement, l'écrivain appartient à un autre processus (workers du lanceur).
+    """
+
+    def __init__(self, db_path: str, readers: int = settings.DB_READERS,
+                 functions: Optional[Dict[str, Tuple[int, Callable]]] = None, read_only: bool = False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.reader_count = max(1, readers)
+        # Fonctions SQL déterministes enregistrées sur chaque connexion
+        self.functions = functions or {}
+        self.writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._idle is not None
+
+    @property
+    def idle_readers(self) -> int:
+        return self._idle.qsize() if self._idle is not None else 0
+
+    async def open(self):
+        if self.is_open:
+            return
+        if not self.read_only:
+            # cached_statements : cache des requêtes préparées de sqlite3, par connexion
+            writer = await aiosqlite.connect(self.db_path, cached_statements=settings.DB_STATEMENT_CACHE)
+            for pragma in _WRITER_PRAGMAS + _COMMON_PRAGMAS:
+                await writer.execute(pragma)
+            await writer.commit()
+            await self._register_functions(writer)
+            self.writer = writer
+        idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.reader_count):
+            reader = await aiosqlite.connect(self._reader_uri(), uri=True,
+                                             cached_statements=settings.DB_STATEMENT_CACHE)
+            for pragma in _READER_PRAGMAS + _COMMON_PRAGMAS:
+                await reader.execute(pragma)
+            await self._register_functions(reader)
+            self._readers.append(reader)
+            idle.put_nowait(reader)
+        self._idle = idle
+
+    async def _register_functions(self, db: aiosqlite.Connection):
+        for name, (num_params, func) in self.functions.items():
+            await db.create_function(name, num_params, func, deterministic=True)
+
+    def _reader_uri(self) -> str:
+        # Base en mémoire : les lecteurs ne verraient pas les données de l'écrivain
+        if self.db_path == ':memory:':
+            raise ValueError("ConnectionPool nécessite un fichier de base de données.")
+        return f'file:{self.db_path}?mode=ro'
+
+    async def close(self):
+        readers, self._readers = self._readers, []
+        for reader in readers:
+            await reader.close()
+        self._idle = None
+        if self.writer is not None:
+            async with self._write_lock:
+                writer, self.writer = self.writer, None
+                await writer.close()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Transaction d'écriture : commit en sortie, rollback en cas d'erreur."""
+        if self.read_only:
+            raise RuntimeError("Base XP ouverte en lecture seule : les écritures passent par le processus de stockage.")
+        if self.writer is None:
+            raise RuntimeError("La base de données XP n'est pas ouverte.")
+        started = time.perf_counter()
+        async with self._write_lock:
+            REGISTRY.write_wait.observe(time.perf_counter() - started)
+            try:
+                yield self.writer
+            except BaseException:
+                await self.writer.rollback()
+                raise
+            await self.writer.commit()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._idle is None:
+            raise RuntimeError("La base de données XP n'est pas ouverte.")
+        idle = self._idle
+        reader = await idle.get()
+        try:
+            yield reader
+        finally:
+            idle.put_nowait(reader)
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Callable, Optional
+
+from . import settings
+from .levels import LevelCurve
+from .pool import ConnectionPool
+
+Progress = Optional[Callable[[str, int], None]]
+
+# La ligne n'est mise à jour que si l'XP n'a pas changé depuis la lecture : sinon le flush
+# l'a déjà réécrite avec un niveau calculé sur la nouvelle courbe
+_UPDATE_LEVELS = '''UPDATE xp SET text_level=?, voice_level=?
+    WHERE guild_id=? AND user_id=? AND text_xp=? AND voice_xp=?'''
+
+
+async def recompute_levels(pool: ConnectionPool, guild_id: int, curve: LevelCurve,
+                           chunk: int = settings.LEVEL_RECALC_CHUNK_ROWS, progress: Progress = None) -> int:
+    """Recalcule text_level / voice_level de tous les membres d'un serveur avec sa courbe.
+
+    Parcours par tranches de clé primaire (guild_id, user_id) sur un lecteur ; seules les lignes
+    dont le niveau change sont réécrites, une transaction courte par tranche.
+    """
+    updated = 0
+    scanned = 0
+    last = -1
+    while True:
+        async with pool.read() as db:
+            async with db.execute('''SELECT user_id, text_xp, voice_xp, text_level, voice_level FROM xp
+                    WHERE guild_id=? AND user_id > ? ORDER BY user_id LIMIT ?''', (guild_id, last, max(1, chunk))) as cursor:
+                rows = await cursor.fetchall()
+        if not rows:
+            return updated
+        last = rows[-1][0]
+        scanned += len(rows)
+        user_ids, text_xp, voice_xp, text_levels, voice_levels = zip(*rows)
+        changes = [(text_level, voice_level, guild_id, user_id, text, voice)
+                   for user_id, text, voice, old_text, old_voice, text_level, voice_level
+                   in zip(user_ids, text_xp, voice_xp, text_levels, voice_levels,
+                          curve.levels_for(text_xp), curve.levels_for(voice_xp))
+                   if text_level != old_text or voice_level != old_voice]
+        if changes:
+            async with pool.write() as db:
+                await db.executemany(_UPDATE_LEVELS, changes)
+            updated += len(changes)
+        if progress:
+            progress(f'serveur {guild_id}', scanned)
+        # Les écritures différées du bot passent entre deux tranches
+        await asyncio.sleep(0)
@@ -0,0 +1,56 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+from . import settings
+from .cache import LRUCache
+from .levels import DEFAULT_CURVE, LevelCurve
+
+CARD_SIZE = (400, 100)
+CARD_COLOR = (73, 109, 137)
+BAR_BOX = (200, 72, 390, 82)
+
+
+class ProfileRenderer:
+    """Cartes de profil dessinées hors de la boucle d'évènements, PNG encodés gardés en cache LRU."""
+
+    def __init__(self, workers: int = settings.RENDER_WORKERS,
+                 cache_size: int = settings.RENDER_CACHE_SIZE,
+                 xp_bucket: int = settings.PROFILE_XP_BUCKET):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='profile-render')
+        self.cache = LRUCache(cache_size)
+        self.xp_bucket = max(1, xp_bucket)
+        # Police et fond chargés une seule fois
+        self.font = ImageFont.load_default()
+        self.template = Image.new('RGB', CARD_SIZE, color=CARD_COLOR)
+        ImageDraw.Draw(self.template).rectangle(BAR_BOX, outline=(255, 255, 255))
+
+    def _render(self, display_name: str, level: int, xp: int, curve: LevelCurve) -> bytes:
+        img = self.template.copy()
+        d = ImageDraw.Draw(img)
+        d.text((10, 10), display_name, font=self.font, fill=(255, 255, 0))
+        d.text((10, 40), f"Niveau: {level}", font=self.font, fill=(255, 255, 255))
+        d.text((10, 70), f"XP: {xp}", font=self.font, fill=(255, 255, 255))
+        # Barre de progression vers le niveau suivant
+        _, into_level, level_span = curve.level_progress(xp)
+        left, top, right, bottom = BAR_BOX
+        d.rectangle((left, top, left + int((right - left) * into_level / level_span), bottom), fill=(255, 255, 0))
+        output = io.BytesIO()
+        img.save(output, format='PNG')
+        return output.getvalue()
+
+    async def render(self, user_id: int, display_name: str, level: int, xp: int,
+                     curve: LevelCurve = DEFAULT_CURVE) -> io.BytesIO:
+        # L'XP est regroupée par tranches : la carte peut afficher jusqu'à xp_bucket XP de retard
+        key = (user_id, level, xp // self.xp_bucket, display_name, curve)
+        data = self.cache.get(key)
+        if data is None:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self.executor, self._render, display_name, level, xp, curve)
+            self.cache.set(key, data)
+        return io.BytesIO(data)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import aiosqlite
+
+from . import settings
+from .migrations import LATEST_VERSION, Progress, mode_id_sql
+from .pool import ConnectionPool
+
+# Politiques de fusion d'une base importée avec la base en service :
+#   replace : les valeurs de l'import remplacent celles de la base
+#   max     : on garde la plus grande valeur (restauration d'une sauvegarde sans perdre l'XP gagnée depuis)
+#   sum     : les compteurs sont additionnés (fusion de deux bases distinctes)
+POLICIES = ('replace', 'max', 'sum')
+
+_COUNTERS = ('text_xp', 'voice_xp', 'messages', 'voice_time')
+
+_MERGE = {
+    'replace': 'excluded.{col}',
+    'max': 'MAX({col}, excluded.{col})',
+    'sum': '{col}+excluded.{col}',
+}
+
+# Colonnes attendues dans la base source ; les tables d'historique sont facultatives
+REQUIRED_TABLES = {
+    'xp': {'guild_id', 'user_id', *_COUNTERS},
+    'config': {'guild_id', 'cooldown', 'notify_channel'},
+}
+OPTIONAL_TABLES = {
+    'xp_history': {'guild_id', 'user_id', 'mode', 'amount', 'timestamp'},
+    'xp_history_rollup': {'guild_id', 'user_id', 'mode', 'granularity', 'bucket', 'amount'},
+    'xp_periods': {'period', 'bucket', 'guild_id', 'user_id', *_COUNTERS},
+}
+
+SourceTable = Tuple[List[str], Set[str]]  # (clé primaire, colonnes)
+
+
+def _xp_sql(policy: str, columns: Set[str]) -> str:
+    merged = {col: _MERGE[policy].format(col=col) for col in _COUNTERS}
+    assignments = ', '.join(f'{col}={expr}' for col, expr in merged.items())
+    notify = 'notify_enabled' if 'notify_enabled' in columns else '1'
+    replace_notify = ', notify_enabled=excluded.notify_enabled' if policy == 'replace' else ''
+    # xp_level sans paramètres : courbe par défaut, les serveurs à courbe personnalisée sont recalculés après l'import
+    return f'''INSERT INTO xp (guild_id, user_id, text_xp, voice_xp, messages, voice_time, text_level, voice_level, notify_enabled)
+        SELECT CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), text_xp, voice_xp, messages, voice_time,
+            xp_level(text_xp), xp_level(voice_xp), {notify} FROM src.xp WHERE {{chunk}}
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET {assignments},
+            text_level=xp_level({merged['text_xp']}), voice_level=xp_level({merged['voice_xp']}){replace_notify}'''
+
+
+def _config_sql(policy: str, columns: Set[str]) -> str:
+    # Courbe de progression absente des sauvegardes antérieures au schéma v4 : courbe par défaut
+    curve = 'level_base, level_exponent' if 'level_base' in columns else 'NULL, NULL'
+    if policy == 'replace':
+        update = ('cooldown=excluded.cooldown, notify_channel=excluded.notify_channel, '
+                  'level_base=excluded.level_base, level_exponent=excluded.level_exponent')
+    else:
+        # La configuration en service est conservée, seuls un salon ou une courbe manquants sont complétés
+        update = ('notify_channel=COALESCE(notify_channel, excluded.notify_channel), '
+                  'level_base=COALESCE(level_base, excluded.level_base), '
+                  'level_exponent=COALESCE(level_exponent, excluded.level_exponent)')
+    return f'''INSERT INTO config (guild_id, cooldown, notify_channel, level_base, level_exponent)
+        SELECT CAST(guild_id AS INTEGER), cooldown, notify_channel, {curve} FROM src.config WHERE {{chunk}}
+        ON CONFLICT(guild_id) DO UPDATE SET {update}'''
+
+
+def _history_sql(policy: str, columns: Set[str]) -> str:
+    # Hors fusion additive, un évènement déjà présent (même membre, instant, mode et montant) n'est pas recopié
+    dedup = '' if policy == 'sum' else f'''AND NOT EXISTS (SELECT 1 FROM xp_history AS h
+            WHERE h.guild_id=CAST(s.guild_id AS INTEGER) AND h.user_id=CAST(s.user_id AS INTEGER)
+            AND h.timestamp=s.timestamp AND h.mode={mode_id_sql('s.mode')} AND h.amount=s.amount)'''
+    return f'''INSERT INTO xp_history (guild_id, user_id, mode, amount, timestamp)
+        SELECT CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), {mode_id_sql('s.mode')}, amount, timestamp
+        FROM src.xp_history AS s WHERE {{chunk}} {dedup}'''
+
+
+def _rollup_sql(policy: str, columns: Set[str]) -> str:
+    return f'''INSERT INTO xp_history_rollup (guild_id, user_id, mode, granularity, bucket, amount)
+        SELECT CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), {mode_id_sql()}, granularity, bucket, amount
+        FROM src.xp_history_rollup WHERE {{chunk}}
+        ON CONFLICT DO UPDATE SET amount={_MERGE[policy].format(col='amount')}'''
+
+
+def _periods_sql(policy: str, columns: Set[str]) -> str:
+    assignments = ', '.join(f'{col}={_MERGE[policy].format(col=col)}' for col in _COUNTERS)
+    return f'''INSERT INTO xp_periods (period, bucket, guild_id, user_id, text_xp, voice_xp, messages, voice_time)
+        SELECT period, bucket, CAST(guild_id AS INTEGER), CAST(user_id AS INTEGER), text_xp, voice_xp, messages, voice_time
+        FROM src.xp_periods WHERE {{chunk}}
+        ON CONFLICT DO UPDATE SET {assignments}'''
+
+
+_STATEMENTS = {
+    'xp': _xp_sql,
+    'config': _config_sql,
+    'xp_history': _history_sql,
+    'xp_history_rollup': _rollup_sql,
+    'xp_periods': _periods_sql,
+}
+
+
+async def validate_source(db: aiosqlite.Connection) -> Dict[str, SourceTable]:
+    """Vérifie la version et le schéma de la base attachée sous le nom src."""
+    async with db.execute('PRAGMA src.user_version') as cursor:
+        version = (await cursor.fetchone())[0]
+    if version > LATEST_VERSION:
+        raise ValueError(f"Schéma version {version} plus récent que celui du bot ({LATEST_VERSION})")
+    tables = {}
+    for table, required in {**REQUIRED_TABLES, **OPTIONAL_TABLES}.items():
+        async with db.execute(f'PRAGMA src.table_info({table})') as cursor:
+            info = await cursor.fetchall()
+        if not info and table in OPTIONAL_TABLES:
+            continue
+        columns = {row[1] for row in info}
+        missing = required - columns
+        if missing:
+            raise ValueError(f"Table {table} invalide, colonnes manquantes : {', '.join(sorted(missing))}")
+        # Colonnes de la clé primaire dans leur ordre ; rowid pour les tables sans clé
+        primary_key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+        tables[table] = (primary_key or ['rowid'], columns)
+    return tables
+
+
+async def _merge_table(pool: ConnectionPool, table: str, sql: str, key: List[str], progress: Progress,
+                       guild_filter: str = '') -> int:
+    # Découpage par plages de clé primaire : chaque lot est une transaction courte
+    columns = ', '.join(key)
+    placeholders = ', '.join('?' * len(key))
+    merged = 0
+    last: Optional[Tuple] = None
+    while True:
+        after = f'({columns}) > ({placeholders})' if last else 'true'
+        async with pool.write() as db:
+            async with db.execute(f'SELECT {columns} FROM src.{table} WHERE {after} ORDER BY {columns} LIMIT 1 OFFSET ?',
+                                  (*(last or ()), settings.IMPORT_CHUNK_ROWS - 1)) as cursor:
+                bound = await cursor.fetchone()
+            chunk = after + (f' AND ({columns}) <= ({placeholders})' if bound else '') + guild_filter
+            async with db.execute(sql.format(chunk=chunk), (*(last or ()), *(bound or ()))) as cursor:
+                merged += max(cursor.rowcount, 0)
+        if progress:
+            progress(table, merged)
+        if bound is None:
+            return merged
+        last = tuple(bound)
+        # Les écritures différées du bot passent entre deux lots
+        await asyncio.sleep(0)
+
+
+async def merge_database(pool: ConnectionPool, source_path: str, policy: str = 'max',
+                         progress: Progress = None, guilds: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """Fusionne une base XP (sauvegarde /backupxp ou autre instance) dans la base en service.
+
+    guilds limite la fusion à ces serveurs (ceux qui reviennent à ce shard).
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Politique inconnue : {policy} ({', '.join(POLICIES)})")
+    # IDs entiers insérés tels quels dans la requête
+    guild_filter = '' if guilds is None else f" AND CAST(guild_id AS INTEGER) IN ({','.join(str(int(g)) for g in guilds)})"
+    async with pool.write() as db:
+        await db.execute('ATTACH DATABASE ? AS src', (source_path,))
+    try:
+        async with pool.write() as db:
+            tables = await validate_source(db)
+        result = {}
+        for table, build in _STATEMENTS.items():
+            if table in tables:
+                key, columns = tables[table]
+                result[table] = await _merge_table(pool, table, build(policy, columns), key, progress, guild_filter)
+        return result
+    finally:
+        async with pool.write() as db:
+            await db.execute('DETACH DATABASE src')
+
+
+async def _main(args: argparse.Namespace):
+    from ..xp_db import XPDatabase
+    db = XPDatabase(None, args.db)
+    await db.init()
+    try:
+        if db._migration_task is not None:
+            await db._migration_task
+        result = await db.import_db(args.backup, args.policy,
+                                    lambda table, rows: print(f"{table} : {rows} lignes fusionnées"),
+                                    args.guild or None)
+        for table, rows in result.items():
+            print(f"{table} : {rows} lignes")
+    finally:
+        await db.close()
+
+
+if __name__ == '__main__':
+    # python -m cogs.xp_core.restore <sauvegarde> [--policy max] [--guild <id> ...] [--db xp_data.db]
+    # Bot arrêté : sans --guild, tous les serveurs de la sauvegarde sont fusionnés
+    parser = argparse.ArgumentParser(description="Fusionne une sauvegarde XP dans la base SQLite.")
+    parser.add_argument('backup', help="sauvegarde (.db ou .db.gz)")
+    parser.add_argument('--policy', choices=POLICIES, default='max', help="politique de fusion")
+    parser.add_argument('--guild', type=int, action='append', help="serveur à fusionner (répétable)")
+    parser.add_argument('--db', default='xp_data.db', help="base SQLite cible")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,72 @@
+import time
+from typing import List, Optional, Tuple
+
+from . import settings
+from .cache import LRUCache
+
+# Attribut des totaux en mémoire correspondant à chaque mode de classement
+MODE_ATTRIBUTES = {
+    'text': 'text_xp',
+    'voice': 'voice_xp',
+    'messages': 'messages',
+    'voice_time': 'voice_time',
+}
+
+
+class _TopEntry:
+    __slots__ = ('rows', 'loaded_at')
+
+    def __init__(self, rows: List[Tuple[int, int]], loaded_at: float):
+        self.rows = rows
+        self.loaded_at = loaded_at
+
+
+class ScoreboardCache:
+    """Top N par (serveur, mode, fenêtre), rechargé après un TTL.
+
+    Le classement général est aussi tenu à jour par le chemin d'écriture ; les classements
+    hebdomadaires et mensuels (period = début de la fenêtre) ne dépendent que du TTL.
+    """
+
+    def __init__(self, size: int = settings.SCOREBOARD_PAGE_SIZE,
+                 ttl: int = settings.SCOREBOARD_TTL_SECONDS,
+                 maxsize: int = settings.SCOREBOARD_CACHE_SIZE):
+        self.size = size
+        self.ttl = ttl
+        self.entries = LRUCache(maxsize)
+
+    def get(self, guild_id: int, mode: str, period: Optional[Tuple[int, int]] = None) -> Optional[List[Tuple[int, int]]]:
+        entry = self.entries.get((guild_id, mode, period))
+        if entry is None or time.monotonic() - entry.loaded_at > self.ttl:
+            return None
+        return list(entry.rows)
+
+    def put(self, guild_id: int, mode: str, rows: List[Tuple[int, int]], period: Optional[Tuple[int, int]] = None):
+        self.entries.set((guild_id, mode, period), _TopEntry(list(rows[:self.size]), time.monotonic()))
+
+    def observe(self, guild_id: int, user_id: int, totals):
+        # Les valeurs ne font que croître : il suffit de comparer au dernier du top
+        for mode, attribute in MODE_ATTRIBUTES.items():
+            entry = self.entries.peek((guild_id, mode, None))
+            if entry is not None:
+                self._update(entry, user_id, getattr(totals, attribute))
+
+    def _update(self, entry: _TopEntry, user_id: int, value: int):
+        rows = entry.rows
+        for i, (uid, _) in enumerate(rows):
+            if uid == user_id:
+                rows[i] = (user_id, value)
+                break
+        else:
+            if len(rows) >= self.size and (value, user_id) <= (rows[-1][1], rows[-1][0]):
+                return
+            rows.append((user_id, value))
+        rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+        del rows[self.size:]
+
+    def invalidate_guild(self, guild_id: int):
+        for key in [key for key in self.entries.keys() if key[0] == guild_id]:
+            self.entries.pop(key)
+
+    def clear(self):
+        self.entries.clear()
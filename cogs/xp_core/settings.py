@@ -0,0 +1,115 @@
+import os
+
+# Réglages du système d'XP, surchargeables via le fichier .env
+
+
+def _int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _str(name: str, default: str) -> str:
+    return os.getenv(name) or default
+
+
+# Connexions SQLite
+DB_READERS = _int('XP_DB_READERS', 3)
+DB_STATEMENT_CACHE = _int('XP_DB_STATEMENT_CACHE', 256)
+DB_CACHE_KIB = _int('XP_DB_CACHE_KIB', 16384)
+DB_MMAP_BYTES = _int('XP_DB_MMAP_BYTES', 64 * 1024 * 1024)
+DB_BUSY_TIMEOUT_MS = _int('XP_DB_BUSY_TIMEOUT_MS', 5000)
+
+# Répartition des serveurs entre plusieurs fichiers (un écrivain par fichier) ;
+# les serveurs listés (IDs séparés par des virgules) ont chacun leur propre fichier
+DB_SHARDS = _int('XP_DB_SHARDS', 1)
+DB_DEDICATED_GUILDS = _str('XP_DB_DEDICATED_GUILDS', '')
+
+# Tampon d'écriture différée (write-behind) des gains d'XP
+FLUSH_INTERVAL_SECONDS = _int('XP_FLUSH_INTERVAL_SECONDS', 5)
+FLUSH_MAX_EVENTS = _int('XP_FLUSH_MAX_EVENTS', 500)
+TOTALS_CACHE_SIZE = _int('XP_TOTALS_CACHE_SIZE', 50000)
+# Relecture en base des totaux d'un membre sans gain depuis ce délai (0 : jamais)
+TOTALS_TTL_SECONDS = _int('XP_TOTALS_TTL_SECONDS', 600)
+
+# Cooldown anti-spam en mémoire
+COOLDOWN_BUCKET_SECONDS = _int('XP_COOLDOWN_BUCKET_SECONDS', 60)
+
+# Caches en mémoire
+CONFIG_CACHE_SIZE = _int('XP_CONFIG_CACHE_SIZE', 10000)
+SCOREBOARD_PAGE_SIZE = _int('XP_SCOREBOARD_PAGE_SIZE', 10)
+SCOREBOARD_TTL_SECONDS = _int('XP_SCOREBOARD_TTL_SECONDS', 60)
+SCOREBOARD_CACHE_SIZE = _int('XP_SCOREBOARD_CACHE_SIZE', 5000)
+# Rangs de /rank, recalculés dès que la valeur du membre change ou après le TTL
+RANK_CACHE_SIZE = _int('XP_RANK_CACHE_SIZE', 20000)
+RANK_TTL_SECONDS = _int('XP_RANK_TTL_SECONDS', 30)
+
+# Classements hebdomadaires et mensuels : fenêtres conservées (en cours comprise) avant purge
+PERIOD_KEEP_BUCKETS = _int('XP_PERIOD_KEEP_BUCKETS', 2)
+
+# Recalcul des niveaux d'un serveur après changement de courbe (/setlevelcurve) : membres par tranche
+LEVEL_RECALC_CHUNK_ROWS = _int('XP_LEVEL_RECALC_CHUNK_ROWS', 10000)
+
+# Noms d'affichage des membres du classement (résolus à la demande en mode mémoire réduite)
+NAME_CACHE_SIZE = _int('XP_NAME_CACHE_SIZE', 20000)
+NAME_CACHE_TTL_SECONDS = _int('XP_NAME_CACHE_TTL_SECONDS', 3600)
+
+# Historique d'XP : âge avant agrégation horaire puis journalière, et rétention
+HISTORY_RAW_DAYS = _int('XP_HISTORY_RAW_DAYS', 2)
+HISTORY_HOURLY_DAYS = _int('XP_HISTORY_HOURLY_DAYS', 30)
+HISTORY_RETENTION_DAYS = _int('XP_HISTORY_RETENTION_DAYS', 365)
+HISTORY_COMPACTION_CHUNK_HOURS = _int('XP_HISTORY_COMPACTION_CHUNK_HOURS', 6)
+
+# Sauvegarde en ligne
+BACKUP_PAGES_PER_STEP = _int('XP_BACKUP_PAGES_PER_STEP', 1024)
+BACKUP_SPOOL_BYTES = _int('XP_BACKUP_SPOOL_BYTES', 16 * 1024 * 1024)
+
+# Rendu des cartes de profil
+RENDER_WORKERS = _int('XP_RENDER_WORKERS', 2)
+RENDER_CACHE_SIZE = _int('XP_RENDER_CACHE_SIZE', 2048)
+PROFILE_XP_BUCKET = _int('XP_PROFILE_XP_BUCKET', 10)
+
+# Sessions vocales
+VOICE_XP_PER_MINUTE = _int('XP_VOICE_XP_PER_MINUTE', 10)
+VOICE_SWEEP_MINUTES = _int('XP_VOICE_SWEEP_MINUTES', 1)
+VOICE_MAX_CREDIT_MINUTES = _int('XP_VOICE_MAX_CREDIT_MINUTES', 10)
+
+# Notifications de level-up
+NOTIFY_QUEUE_SIZE = _int('XP_NOTIFY_QUEUE_SIZE', 1000)
+NOTIFY_COALESCE_SECONDS = _int('XP_NOTIFY_COALESCE_SECONDS', 2)
+NOTIFY_WORKER_IDLE_SECONDS = _int('XP_NOTIFY_WORKER_IDLE_SECONDS', 60)
+NOTIFY_CLOSE_TIMEOUT_SECONDS = _int('XP_NOTIFY_CLOSE_TIMEOUT_SECONDS', 10)
+
+# Contrôle d'admission des gains passifs (messages, vocal) : en surcharge, l'XP est mise en attente
+# dans un arriéré agrégé par membre puis créditée quand la charge retombe
+ADMISSION_MAX_INFLIGHT = _int('XP_ADMISSION_MAX_INFLIGHT', 64)
+ADMISSION_LAG_MS = _int('XP_ADMISSION_LAG_MS', 100)
+ADMISSION_LAG_INTERVAL_MS = _int('XP_ADMISSION_LAG_INTERVAL_MS', 100)
+ADMISSION_INTERACTIVE_WINDOW_MS = _int('XP_ADMISSION_INTERACTIVE_WINDOW_MS', 3000)
+ADMISSION_BACKLOG_SIZE = _int('XP_ADMISSION_BACKLOG_SIZE', 100000)
+ADMISSION_SETTLE_CHUNK = _int('XP_ADMISSION_SETTLE_CHUNK', 500)
+
+# Migrations de schéma
+MIGRATION_CHUNK_ROWS = _int('XP_MIGRATION_CHUNK_ROWS', 20000)
+# VACUUM après migration : récupère l'espace des anciennes tables mais bloque les écritures pendant toute sa durée
+MIGRATION_VACUUM = _int('XP_MIGRATION_VACUUM', 0)
+
+# Import fusionné d'une autre base (/importxp)
+IMPORT_CHUNK_ROWS = _int('XP_IMPORT_CHUNK_ROWS', 5000)
+
+# Import des anciens fichiers JSON
+LEGACY_IMPORT_BATCH = _int('XP_LEGACY_IMPORT_BATCH', 5000)
+LEGACY_READ_BYTES = _int('XP_LEGACY_READ_BYTES', 256 * 1024)
+LEGACY_REBUILD_INDEX_BYTES = _int('XP_LEGACY_REBUILD_INDEX_BYTES', 8 * 1024 * 1024)
+
+# Lanceur multi-processus : socket Unix du processus d'écriture (vide : le bot écrit lui-même)
+STORAGE_SOCKET = _str('XP_STORAGE_SOCKET', '')
+STORAGE_TIMEOUT_SECONDS = _int('XP_STORAGE_TIMEOUT_SECONDS', 30)
+STORAGE_CONNECT_WAIT_SECONDS = _int('XP_STORAGE_CONNECT_WAIT_SECONDS', 60)
+STORAGE_DEDUP_BATCHES = _int('XP_STORAGE_DEDUP_BATCHES', 4096)
+STORAGE_MAX_MESSAGE_BYTES = _int('XP_STORAGE_MAX_MESSAGE_BYTES', 16 * 1024 * 1024)
+
+# Métriques (endpoint Prometheus local désactivé si le port vaut 0)
+METRICS_HOST = _str('XP_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = _int('XP_METRICS_PORT', 0)
+METRICS_LAG_INTERVAL_MS = _int('XP_METRICS_LAG_INTERVAL_MS', 500)
+METRICS_TOP_GUILDS = _int('XP_METRICS_TOP_GUILDS', 10)
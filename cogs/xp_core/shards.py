@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import glob
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+import aiosqlite
+
+from . import settings
+from .backup import online_backup
+from .migrations import LATEST_VERSION, TABLES, create_schema
+from .pool import ConnectionPool
+
+# Tables dont toutes les lignes appartiennent à un serveur (colonne guild_id) : déplacées ensemble
+GUILD_TABLES = tuple(TABLES)
+
+Progress = Optional[Callable[[str, int], None]]
+T = TypeVar('T')
+
+_LAYOUT_TABLE = '''CREATE TABLE IF NOT EXISTS shard_layout (
+    key TEXT PRIMARY KEY,
+    value TEXT
+)'''
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Hachage cohérent « jump » : en passant de N à N+1 shards, seul 1/(N+1) des serveurs change de fichier."""
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def parse_guild_list(value: str) -> List[int]:
+    return [int(item) for item in value.replace(' ', '').split(',') if item]
+
+
+async def _columns(db: aiosqlite.Connection, schema: str, table: str) -> List[str]:
+    async with db.execute(f'PRAGMA {schema}.table_info({table})') as cursor:
+        return [row[1] for row in await cursor.fetchall()]
+
+
+async def list_guilds(db: aiosqlite.Connection, schema: str = 'main') -> List[int]:
+    """Serveurs présents dans une base (éventuellement attachée), toutes tables confondues."""
+    selects = []
+    for table in GUILD_TABLES:
+        if await _columns(db, schema, table):
+            selects.append(f'SELECT CAST(guild_id AS INTEGER) FROM {schema}.{table}')
+    if not selects:
+        return []
+    async with db.execute(' UNION '.join(selects)) as cursor:
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def copy_guild(db: aiosqlite.Connection, target: str, guild_id: int) -> int:
+    """Recopie les lignes d'un serveur de main vers la base attachée target (remplace ce qui s'y trouve)."""
+    copied = 0
+    for table in GUILD_TABLES:
+        columns = ', '.join(await _columns(db, 'main', table))
+        await db.execute(f'DELETE FROM {target}.{table} WHERE guild_id=?', (guild_id,))
+        async with db.execute(f'INSERT INTO {target}.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE guild_id=?',
+                              (guild_id,)) as cursor:
+            copied += max(cursor.rowcount, 0)
+    return copied
+
+
+async def create_empty_database(path: str):
+    # Base vide au schéma courant, prête à recevoir un ATTACH
+    async with aiosqlite.connect(path) as db:
+        await create_schema(db)
+        await db.execute(f'PRAGMA user_version={LATEST_VERSION}')
+        await db.commit()
+
+
+class ShardRouter:
+    """Répartit les serveurs entre plusieurs fichiers SQLite, chacun avec son propre écrivain.
+
+    Le shard 0 est le fichier d'origine (db_path) ; les suivants sont db_path.shard<N>, et un serveur
+    listé dans dedicated a son propre fichier db_path.guild<ID>. Le placement des autres serveurs
+    suit un hachage cohérent, la disposition courante est mémorisée dans le shard 0 pour détecter
+    un changement de nombre de shards au démarrage.
+    """
+
+    def __init__(self, db_path: str, count: int = settings.DB_SHARDS, dedicated: Sequence[int] = (),
+                 functions=None, read_only: bool = False):
+        self.db_path = db_path
+        self.count = max(1, count)
+        self.dedicated = sorted(set(dedicated))
+        self.functions = functions
+        self.shards: Dict[str, ConnectionPool] = {}
+        for index in range(self.count):
+            self.shards[self._shard_path(index)] = ConnectionPool(self._shard_path(index), functions=functions,
+                                                                  read_only=read_only)
+        for guild_id in self.dedicated:
+            self.shards[self._guild_path(guild_id)] = ConnectionPool(self._guild_path(guild_id), functions=functions,
+                                                                     read_only=read_only)
+        self.default = self.shards[db_path]
+        self._routes: Dict[int, ConnectionPool] = {}
+
+    def _split(self) -> Tuple[str, str]:
+        return os.path.splitext(self.db_path)
+
+    def _shard_path(self, index: int) -> str:
+        root, ext = self._split()
+        return self.db_path if index == 0 else f'{root}.shard{index}{ext}'
+
+    def _guild_path(self, guild_id: int) -> str:
+        root, ext = self._split()
+        return f'{root}.guild{guild_id}{ext}'
+
+    @property
+    def layout(self) -> str:
+        return f"{self.count}:{','.join(map(str, self.dedicated))}"
+
+    @property
+    def pools(self) -> List[ConnectionPool]:
+        return list(self.shards.values())
+
+    @property
+    def is_open(self) -> bool:
+        return self.default.is_open
+
+    def pool_for(self, guild_id: int) -> ConnectionPool:
+        pool = self._routes.get(guild_id)
+        if pool is None:
+            if guild_id in self.dedicated:
+                pool = self.shards[self._guild_path(guild_id)]
+            else:
+                pool = self.shards[self._shard_path(jump_hash(guild_id, self.count))]
+            self._routes[guild_id] = pool
+        return pool
+
+    def is_dedicated(self, guild_id: int) -> bool:
+        return guild_id in self.dedicated
+
+    def partition(self, items: Iterable[T], guild_of: Callable[[T], int]) -> Dict[ConnectionPool, List[T]]:
+        groups: Dict[ConnectionPool, List[T]] = {}
+        for item in items:
+            groups.setdefault(self.pool_for(guild_of(item)), []).append(item)
+        return groups
+
+    async def open(self):
+        # Ouverture en parallèle : chaque pool a ses propres threads de connexion
+        await asyncio.gather(*(pool.open() for pool in self.pools))
+
+    async def close(self):
+        await asyncio.gather(*(pool.close() for pool in self.pools))
+
+    def _stray_paths(self) -> List[str]:
+        # Fichiers d'une disposition précédente (moins de shards, serveur qui n'est plus dédié)
+        root, ext = self._split()
+        found = glob.glob(glob.escape(root) + '.shard*' + ext) + glob.glob(glob.escape(root) + '.guild*' + ext)
+        return sorted(path for path in found if path not in self.shards)
+
+    async def stored_layout(self) -> Optional[str]:
+        async with self.default.write() as db:
+            await db.execute(_LAYOUT_TABLE)
+            async with db.execute("SELECT value FROM shard_layout WHERE key='layout'") as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def needs_rebalance(self) -> bool:
+        stored = await self.stored_layout()
+        if stored is None:
+            # Base antérieure au découpage : tout est dans le shard 0
+            return self.count > 1 or bool(self.dedicated) or bool(self._stray_paths())
+        return stored != self.layout or bool(self._stray_paths())
+
+    async def _move(self, source: ConnectionPool, moves: Dict[ConnectionPool, List[int]], progress: Progress) -> int:
+        moved = 0
+        for target, guilds in moves.items():
+            async with source.write() as db:
+                await db.execute('ATTACH DATABASE ? AS dst', (target.db_path,))
+            try:
+                for guild_id in guilds:
+                    # Copie validée avant la suppression : une interruption laisse au pire un doublon,
+                    # écrasé par la copie suivante puisque la source reste la référence
+                    async with source.write() as db:
+                        rows = await copy_guild(db, 'dst', guild_id)
+                    async with source.write() as db:
+                        for table in GUILD_TABLES:
+                            await db.execute(f'DELETE FROM main.{table} WHERE guild_id=?', (guild_id,))
+                    moved += 1
+                    if progress:
+                        progress(f'{os.path.basename(source.db_path)} -> {os.path.basename(target.db_path)}', rows)
+                    await asyncio.sleep(0)
+            finally:
+                async with source.write() as db:
+                    await db.execute('DETACH DATABASE dst')
+        return moved
+
+    async def rebalance(self, progress: Progress = None) -> int:
+        """Déplace chaque serveur vers le shard que lui attribue la disposition courante."""
+        moved = 0
+        for pool in self.pools:
+            async with pool.read() as db:
+                guilds = await list_guilds(db)
+            moves: Dict[ConnectionPool, List[int]] = {}
+            for guild_id in guilds:
+                target = self.pool_for(guild_id)
+                if target is not pool:
+                    moves.setdefault(target, []).append(guild_id)
+            moved += await self._move(pool, moves, progress)
+        for path in self._stray_paths():
+            stray = ConnectionPool(path, functions=self.functions)
+            await stray.open()
+            try:
+                async with stray.read() as db:
+                    guilds = await list_guilds(db)
+                moved += await self._move(stray, self.partition(guilds, lambda guild_id: guild_id), progress)
+            finally:
+                await stray.close()
+            # Fichier vidé : supprimé avec son journal WAL
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        async with self.default.write() as db:
+            await db.execute(_LAYOUT_TABLE)
+            await db.execute("INSERT OR REPLACE INTO shard_layout (key, value) VALUES ('layout', ?)", (self.layout,))
+        return moved
+
+    async def export_guild(self, guild_id: int, target_path: str):
+        """Copie les données d'un seul serveur dans une base autonome (sauvegarde par serveur)."""
+        pool = self.pool_for(guild_id)
+        if self.is_dedicated(guild_id):
+            # Fichier propre au serveur : copie page à page par l'API de sauvegarde
+            await online_backup(pool, target_path)
+            return
+        await create_empty_database(target_path)
+        # Connexion dédiée : elle ne fait que lire main (instantané WAL) et n'écrit que dans la copie,
+        # l'écrivain du shard n'est jamais bloqué
+        async with aiosqlite.connect(pool.db_path) as db:
+            await db.execute(f'PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}')
+            await db.execute('ATTACH DATABASE ? AS export', (target_path,))
+            await db.execute('BEGIN')
+            await copy_guild(db, 'export', guild_id)
+            await db.commit()
+            await db.execute('DETACH DATABASE export')
+
+    async def stats(self) -> List[Dict[str, int]]:
+        """Vue globale : serveurs, membres et taille de chaque fichier."""
+        result = []
+        for path, pool in self.shards.items():
+            async with pool.read() as db:
+                async with db.execute('SELECT COUNT(DISTINCT guild_id), COUNT(*) FROM xp') as cursor:
+                    guilds, members = await cursor.fetchone()
+            size = sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+            result.append({'shard': os.path.basename(path), 'guilds': guilds, 'members': members, 'bytes': size})
+        return result
+
+
+async def _main(args: argparse.Namespace):
+    from ..xp_db import XPDatabase
+    # L'ouverture applique la disposition demandée (déplacement des serveurs si elle a changé)
+    db = XPDatabase(None, args.db, shard_count=args.shards, dedicated_guilds=parse_guild_list(args.dedicated))
+    await db.init()
+    try:
+        for shard in await db.shards.stats():
+            print(f"{shard['shard']} : {shard['guilds']} serveurs, {shard['members']} membres, "
+                  f"{shard['bytes'] / 1024 / 1024:.1f} Mio")
+    finally:
+        await db.close()
+
+
+if __name__ == '__main__':
+    # python -m cogs.xp_core.shards [--db xp_data.db] [--shards N] [--dedicated id,id]
+    parser = argparse.ArgumentParser(description="Répartit la base XP en shards et affiche leur contenu.")
+    parser.add_argument('--db', default='xp_data.db', help="base SQLite principale (shard 0)")
+    parser.add_argument('--shards', type=int, default=settings.DB_SHARDS, help="nombre de shards")
+    parser.add_argument('--dedicated', default=settings.DB_DEDICATED_GUILDS,
+                        help="serveurs ayant leur propre fichier, séparés par des virgules")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,67 @@
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import discord
+
+Row = Tuple[int, int]
+
+
+class ScoreboardView(discord.ui.View):
+    """Navigation par boutons dans le classement ; les pages déjà vues restent en mémoire."""
+
+    def __init__(self, db, guild_id: int, mode: str, owner_id: int, first_page: List[Row],
+                 render: Callable[[List[Row], int], Awaitable[str]], page_size: int, timeout: float = 120,
+                 period: str = 'all'):
+        super().__init__(timeout=timeout)
+        self.db = db
+        self.guild_id = guild_id
+        self.mode = mode
+        self.period = period
+        self.owner_id = owner_id
+        self.render = render
+        self.page_size = page_size
+        self.pages: List[List[Row]] = [first_page]
+        self.index = 0
+        self.message: Optional[discord.Message] = None
+        self._refresh_buttons()
+
+    def _refresh_buttons(self):
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = len(self.pages[self.index]) < self.page_size
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("Lancez /scoreboard pour parcourir le classement.", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction):
+        self._refresh_buttons()
+        await interaction.response.edit_message(content=await self.render(self.pages[self.index], self.index), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index = max(0, self.index - 1)
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.index + 1 == len(self.pages):
+            user_id, value = self.pages[-1][-1]
+            rows = await self.db.get_leaderboard(self.guild_id, self.mode, self.page_size, after=(value, user_id),
+                                                 period=self.period)
+            if not rows:
+                button.disabled = True
+                await interaction.response.edit_message(view=self)
+                return
+            self.pages.append(rows)
+        self.index += 1
+        await self._show(interaction)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
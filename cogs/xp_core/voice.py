@@ -0,0 +1,98 @@
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import settings
+
+Key = Tuple[int, int]  # (guild_id, user_id)
+
+
+class VoiceSession:
+    __slots__ = ('channel_id', 'joined_at', 'credited_at')
+
+    def __init__(self, channel_id: int, joined_at: int, credited_at: int):
+        self.channel_id = channel_id
+        self.joined_at = joined_at
+        self.credited_at = credited_at
+
+
+class VoiceTracker:
+    """Sessions vocales par (serveur, membre), persistées ; le temps est crédité en bloc."""
+
+    def __init__(self, db, record=None):
+        self.db = db
+        # Crédit de l'XP (XPCog le fait passer par le contrôle d'admission)
+        self.record = record or db.record_xp
+        self.sessions: Dict[Key, VoiceSession] = {}
+        self._loaded = False
+
+    async def join(self, guild_id: int, user_id: int, channel_id: int, now: Optional[int] = None):
+        now = int(time.time()) if now is None else now
+        session = self.sessions[(guild_id, user_id)] = VoiceSession(channel_id, now, now)
+        await self.db.save_voice_sessions([(guild_id, user_id, channel_id, session.joined_at, session.credited_at)])
+
+    async def move(self, guild_id: int, user_id: int, channel_id: int, now: Optional[int] = None):
+        now = int(time.time()) if now is None else now
+        session = self.sessions.get((guild_id, user_id))
+        if session is None:
+            await self.join(guild_id, user_id, channel_id, now)
+            return
+        await self._credit(guild_id, user_id, session, now)
+        session.channel_id = channel_id
+        await self.db.save_voice_sessions([(guild_id, user_id, channel_id, session.joined_at, session.credited_at)])
+
+    async def leave(self, guild_id: int, user_id: int, now: Optional[int] = None):
+        now = int(time.time()) if now is None else now
+        session = self.sessions.pop((guild_id, user_id), None)
+        if session is not None:
+            await self._credit(guild_id, user_id, session, now)
+        await self.db.delete_voice_sessions([(guild_id, user_id)])
+
+    async def _credit(self, guild_id: int, user_id: int, session: VoiceSession, now: int) -> bool:
+        # Minutes entières seulement ; un long trou (bot arrêté) est plafonné
+        minutes = (now - session.credited_at) // 60
+        if minutes <= 0:
+            return False
+        if minutes > settings.VOICE_MAX_CREDIT_MINUTES:
+            minutes = settings.VOICE_MAX_CREDIT_MINUTES
+            session.credited_at = now
+        else:
+            session.credited_at += minutes * 60
+        await self.record(user_id, guild_id, settings.VOICE_XP_PER_MINUTE * minutes, "voice", voice_time=minutes)
+        return True
+
+    async def sweep(self, now: Optional[int] = None):
+        now = int(time.time()) if now is None else now
+        items = list(self.sessions.items())
+        await self.db.preload_totals([(user_id, guild_id) for (guild_id, user_id), _ in items])
+        touched = []
+        for (guild_id, user_id), session in items:
+            if self.sessions.get((guild_id, user_id)) is not session:
+                continue
+            if await self._credit(guild_id, user_id, session, now):
+                touched.append((session.credited_at, guild_id, user_id))
+        await self.db.touch_voice_sessions(touched)
+
+    async def sync(self, present: Dict[Key, int], now: Optional[int] = None, guild_ids: Optional[Set[int]] = None):
+        """Aligne les sessions sur les états vocaux actuels (démarrage, reconnexion).
+
+        guild_ids : serveurs servis par ce processus ; les sessions des autres (autres workers) sont ignorées.
+        """
+        now = int(time.time()) if now is None else now
+        if not self._loaded:
+            for guild_id, user_id, channel_id, joined_at, credited_at in await self.db.load_voice_sessions():
+                if guild_ids is None or guild_id in guild_ids:
+                    self.sessions[(guild_id, user_id)] = VoiceSession(channel_id, joined_at, credited_at)
+            self._loaded = True
+        # Sessions dont le membre a quitté le vocal pendant l'absence du bot : heure de départ inconnue
+        gone = [key for key in self.sessions if key not in present]
+        for key in gone:
+            del self.sessions[key]
+        saved: List[Tuple] = []
+        for (guild_id, user_id), channel_id in present.items():
+            session = self.sessions.get((guild_id, user_id))
+            if session is None:
+                session = self.sessions[(guild_id, user_id)] = VoiceSession(channel_id, now, now)
+            session.channel_id = channel_id
+            saved.append((guild_id, user_id, channel_id, session.joined_at, session.credited_at))
+        await self.db.delete_voice_sessions(gone)
+        await self.db.save_voice_sessions(saved)
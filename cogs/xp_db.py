@@ -1,187 +1,835 @@
-import aiosqlite
 import asyncio
-from typing import Optional, List, Tuple
+import functools
+import os
+import time
+import uuid
+from collections import deque
+from typing import IO, Any, Deque, Dict, Iterable, Optional, List, Tuple
+import aiosqlite
 from discord.ext import commands
 
+from .xp_core import settings
+from .xp_core.backup import spool_file, temp_db_path, unpack_file
+from .xp_core.buffer import MemberTotals, WriteBuffer
+from .xp_core.cache import LRUCache
+from .xp_core.ipc import StorageClient, StorageError
+from .xp_core.legacy import import_legacy_config, import_legacy_xp
+from .xp_core.levels import DEFAULT_CURVE, LevelCurve, curve_level
+from .xp_core.metrics import REGISTRY
+from .xp_core.migrations import LATEST_VERSION, MODE_IDS, MODE_NAMES, create_schema, get_version, migrate, vacuum
+from .xp_core.periods import PERIODS, period_start
+from .xp_core.pool import ConnectionPool
+from .xp_core.recalc import recompute_levels
+from .xp_core.restore import merge_database
+from .xp_core.scoreboard import ScoreboardCache
+from .xp_core.shards import ShardRouter, list_guilds, parse_guild_list
+
 DB_PATH = 'xp_data.db'
 
+# Colonnes de classement ; chacune a un index (guild_id, colonne, user_id), voir migrations.INDEXES
+LEADERBOARD_COLUMNS = {
+    'text': 'text_xp',
+    'voice': 'voice_xp',
+    'messages': 'messages',
+    'voice_time': 'voice_time'
+}
+
+_FLUSH_XP = '''INSERT INTO xp (user_id, guild_id, messages, text_xp, voice_xp, voice_time, text_level, voice_level)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, guild_id) DO UPDATE SET
+        messages=messages+excluded.messages,
+        text_xp=text_xp+excluded.text_xp,
+        voice_xp=voice_xp+excluded.voice_xp,
+        voice_time=voice_time+excluded.voice_time,
+        text_level=xp_level(text_xp+excluded.text_xp, ?9, ?10),
+        voice_level=xp_level(voice_xp+excluded.voice_xp, ?9, ?10)'''
+HOUR = 3600
+DAY = 86400
+
+_FLUSH_HISTORY = 'INSERT INTO xp_history (user_id, guild_id, mode, amount, timestamp) VALUES (?, ?, ?, ?, ?)'
+
+_FLUSH_PERIODS_TEXT = '''INSERT INTO xp_periods (period, bucket, guild_id, user_id, text_xp, messages) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(period, bucket, guild_id, user_id) DO UPDATE SET
+        text_xp=text_xp+excluded.text_xp,
+        messages=messages+excluded.messages'''
+_FLUSH_PERIODS_VOICE = '''INSERT INTO xp_periods (period, bucket, guild_id, user_id, voice_xp, voice_time) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(period, bucket, guild_id, user_id) DO UPDATE SET
+        voice_xp=voice_xp+excluded.voice_xp,
+        voice_time=voice_time+excluded.voice_time'''
+
+class GuildConfig:
+    __slots__ = ('cooldown', 'notify_channel')
+
+    def __init__(self, cooldown: Optional[int] = None, notify_channel: Optional[int] = None):
+        self.cooldown = cooldown if cooldown is not None else 30
+        self.notify_channel = notify_channel
+
 class XPDatabase(commands.Cog):
-    def __init__(self, bot, db_path=DB_PATH):
+    # Pools sans écrivain : redéfini par RemoteXPDatabase
+    read_only = False
+
+    def __init__(self, bot, db_path=DB_PATH, shard_count: int = settings.DB_SHARDS,
+                 dedicated_guilds: Optional[List[int]] = None):
         self.bot = bot
         self.db_path = db_path
+        # Un pool (écrivain + lecteurs) par fichier ; chaque serveur vit dans un seul shard
+        self.shards = ShardRouter(db_path, shard_count,
+                                  parse_guild_list(settings.DB_DEDICATED_GUILDS) if dedicated_guilds is None else dedicated_guilds,
+                                  functions={'xp_level': (-1, curve_level)}, read_only=self.read_only)
+        # Courbes personnalisées (/setlevelcurve) ; toujours en mémoire, le tampon en a besoin sans attendre
+        self.curves: Dict[int, LevelCurve] = {}
+        self._recalc_tasks: Dict[int, asyncio.Task] = {}
+        self.buffer = WriteBuffer(self.curve_for)
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.config_cache = LRUCache(settings.CONFIG_CACHE_SIZE)
+        self.scoreboard = ScoreboardCache()
+        # (guild_id, user_id, mode) -> (valeur du membre au calcul, (rang, total) ou None, expiration)
+        self.rank_cache = LRUCache(settings.RANK_CACHE_SIZE)
+        self.versions: Dict[ConnectionPool, int] = {}
+        self._migration_task: Optional[asyncio.Task] = None
+        self.init_seconds = 0.0
+
+    # Durées rangées sous le libellé query, par convention le nom de la méthode appelante (get_rank, add_message...)
+    async def _fetchone(self, query: str, pool: ConnectionPool, sql: str, params: Tuple[Any, ...] = ()) -> Optional[Tuple]:
+        started = time.perf_counter()
+        async with pool.read() as db:
+            async with db.execute(sql, params) as cursor:
+                row = await cursor.fetchone()
+        REGISTRY.query_latency.observe(time.perf_counter() - started, query=query)
+        return row
+
+    async def _fetchall(self, query: str, pool: ConnectionPool, sql: str, params: Tuple[Any, ...] = ()) -> List[Tuple]:
+        started = time.perf_counter()
+        async with pool.read() as db:
+            async with db.execute(sql, params) as cursor:
+                rows = list(await cursor.fetchall())
+        REGISTRY.query_latency.observe(time.perf_counter() - started, query=query)
+        return rows
+
+    async def _execute(self, query: str, pool: ConnectionPool, sql: str, params: Tuple[Any, ...] = ()):
+        started = time.perf_counter()
+        async with pool.write() as db:
+            await db.execute(sql, params)
+        REGISTRY.query_latency.observe(time.perf_counter() - started, query=query)
+
+    @property
+    def schema_version(self) -> int:
+        return min(self.versions.values(), default=LATEST_VERSION)
+
+    async def _open_shard(self, pool: ConnectionPool):
+        async with pool.write() as db:
+            version = await get_version(db)
+            async with db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='xp'") as cursor:
+                existing = await cursor.fetchone() is not None
+            await create_schema(db)
+            if not existing:
+                await db.execute(f'PRAGMA user_version={LATEST_VERSION}')
+                version = LATEST_VERSION
+        self.versions[pool] = max(version, 1)
 
     async def init(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''CREATE TABLE IF NOT EXISTS xp (
-                user_id TEXT,
-                guild_id TEXT,
-                text_xp INTEGER DEFAULT 0,
-                voice_xp INTEGER DEFAULT 0,
-                messages INTEGER DEFAULT 0,
-                voice_time INTEGER DEFAULT 0,
-                text_level INTEGER DEFAULT 1,
-                voice_level INTEGER DEFAULT 1,
-                notify_enabled INTEGER DEFAULT 1,
-                PRIMARY KEY (user_id, guild_id)
-            )''')
-            await db.execute('''CREATE TABLE IF NOT EXISTS config (
-                guild_id TEXT PRIMARY KEY,
-                cooldown INTEGER DEFAULT 30,
-                notify_channel INTEGER
-            )''')
-            await db.commit()
-
-    async def add_message(self, user_id: str, guild_id: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''INSERT INTO xp (user_id, guild_id, messages) VALUES (?, ?, 1)
-                ON CONFLICT(user_id, guild_id) DO UPDATE SET messages=messages+1''', (user_id, guild_id))
-            await db.commit()
-
-    async def add_voice_time(self, user_id: str, guild_id: str, minutes: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''INSERT INTO xp (user_id, guild_id, voice_time) VALUES (?, ?, ?)
-                ON CONFLICT(user_id, guild_id) DO UPDATE SET voice_time=voice_time+?''', (user_id, guild_id, minutes, minutes))
-            await db.commit()
-
-    async def add_xp(self, user_id: str, guild_id: str, amount: int, mode: str) -> int:
+        if self.shards.is_open:
+            return
+        started = time.perf_counter()
+        await self.shards.open()
+        for pool in self.shards.pools:
+            await self._open_shard(pool)
+        if await self.shards.needs_rebalance():
+            # Nombre de shards modifié : les serveurs sont déplacés avant de servir la moindre requête
+            await self._run_migrations()
+            moved = await self.shards.rebalance(self._rebalance_progress)
+            if moved:
+                print(f"[XPDatabase] {moved} serveurs déplacés, répartis sur {len(self.shards.pools)} fichiers")
+        await self.warm_config()
+        self.init_seconds = time.perf_counter() - started
+        # Ancienne base : conversion en arrière-plan, le bot reste en ligne
+        if self.schema_version < LATEST_VERSION:
+            self._migration_task = asyncio.create_task(self._run_migrations())
+
+    async def _run_migrations(self):
+        for pool, version in list(self.versions.items()):
+            if version >= LATEST_VERSION:
+                continue
+            try:
+                # Version publiée dès chaque bascule : les écritures suivantes utilisent le nouveau schéma
+                await migrate(pool, self._migration_progress, functools.partial(self.versions.__setitem__, pool))
+                print(f"[XPDatabase] Schéma de {pool.db_path} migré en version {self.versions[pool]}")
+                await self._load_curves(pool)
+                if settings.MIGRATION_VACUUM:
+                    await vacuum(pool)
+            except Exception as e:
+                print(f"[XPDatabase.migrate] Erreur: {e}")
+
+    @staticmethod
+    def _migration_progress(table: str, rows: int):
+        print(f"[XPDatabase.migrate] {table} : {rows} lignes converties")
+
+    @staticmethod
+    def _rebalance_progress(move: str, rows: int):
+        print(f"[XPDatabase.rebalance] {move} : {rows} lignes")
+
+    def _mode_param(self, pool: ConnectionPool, mode: str):
+        return MODE_IDS.get(mode, 0) if self.versions.get(pool, LATEST_VERSION) >= 2 else mode
+
+    async def warm_config(self):
+        # Chargement groupé de la configuration des serveurs, shard par shard
+        for pool in self.shards.pools:
+            rows = await self._fetchall('warm_config', pool, 'SELECT guild_id, cooldown, notify_channel FROM config LIMIT ?',
+                                        (self.config_cache.maxsize,))
+            for guild_id, cooldown, notify_channel in rows:
+                self.config_cache.set(int(guild_id), GuildConfig(cooldown, notify_channel))
+            await self._load_curves(pool)
+
+    def _has_curves(self, pool: ConnectionPool) -> bool:
+        # Colonnes de courbe ajoutées par la migration v4
+        return self.versions.get(pool, LATEST_VERSION) >= 4
+
+    async def _load_curves(self, pool: ConnectionPool):
+        if not self._has_curves(pool):
+            return
+        rows = await self._fetchall('_load_curves', pool, '''SELECT guild_id, level_base, level_exponent FROM config
+            WHERE level_base IS NOT NULL OR level_exponent IS NOT NULL''')
+        for guild_id, base, exponent in rows:
+            self._set_curve(int(guild_id), LevelCurve(base, exponent))
+
+    def _set_curve(self, guild_id: int, curve: LevelCurve):
+        if curve.is_default:
+            self.curves.pop(guild_id, None)
+        else:
+            self.curves[guild_id] = curve
+
+    def curve_for(self, guild_id: int) -> LevelCurve:
+        return self.curves.get(guild_id, DEFAULT_CURVE)
+
+    async def _guild_config(self, guild_id: int) -> GuildConfig:
+        config = self.config_cache.get(guild_id)
+        if config is None:
+            row = await self._fetchone('_guild_config', self.shards.pool_for(guild_id),
+                                       'SELECT cooldown, notify_channel FROM config WHERE guild_id=?', (guild_id,))
+            # Les serveurs sans configuration sont aussi mis en cache, avec les valeurs par défaut
+            config = GuildConfig(*row) if row else GuildConfig()
+            self.config_cache.set(guild_id, config)
+        return config
+
+    async def _write_config(self, guild_id: int, sql: str, params: Tuple[Any, ...]):
+        # Écriture immédiate en base puis mise à jour du cache (write-through)
+        async with self.shards.pool_for(guild_id).write() as db:
+            async with db.execute(sql + ' RETURNING cooldown, notify_channel', params) as cursor:
+                cooldown, notify_channel = await cursor.fetchone()
+        self.config_cache.set(guild_id, GuildConfig(cooldown, notify_channel))
+
+    async def close(self):
+        if self._migration_task is not None and not self._migration_task.done():
+            # Les lots déjà copiés sont repris au prochain démarrage
+            self._migration_task.cancel()
+            await asyncio.gather(self._migration_task, return_exceptions=True)
+        # Recalculs de niveaux terminés plutôt qu'interrompus : ils ne reprennent pas au démarrage
+        await asyncio.gather(*self._recalc_tasks.values(), return_exceptions=True)
+        if self.shards.is_open:
+            await self.flush()
+        await self.shards.close()
+
+    async def _member_totals(self, user_id: int, guild_id: int) -> MemberTotals:
+        key = (user_id, guild_id)
+        totals = self.buffer.get_totals(key)
+        while totals is None:
+            commits, in_flight = self.buffer.commits, self.buffer.in_flight(key)
+            row = await self._fetchone('_member_totals', self.shards.pool_for(guild_id), '''SELECT messages, text_xp, voice_xp, voice_time,
+                text_level, voice_level, notify_enabled FROM xp WHERE user_id=? AND guild_id=?''', key)
+            # Un autre évènement a pu charger ce membre pendant la lecture
+            totals = self.buffer.peek_totals(key)
+            # Un lot du membre validé pendant la lecture : la ligne l'inclut peut-être déjà, on relit
+            if totals is None and not (in_flight and self.buffer.commits != commits):
+                totals = self.buffer.load_totals(key, row)
+        return totals
+
+    async def preload_totals(self, keys: List[Tuple[int, int]]):
+        # Charge en quelques requêtes les totaux des membres absents du cache
+        missing = {}
+        for user_id, guild_id in keys:
+            if self.buffer.peek_totals((user_id, guild_id)) is None:
+                missing.setdefault(guild_id, []).append(user_id)
+        for guild_id, user_ids in missing.items():
+            for i in range(0, len(user_ids), 500):
+                chunk = user_ids[i:i + 500]
+                commits = self.buffer.commits
+                in_flight = {user_id for user_id in chunk if self.buffer.in_flight((user_id, guild_id))}
+                rows = await self._fetchall('preload_totals', self.shards.pool_for(guild_id), f'''SELECT user_id, messages, text_xp, voice_xp, voice_time, text_level, voice_level, notify_enabled
+                    FROM xp WHERE guild_id=? AND user_id IN ({','.join('?' * len(chunk))})''', (guild_id, *chunk))
+                found = {int(row[0]): row[1:] for row in rows}
+                # Membres dont un lot a été validé pendant la lecture : laissés à _member_totals
+                skipped = in_flight if self.buffer.commits != commits else ()
+                for user_id in chunk:
+                    if user_id not in skipped and self.buffer.peek_totals((user_id, guild_id)) is None:
+                        self.buffer.load_totals((user_id, guild_id), found.get(user_id))
+
+    async def record_xp(self, user_id: int, guild_id: int, amount: int, mode: str,
+                        messages: int = 0, voice_time: int = 0) -> int:
+        # Écriture différée : le niveau est calculé sur les totaux en mémoire
+        totals = await self._member_totals(user_id, guild_id)
+        level_up = self.buffer.add((user_id, guild_id), totals, mode, amount, messages, voice_time)
+        self.scoreboard.observe(guild_id, user_id, totals)
+        if self.buffer.should_flush and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_in_background())
+        return level_up
+
+    async def _flush_in_background(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"[XPDatabase.flush] Erreur: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            pending = self.buffer.drain()
+            if not pending:
+                return
+            # Un lot par shard, écrits en parallèle par leurs écrivains respectifs
+            batches = {}
+            for key, delta in pending.items():
+                batches.setdefault(self.shards.pool_for(key[1]), {})[key] = delta
+            # Déclarés avant le premier await : un rechargement pendant l'écriture compte leurs deltas
+            for batch in batches.values():
+                self.buffer.begin(batch)
+            results = await asyncio.gather(*(self._flush_shard(pool, batch) for pool, batch in batches.items()),
+                                           return_exceptions=True)
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                raise errors[0]
+
+    async def _flush_shard(self, pool: ConnectionPool, pending: Dict):
+        try:
+            await self._write_rows(pool, *self.buffer.rows(pending))
+            self.buffer.commit(pending)
+        except Exception:
+            # Seul le lot de ce shard est remis en attente, les autres sont déjà écrits
+            self.buffer.restore(pending)
+            raise
+
+    async def _write_rows(self, pool: ConnectionPool, xp_rows: List[Tuple], history_rows: List[Tuple],
+                          text_period_rows: List[Tuple], voice_period_rows: List[Tuple]):
+        started = time.perf_counter()
+        async with pool.write() as db:
+            # Mode converti une fois le verrou obtenu : une migration a pu changer le schéma entre-temps
+            history_rows = [(user_id, guild_id, self._mode_param(pool, mode), amount, timestamp)
+                            for user_id, guild_id, mode, amount, timestamp in history_rows]
+            await db.executemany(_FLUSH_XP, xp_rows)
+            await db.executemany(_FLUSH_HISTORY, history_rows)
+            await db.executemany(_FLUSH_PERIODS_TEXT, text_period_rows)
+            await db.executemany(_FLUSH_PERIODS_VOICE, voice_period_rows)
+        REGISTRY.query_latency.observe(time.perf_counter() - started, query='flush')
+
+    async def write_rows(self, xp_rows: List[Tuple], history_rows: List[Tuple],
+                         text_period_rows: List[Tuple], voice_period_rows: List[Tuple]):
+        """Écrit un lot préparé par WriteBuffer.rows() ailleurs (worker du lanceur), une transaction par shard."""
+        batches: Dict[ConnectionPool, List[List[Tuple]]] = {}
+        for index, (rows, guild_index) in enumerate(((xp_rows, 1), (history_rows, 1),
+                                                     (text_period_rows, 2), (voice_period_rows, 2))):
+            for pool, shard_rows in self.shards.partition(rows, lambda row: row[guild_index]).items():
+                batches.setdefault(pool, [[], [], [], []])[index] = shard_rows
+        await asyncio.gather(*(self._write_rows(pool, *rows) for pool, rows in batches.items()))
+
+    async def add_message(self, user_id: int, guild_id: int):
+        await self._execute('add_message', self.shards.pool_for(guild_id), '''INSERT INTO xp (user_id, guild_id, messages) VALUES (?, ?, 1)
+            ON CONFLICT(user_id, guild_id) DO UPDATE SET messages=messages+1''', (user_id, guild_id))
+        self.buffer.invalidate((user_id, guild_id))
+
+    async def add_voice_time(self, user_id: int, guild_id: int, minutes: int):
+        await self._execute('add_voice_time', self.shards.pool_for(guild_id), '''INSERT INTO xp (user_id, guild_id, voice_time) VALUES (?, ?, ?)
+            ON CONFLICT(user_id, guild_id) DO UPDATE SET voice_time=voice_time+?''', (user_id, guild_id, minutes, minutes))
+        self.buffer.invalidate((user_id, guild_id))
+
+    async def add_xp(self, user_id: int, guild_id: int, amount: int, mode: str) -> int:
         col = 'text_xp' if mode == 'text' else 'voice_xp'
         col_lvl = 'text_level' if mode == 'text' else 'voice_level'
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(f'''INSERT INTO xp (user_id, guild_id, {col}) VALUES (?, ?, ?)
-                ON CONFLICT(user_id, guild_id) DO UPDATE SET {col}={col}+?''', (user_id, guild_id, amount, amount))
-            # Calcul du niveau
-            cursor = await db.execute(f'SELECT {col} FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            row = await cursor.fetchone()
-            xp_total = row[0] if row and row[0] is not None else 0
-            level = 1
-            while xp_total >= 50 * (level ** 2):
-                level += 1
-            cursor = await db.execute(f'SELECT {col_lvl} FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            row_lvl = await cursor.fetchone()
-            old_level = row_lvl[0] if row_lvl and row_lvl[0] is not None else 1
-            await db.execute(f'UPDATE xp SET {col_lvl}=? WHERE user_id=? AND guild_id=?', (level, user_id, guild_id))
-            await db.commit()
-            return level if level > old_level else 0
-
-    async def get_notify_channel(self, guild_id: str) -> Optional[int]:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT notify_channel FROM config WHERE guild_id=?', (guild_id,))
-            row = await cursor.fetchone()
-            return row[0] if row and row[0] is not None else None
-
-    async def set_notify_channel(self, guild_id: str, channel_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''INSERT INTO config (guild_id, notify_channel) VALUES (?, ?)
-                ON CONFLICT(guild_id) DO UPDATE SET notify_channel=?''', (guild_id, channel_id, channel_id))
-            await db.commit()
-
-    async def get_cooldown(self, guild_id: str) -> int:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT cooldown FROM config WHERE guild_id=?', (guild_id,))
-            row = await cursor.fetchone()
-            return row[0] if row and row[0] is not None else 30
-
-    async def set_cooldown(self, guild_id: str, value: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''INSERT INTO config (guild_id, cooldown) VALUES (?, ?)
-                ON CONFLICT(guild_id) DO UPDATE SET cooldown=?''', (guild_id, value, value))
-            await db.commit()
-
-    async def get_xp(self, user_id: str, guild_id: str, mode: str) -> int:
-        col = 'text_xp' if mode == 'text' else 'voice_xp'
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(f'SELECT {col} FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            row = await cursor.fetchone()
-            return row[0] if row and row[0] is not None else 0
-
-    async def get_level(self, user_id: str, guild_id: str, mode: str) -> int:
-        col = 'text_level' if mode == 'text' else 'voice_level'
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(f'SELECT {col} FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            row = await cursor.fetchone()
-            return row[0] if row and row[0] is not None else 1
-
-    async def get_messages(self, user_id: str, guild_id: str) -> int:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT messages FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            row = await cursor.fetchone()
-            return row[0] if row and row[0] is not None else 0
-
-    async def get_voice_time(self, user_id: str, guild_id: str) -> int:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT voice_time FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            row = await cursor.fetchone()
-            return row[0] if row and row[0] is not None else 0
-
-    async def get_leaderboard(self, guild_id: str, mode: str, limit: int = 10) -> List[Tuple[str, int]]:
-        col = {
-            'text': 'text_xp',
-            'voice': 'voice_xp',
-            'messages': 'messages',
-            'voice_time': 'voice_time'
-        }.get(mode, 'text_xp')
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(f'SELECT user_id, {col} FROM xp WHERE guild_id=? ORDER BY {col} DESC LIMIT ?', (guild_id, limit))
-            rows = await cursor.fetchall()
-            return [(row[0], row[1]) for row in rows]
-
-    async def set_notify_enabled(self, user_id: str, guild_id: str, enabled: bool):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''INSERT INTO xp (user_id, guild_id, notify_enabled) VALUES (?, ?, ?)
-                ON CONFLICT(user_id, guild_id) DO UPDATE SET notify_enabled=?''', (user_id, guild_id, int(enabled), int(enabled)))
-            await db.commit()
-
-    async def get_notify_enabled(self, user_id: str, guild_id: str) -> bool:
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT notify_enabled FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            row = await cursor.fetchone()
-            return bool(row[0]) if row else True
-
-    async def backup(self, backup_path: str):
-        import shutil
-        shutil.copyfile(self.db_path, backup_path)
-
-    async def import_db(self, import_path: str):
-        import shutil
-        shutil.copyfile(import_path, self.db_path)
+        curve = self.curve_for(guild_id)
+        # Une seule requête : XP ajoutée, niveau recalculé, ancien et nouveau niveau renvoyés
+        async with self.shards.pool_for(guild_id).write() as db:
+            async with db.execute(f'''INSERT INTO xp (user_id, guild_id, {col}, {col_lvl}) VALUES (?1, ?2, ?3, xp_level(?3, ?4, ?5))
+                ON CONFLICT(user_id, guild_id) DO UPDATE SET {col}={col}+excluded.{col}, {col_lvl}=xp_level({col}+excluded.{col}, ?4, ?5)
+                RETURNING xp_level({col}-?3, ?4, ?5), {col_lvl}''',
+                    (user_id, guild_id, amount, curve.base, curve.exponent)) as cursor:
+                old_level, level = await cursor.fetchone()
+        self.buffer.invalidate((user_id, guild_id))
+        return level if level > old_level else 0
 
-    # Suggestion d'amélioration : reset XP d'un utilisateur
-    async def reset_user(self, user_id: str, guild_id: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('DELETE FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
-            await db.commit()
-
-    async def log_xp_history(self, user_id: str, guild_id: str, mode: str, amount: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''CREATE TABLE IF NOT EXISTS xp_history (
-                user_id TEXT,
-                guild_id TEXT,
-                mode TEXT,
-                amount INTEGER,
-                timestamp INTEGER
-            )''')
-            import time
-            await db.execute('INSERT INTO xp_history (user_id, guild_id, mode, amount, timestamp) VALUES (?, ?, ?, ?, ?)',
-                             (user_id, guild_id, mode, amount, int(time.time())))
-            await db.commit()
-
-    async def get_xp_history(self, user_id: str, guild_id: str, mode: Optional[str] = None, limit: int = 20):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''CREATE TABLE IF NOT EXISTS xp_history (
-                user_id TEXT,
-                guild_id TEXT,
-                mode TEXT,
-                amount INTEGER,
-                timestamp INTEGER
-            )''')
-            if mode:
-                cursor = await db.execute('SELECT amount, timestamp, mode FROM xp_history WHERE user_id=? AND guild_id=? AND mode=? ORDER BY timestamp DESC LIMIT ?',
-                                          (user_id, guild_id, mode, limit))
+    async def get_notify_channel(self, guild_id: int) -> Optional[int]:
+        return (await self._guild_config(guild_id)).notify_channel
+
+    async def set_notify_channel(self, guild_id: int, channel_id: int):
+        await self._write_config(guild_id, '''INSERT INTO config (guild_id, notify_channel) VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET notify_channel=?''', (guild_id, channel_id, channel_id))
+
+    async def get_cooldown(self, guild_id: int) -> int:
+        return (await self._guild_config(guild_id)).cooldown
+
+    async def set_cooldown(self, guild_id: int, value: int):
+        await self._write_config(guild_id, '''INSERT INTO config (guild_id, cooldown) VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET cooldown=?''', (guild_id, value, value))
+
+    async def set_level_curve(self, guild_id: int, base: int, exponent: int) -> asyncio.Task:
+        """Change la courbe du serveur et lance le recalcul des niveaux de ses membres en arrière-plan."""
+        if self._migration_task is not None and not self._migration_task.done():
+            await self._migration_task
+        curve = LevelCurve(base, exponent)
+        await self._write_config(guild_id, '''INSERT INTO config (guild_id, level_base, level_exponent) VALUES (?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET level_base=excluded.level_base, level_exponent=excluded.level_exponent''',
+            (guild_id, curve.base, curve.exponent))
+        # Les gains suivants (tampon, flush) utilisent déjà la nouvelle courbe
+        self._set_curve(guild_id, curve)
+        return self.recalc_levels(guild_id)
+
+    def recalc_levels(self, guild_id: int) -> asyncio.Task:
+        # Un seul recalcul par serveur : un changement de courbe en cours de route le relance
+        running = self._recalc_tasks.get(guild_id)
+        if running is not None and not running.done():
+            running.cancel()
+        task = self._recalc_tasks[guild_id] = asyncio.create_task(self._recalc_levels(guild_id))
+        return task
+
+    async def _recalc_levels(self, guild_id: int) -> int:
+        started = time.perf_counter()
+        try:
+            updated = await recompute_levels(self.shards.pool_for(guild_id), guild_id, self.curve_for(guild_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[XPDatabase.recalc_levels] Erreur: {e}")
+            return 0
+        finally:
+            if self._recalc_tasks.get(guild_id) is asyncio.current_task():
+                del self._recalc_tasks[guild_id]
+        # Totaux en cache rechargés avec les niveaux réécrits
+        self.buffer.invalidate_guild(guild_id)
+        REGISTRY.query_latency.observe(time.perf_counter() - started, query='recalc_levels')
+        print(f"[XPDatabase] Niveaux du serveur {guild_id} recalculés : {updated} membres modifiés "
+              f"en {time.perf_counter() - started:.1f} s")
+        return updated
+
+    async def wait_level_recalc(self, guild_id: int):
+        task = self._recalc_tasks.get(guild_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _recalc_custom_curves(self, guild_ids):
+        # Les imports écrivent les niveaux de la courbe par défaut
+        for guild_id in guild_ids:
+            if guild_id in self.curves:
+                self.recalc_levels(guild_id)
+
+    async def get_member_stats(self, user_id: int, guild_id: int) -> MemberTotals:
+        """Toutes les statistiques d'un membre : depuis le cache des totaux, sinon en une seule requête.
+
+        L'objet renvoyé est celui du cache, tenu à jour par les gains suivants : à lire, pas à modifier.
+        """
+        return await self._member_totals(user_id, guild_id)
+
+    async def get_xp(self, user_id: int, guild_id: int, mode: str) -> int:
+        totals = await self.get_member_stats(user_id, guild_id)
+        return totals.text_xp if mode == 'text' else totals.voice_xp
+
+    async def get_level(self, user_id: int, guild_id: int, mode: str) -> int:
+        totals = await self.get_member_stats(user_id, guild_id)
+        return totals.text_level if mode == 'text' else totals.voice_level
+
+    async def get_messages(self, user_id: int, guild_id: int) -> int:
+        return (await self.get_member_stats(user_id, guild_id)).messages
+
+    async def get_voice_time(self, user_id: int, guild_id: int) -> int:
+        return (await self.get_member_stats(user_id, guild_id)).voice_time
+
+    async def get_leaderboard(self, guild_id: int, mode: str, limit: int = 10,
+                              after: Optional[Tuple[int, int]] = None, period: str = 'all') -> List[Tuple[int, int]]:
+        # Pagination par clé : after = (valeur, user_id) de la dernière ligne de la page précédente
+        col = LEADERBOARD_COLUMNS.get(mode, 'text_xp')
+        pool = self.shards.pool_for(guild_id)
+        if period in PERIODS:
+            return await self._period_leaderboard(pool, guild_id, col, PERIODS[period], limit, after)
+        if after is None:
+            rows = await self._fetchall('get_leaderboard', pool, f'SELECT user_id, {col} FROM xp WHERE guild_id=? ORDER BY {col} DESC, user_id DESC LIMIT ?',
+                                        (guild_id, limit))
+        else:
+            rows = await self._fetchall('get_leaderboard', pool, f'''SELECT user_id, {col} FROM xp WHERE guild_id=? AND ({col}, user_id) < (?, ?)
+                ORDER BY {col} DESC, user_id DESC LIMIT ?''', (guild_id, after[0], after[1], limit))
+        return [(int(row[0]), row[1]) for row in rows]
+
+    async def _period_leaderboard(self, pool: ConnectionPool, guild_id: int, col: str, period: int, limit: int,
+                                  after: Optional[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        # Même parcours d'index que le classement général, limité à la fenêtre en cours
+        bucket = period_start(period, int(time.time()))
+        if after is None:
+            rows = await self._fetchall('_period_leaderboard', pool, f'''SELECT user_id, {col} FROM xp_periods
+                WHERE period=? AND bucket=? AND guild_id=? AND {col} > 0 ORDER BY {col} DESC, user_id DESC LIMIT ?''',
+                (period, bucket, guild_id, limit))
+        else:
+            rows = await self._fetchall('_period_leaderboard', pool, f'''SELECT user_id, {col} FROM xp_periods
+                WHERE period=? AND bucket=? AND guild_id=? AND {col} > 0 AND ({col}, user_id) < (?, ?)
+                ORDER BY {col} DESC, user_id DESC LIMIT ?''', (period, bucket, guild_id, after[0], after[1], limit))
+        return [(int(row[0]), row[1]) for row in rows]
+
+    async def get_top(self, guild_id: int, mode: str, period: str = 'all') -> List[Tuple[int, int]]:
+        # Clé de cache des classements périodiques : (fenêtre, début), qui change d'elle-même à l'échéance
+        window = (PERIODS[period], period_start(PERIODS[period], int(time.time()))) if period in PERIODS else None
+        rows = self.scoreboard.get(guild_id, mode, window)
+        if rows is None:
+            rows = await self.get_leaderboard(guild_id, mode, self.scoreboard.size, period=period)
+            self.scoreboard.put(guild_id, mode, rows, window)
+        return rows
+
+    async def get_rank(self, user_id: int, guild_id: int, mode: str) -> Optional[Tuple[int, int]]:
+        # (rang, nombre de membres classés) par comptage sur l'index, sans trier le serveur
+        col = LEADERBOARD_COLUMNS.get(mode, 'text_xp')
+        # Rang en cache tant que la valeur du membre n'a pas bougé ; les autres membres ne comptent qu'au TTL
+        value = getattr(await self.get_member_stats(user_id, guild_id), col)
+        key = (guild_id, user_id, col)
+        cached = self.rank_cache.get(key)
+        if cached is not None and cached[0] == value and cached[2] > time.monotonic():
+            return cached[1]
+        row = await self._fetchone('get_rank', self.shards.pool_for(guild_id), f'''SELECT
+                (SELECT COUNT(*) FROM xp WHERE guild_id=?1 AND {col} > me.{col}) + 1,
+                (SELECT COUNT(*) FROM xp WHERE guild_id=?1)
+            FROM xp AS me WHERE me.guild_id=?1 AND me.user_id=?2''', (guild_id, user_id))
+        rank = (row[0], row[1]) if row else None
+        self.rank_cache.set(key, (value, rank, time.monotonic() + settings.RANK_TTL_SECONDS))
+        return rank
+
+    async def load_voice_sessions(self) -> List[Tuple[int, int, int, int, int]]:
+        rows = []
+        for pool in self.shards.pools:
+            rows += await self._fetchall('load_voice_sessions', pool, 'SELECT guild_id, user_id, channel_id, joined_at, credited_at FROM voice_sessions')
+        return [(int(row[0]), int(row[1]), row[2], row[3], row[4]) for row in rows]
+
+    async def save_voice_sessions(self, rows: List[Tuple[int, int, int, int, int]]):
+        for pool, shard_rows in self.shards.partition(rows, lambda row: row[0]).items():
+            async with pool.write() as db:
+                await db.executemany('''INSERT OR REPLACE INTO voice_sessions (guild_id, user_id, channel_id, joined_at, credited_at)
+                    VALUES (?, ?, ?, ?, ?)''', shard_rows)
+
+    async def touch_voice_sessions(self, rows: List[Tuple[int, int, int]]):
+        for pool, shard_rows in self.shards.partition(rows, lambda row: row[1]).items():
+            async with pool.write() as db:
+                await db.executemany('UPDATE voice_sessions SET credited_at=? WHERE guild_id=? AND user_id=?', shard_rows)
+
+    async def delete_voice_sessions(self, keys: List[Tuple[int, int]]):
+        for pool, shard_keys in self.shards.partition(keys, lambda key: key[0]).items():
+            async with pool.write() as db:
+                await db.executemany('DELETE FROM voice_sessions WHERE guild_id=? AND user_id=?', shard_keys)
+
+    async def set_notify_enabled(self, user_id: int, guild_id: int, enabled: bool):
+        await self._execute('set_notify_enabled', self.shards.pool_for(guild_id), '''INSERT INTO xp (user_id, guild_id, notify_enabled) VALUES (?, ?, ?)
+            ON CONFLICT(user_id, guild_id) DO UPDATE SET notify_enabled=?''', (user_id, guild_id, int(enabled), int(enabled)))
+        totals = self.buffer.peek_totals((user_id, guild_id))
+        if totals is not None:
+            totals.notify_enabled = enabled
+
+    async def get_notify_enabled(self, user_id: int, guild_id: int) -> bool:
+        return (await self.get_member_stats(user_id, guild_id)).notify_enabled
+
+    async def backup(self, guild_id: int, backup_path: str):
+        # Sauvegarde d'un seul serveur, lue dans son shard uniquement
+        await self.flush()
+        await self.shards.export_guild(guild_id, backup_path)
+
+    async def backup_to_buffer(self, guild_id: int, compress: bool = True) -> IO[bytes]:
+        # Sauvegarde vers un fichier temporaire puis copie (compressée) hors de la boucle d'évènements
+        path = temp_db_path()
+        try:
+            await self.backup(guild_id, path)
+            return await asyncio.to_thread(spool_file, path, compress)
+        finally:
+            os.remove(path)
+
+    async def import_db(self, import_path: str, policy: str = 'max', progress=None,
+                        guilds: Optional[Iterable[int]] = None) -> Dict[str, int]:
+        # Fusion par lots dans la base en service : le bot continue de répondre pendant l'import.
+        # guilds : serveurs à fusionner (import depuis Discord) ; None : toute la sauvegarde (outil hors ligne)
+        if self._migration_task is not None and not self._migration_task.done():
+            await self._migration_task
+        await self.flush()
+        path = temp_db_path()
+        try:
+            await asyncio.to_thread(unpack_file, import_path, path)
+            if len(self.shards.pools) == 1:
+                result = await merge_database(self.shards.default, path, policy, progress, guilds)
             else:
-                cursor = await db.execute('SELECT amount, timestamp, mode FROM xp_history WHERE user_id=? AND guild_id=? ORDER BY timestamp DESC LIMIT ?',
-                                          (user_id, guild_id, limit))
-            rows = await cursor.fetchall()
-            return [(row[0], row[1], row[2]) for row in rows] if rows else []
+                # Chaque shard ne reçoit que les serveurs qui lui reviennent
+                if guilds is None:
+                    async with aiosqlite.connect(f'file:{path}?mode=ro', uri=True) as source:
+                        guilds = await list_guilds(source)
+                result = {}
+                for pool, shard_guilds in self.shards.partition(set(guilds), lambda guild_id: guild_id).items():
+                    merged = await merge_database(pool, path, policy, progress, shard_guilds)
+                    for table, rows in merged.items():
+                        result[table] = result.get(table, 0) + rows
+        finally:
+            os.remove(path)
+        # Les totaux en cache sont rechargés depuis la base (les gains en attente y sont réappliqués)
+        self.buffer.invalidate_all()
+        self.scoreboard.clear()
+        self.rank_cache.clear()
+        self.config_cache.clear()
+        self.curves.clear()
+        await self.warm_config()
+        self._recalc_custom_curves(list(self.curves))
+        return result
+
+    async def import_legacy_json(self, xp_path: Optional[str] = None, config_path: Optional[str] = None,
+                                 guild_id: Optional[int] = None, progress=None,
+                                 offline: bool = False, all_guilds: bool = False) -> Dict[str, Dict[str, int]]:
+        # Fusion des anciens fichiers JSON ; le tampon est vidé d'abord pour comparer aux vrais totaux.
+        # offline : aucun bot ne lit la base (outil en ligne de commande), les index peuvent être reconstruits.
+        # La configuration n'est importée que pour guild_id, sauf all_guilds (outil en ligne de commande)
+        if config_path and not all_guilds and guild_id is None:
+            raise ValueError("guild_id requis pour importer la configuration d'un seul serveur")
+        await self.flush()
+        result = {}
+        if xp_path:
+            result['xp'] = await import_legacy_xp(self.shards.pool_for(guild_id), xp_path, guild_id, progress, offline)
+            self.buffer.invalidate_guild(guild_id)
+            self.scoreboard.invalidate_guild(guild_id)
+            self._recalc_custom_curves([guild_id])
+        if config_path:
+            result['config'] = await import_legacy_config(self.shards.pool_for, config_path, progress,
+                                                          None if all_guilds else [guild_id])
+            self.config_cache.clear()
+            await self.warm_config()
+        return result
+
+    # Suggestion d'amélioration : reset XP d'un utilisateur
+    async def reset_user(self, user_id: int, guild_id: int):
+        async with self._flush_lock:
+            self.buffer.discard((user_id, guild_id))
+            now = int(time.time())
+            async with self.shards.pool_for(guild_id).write() as db:
+                await db.execute('DELETE FROM xp WHERE user_id=? AND guild_id=?', (user_id, guild_id))
+                # Compteurs des fenêtres conservées, supprimés par clé primaire
+                await db.executemany('DELETE FROM xp_periods WHERE period=? AND bucket=? AND guild_id=? AND user_id=?',
+                                     [(period, period_start(period, now, back), guild_id, user_id)
+                                      for period in PERIODS.values() for back in range(settings.PERIOD_KEEP_BUCKETS)])
+        self.scoreboard.invalidate_guild(guild_id)
+
+    async def log_xp_history(self, user_id: int, guild_id: int, mode: str, amount: int):
+        pool = self.shards.pool_for(guild_id)
+        await self._execute('log_xp_history', pool, 'INSERT INTO xp_history (user_id, guild_id, mode, amount, timestamp) VALUES (?, ?, ?, ?, ?)',
+                            (user_id, guild_id, self._mode_param(pool, mode), amount, int(time.time())))
+
+    async def get_xp_history(self, user_id: int, guild_id: int, mode: Optional[str] = None, limit: int = 20):
+        # Évènements récents regroupés par heure, puis buckets déjà agrégés
+        pool = self.shards.pool_for(guild_id)
+        mode_filter = ' AND mode=?' if mode else ''
+        params = (guild_id, user_id, self._mode_param(pool, mode)) if mode else (guild_id, user_id)
+        rows = await self._fetchall('get_xp_history', pool, f'''SELECT SUM(amount), timestamp / {HOUR} * {HOUR} AS bucket, mode FROM xp_history
+                WHERE guild_id=? AND user_id=?{mode_filter} GROUP BY bucket, mode
+            UNION ALL
+            SELECT amount, bucket, mode FROM xp_history_rollup
+                WHERE guild_id=? AND user_id=?{mode_filter}
+            ORDER BY 2 DESC LIMIT ?''', params + params + (limit,))
+        return [(row[0], row[1], MODE_NAMES.get(row[2], row[2])) for row in rows] if rows else []
+
+    async def compact_history(self, now: Optional[int] = None):
+        # Pendant une migration, l'historique est recopié et ne doit être qu'alimenté : compactage au prochain passage
+        if self._migration_task is not None and not self._migration_task.done():
+            return
+        now = int(time.time()) if now is None else now
+        for pool in self.shards.pools:
+            await self._compact_shard(pool, now)
+
+    async def _compact_shard(self, pool: ConnectionPool, now: int):
+        # Évènements bruts -> buckets horaires, puis horaires -> journaliers
+        await self._rollup_chunks(pool, f'''INSERT INTO xp_history_rollup (guild_id, user_id, mode, granularity, bucket, amount)
+                SELECT guild_id, user_id, mode, {HOUR}, timestamp / {HOUR} * {HOUR}, SUM(amount) FROM xp_history
+                WHERE timestamp >= ?1 AND timestamp < ?2 GROUP BY guild_id, user_id, mode, timestamp / {HOUR}
+                ON CONFLICT DO UPDATE SET amount=amount+excluded.amount''',
+            'DELETE FROM xp_history WHERE timestamp >= ?1 AND timestamp < ?2',
+            'SELECT MIN(timestamp) FROM xp_history',
+            (now - settings.HISTORY_RAW_DAYS * DAY) // HOUR * HOUR)
+        await self._rollup_chunks(pool, f'''INSERT INTO xp_history_rollup (guild_id, user_id, mode, granularity, bucket, amount)
+                SELECT guild_id, user_id, mode, {DAY}, bucket / {DAY} * {DAY}, SUM(amount) FROM xp_history_rollup
+                WHERE granularity={HOUR} AND bucket >= ?1 AND bucket < ?2 GROUP BY guild_id, user_id, mode, bucket / {DAY}
+                ON CONFLICT DO UPDATE SET amount=amount+excluded.amount''',
+            f'DELETE FROM xp_history_rollup WHERE granularity={HOUR} AND bucket >= ?1 AND bucket < ?2',
+            f'SELECT MIN(bucket) FROM xp_history_rollup WHERE granularity={HOUR}',
+            (now - settings.HISTORY_HOURLY_DAYS * DAY) // DAY * DAY)
+        await self._execute('_compact_shard', pool, f'DELETE FROM xp_history_rollup WHERE granularity={DAY} AND bucket < ?',
+                            (now - settings.HISTORY_RETENTION_DAYS * DAY,))
+        await self.prune_periods(pool, now)
+
+    async def prune_periods(self, pool: ConnectionPool, now: int):
+        # Fenêtres expirées : suppression par plage sur le début de la clé primaire (period, bucket)
+        for period in PERIODS.values():
+            cutoff = period_start(period, now, max(1, settings.PERIOD_KEEP_BUCKETS) - 1)
+            await self._execute('prune_periods', pool, 'DELETE FROM xp_periods WHERE period=? AND bucket < ?', (period, cutoff))
+
+    async def _rollup_chunks(self, pool: ConnectionPool, rollup_sql: str, delete_sql: str, oldest_sql: str, cutoff: int):
+        # Une transaction par tranche de temps pour ne pas bloquer l'écrivain longtemps
+        chunk = max(1, settings.HISTORY_COMPACTION_CHUNK_HOURS) * HOUR
+        row = await self._fetchone('_rollup_chunks', pool, oldest_sql)
+        start = row[0] if row and row[0] is not None else cutoff
+        start = start // HOUR * HOUR
+        while start < cutoff:
+            end = min(start + chunk, cutoff)
+            async with pool.write() as db:
+                await db.execute(rollup_sql, (start, end))
+                await db.execute(delete_sql, (start, end))
+            start = end
+            await asyncio.sleep(0)
+
+
+class RemoteXPDatabase(XPDatabase):
+    """Base vue d'un worker du lanceur multi-processus.
+
+    Les lectures passent directement par les lecteurs WAL des fichiers ; les écritures sont confiées
+    au processus de stockage (cogs.xp_core.ipc), seul à ouvrir un écrivain. Les gains restent
+    regroupés dans le tampon du worker et partent en un lot par flush.
+    """
+
+    read_only = True
+
+    def __init__(self, bot, db_path=DB_PATH, socket_path: str = settings.STORAGE_SOCKET, **kwargs):
+        super().__init__(bot, db_path, **kwargs)
+        self.storage = StorageClient(socket_path)
+        # Lots préparés mais pas encore confirmés, renvoyés tels quels (même identifiant) après une coupure ;
+        # leurs deltas restent comptés dans les totaux rechargés jusqu'à la confirmation
+        self._outbox: Deque[Tuple[str, Dict, Tuple[List[Tuple], ...]]] = deque()
+
+    @property
+    def pending_batches(self) -> int:
+        return len(self._outbox)
+
+    async def init(self):
+        if self.shards.is_open:
+            return
+        started = time.perf_counter()
+        # Le processus de stockage écoute dès son lancement : attente sans limite de sa migration,
+        # XP_STORAGE_CONNECT_WAIT_SECONDS ne borne que son absence
+        await self.storage.wait_ready(wait=settings.STORAGE_CONNECT_WAIT_SECONDS)
+        await self.shards.open()
+        for pool in self.shards.pools:
+            async with pool.read() as db:
+                self.versions[pool] = max(await get_version(db), 1)
+        await self.warm_config()
+        self.init_seconds = time.perf_counter() - started
+
+    async def close(self):
+        try:
+            if self.shards.is_open:
+                await self.flush()
+        except Exception as e:
+            print(f"[RemoteXPDatabase.close] Erreur: {e} ({len(self._outbox)} lots non écrits)")
+        await asyncio.gather(*self._recalc_tasks.values(), return_exceptions=True)
+        await self.storage.close()
+        await self.shards.close()
+
+    async def flush(self):
+        async with self._flush_lock:
+            pending = self.buffer.drain()
+            if pending:
+                self.buffer.begin(pending)
+                self._outbox.append((uuid.uuid4().hex, pending, self.buffer.rows(pending)))
+            while self._outbox:
+                batch_id, batch, rows = self._outbox[0]
+                await self.storage.call('write_rows', batch_id, *rows)
+                self._outbox.popleft()
+                self.buffer.commit(batch)
+
+    async def add_message(self, user_id: int, guild_id: int):
+        await self.storage.call('add_message', user_id, guild_id)
+        self.buffer.invalidate((user_id, guild_id))
+
+    async def add_voice_time(self, user_id: int, guild_id: int, minutes: int):
+        await self.storage.call('add_voice_time', user_id, guild_id, minutes)
+        self.buffer.invalidate((user_id, guild_id))
+
+    async def add_xp(self, user_id: int, guild_id: int, amount: int, mode: str) -> int:
+        level = await self.storage.call('add_xp', user_id, guild_id, amount, mode)
+        self.buffer.invalidate((user_id, guild_id))
+        return level
+
+    async def log_xp_history(self, user_id: int, guild_id: int, mode: str, amount: int):
+        await self.storage.call('log_xp_history', user_id, guild_id, mode, amount)
+
+    async def set_notify_channel(self, guild_id: int, channel_id: int):
+        await self.storage.call('set_notify_channel', guild_id, channel_id)
+        self.config_cache.pop(guild_id)
+
+    async def set_cooldown(self, guild_id: int, value: int):
+        await self.storage.call('set_cooldown', guild_id, value)
+        self.config_cache.pop(guild_id)
+
+    async def set_level_curve(self, guild_id: int, base: int, exponent: int) -> asyncio.Task:
+        await self.storage.call('set_level_curve', guild_id, base, exponent)
+        self._set_curve(guild_id, LevelCurve(base, exponent))
+        return self.recalc_levels(guild_id)
+
+    async def _recalc_levels(self, guild_id: int) -> int:
+        # Recalcul fait par le processus de stockage ; le worker recharge ensuite ses totaux
+        try:
+            await self.storage.call('wait_level_recalc', guild_id, timeout=None)
+        except StorageError as e:
+            print(f"[RemoteXPDatabase.recalc_levels] Erreur: {e}")
+        finally:
+            if self._recalc_tasks.get(guild_id) is asyncio.current_task():
+                del self._recalc_tasks[guild_id]
+        self.buffer.invalidate_guild(guild_id)
+        return 0
+
+    async def set_notify_enabled(self, user_id: int, guild_id: int, enabled: bool):
+        await self.storage.call('set_notify_enabled', user_id, guild_id, enabled)
+        totals = self.buffer.peek_totals((user_id, guild_id))
+        if totals is not None:
+            totals.notify_enabled = enabled
+
+    async def reset_user(self, user_id: int, guild_id: int):
+        # Lots en attente envoyés d'abord : ils ne doivent pas réapparaître après la remise à zéro
+        await self.flush()
+        async with self._flush_lock:
+            self.buffer.discard((user_id, guild_id))
+            await self.storage.call('reset_user', user_id, guild_id)
+        self.scoreboard.invalidate_guild(guild_id)
+
+    async def save_voice_sessions(self, rows: List[Tuple[int, int, int, int, int]]):
+        if rows:
+            await self.storage.call('save_voice_sessions', rows)
+
+    async def touch_voice_sessions(self, rows: List[Tuple[int, int, int]]):
+        if rows:
+            await self.storage.call('touch_voice_sessions', rows)
+
+    async def delete_voice_sessions(self, keys: List[Tuple[int, int]]):
+        if keys:
+            await self.storage.call('delete_voice_sessions', keys)
+
+    async def backup(self, guild_id: int, backup_path: str):
+        await self.flush()
+        await self.storage.call('backup', guild_id, backup_path, timeout=None)
+
+    async def import_db(self, import_path: str, policy: str = 'max', progress=None,
+                        guilds: Optional[Iterable[int]] = None) -> Dict[str, int]:
+        # La progression est affichée par le processus de stockage
+        await self.flush()
+        result = await self.storage.call('import_db', import_path, policy, None,
+                                         None if guilds is None else list(guilds), timeout=None)
+        self.buffer.invalidate_all()
+        self.scoreboard.clear()
+        self.rank_cache.clear()
+        self.config_cache.clear()
+        self.curves.clear()
+        await self.warm_config()
+        return result
+
+    async def import_legacy_json(self, xp_path: Optional[str] = None, config_path: Optional[str] = None,
+                                 guild_id: Optional[int] = None, progress=None) -> Dict[str, Dict[str, int]]:
+        await self.flush()
+        result = await self.storage.call('import_legacy_json', xp_path, config_path, guild_id, timeout=None)
+        if xp_path:
+            self.buffer.invalidate_guild(guild_id)
+            self.scoreboard.invalidate_guild(guild_id)
+        if config_path:
+            self.config_cache.clear()
+            await self.warm_config()
+        return result
 
-async def setup(bot):
-    await bot.add_cog(XPDatabase(bot))
+    async def compact_history(self, now: Optional[int] = None):
+        # Compactage planifié par le processus de stockage, une seule fois pour tous les workers
+        return
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import signal
+import sys
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+# Lanceur multi-processus : un processus de stockage (seul écrivain SQLite) et BOT_WORKERS workers
+# AutoShardedBot, chacun sur une plage disjointe des BOT_SHARD_COUNT shards Discord.
+# Un worker qui s'arrête est relancé seul ; les autres shards restent connectés.
+#
+#   python launcher.py            (réglages BOT_WORKERS, BOT_SHARD_COUNT, XP_STORAGE_SOCKET dans .env)
+
+load_dotenv()
+WORKERS = max(1, int(os.getenv('BOT_WORKERS', '') or os.cpu_count() or 1))
+SHARD_COUNT = max(WORKERS, int(os.getenv('BOT_SHARD_COUNT', '0') or 0))
+STORAGE_SOCKET = os.path.abspath(os.getenv('XP_STORAGE_SOCKET') or 'xp_storage.sock')
+# Base ouverte par XPCog (cogs.xp_db.DB_PATH)
+DB_PATH = 'xp_data.db'
+# Délai avant de relancer un processus arrêté, doublé à chaque arrêt rapproché
+RESTART_DELAY_SECONDS = float(os.getenv('BOT_RESTART_DELAY_SECONDS', '5'))
+RESTART_MAX_DELAY_SECONDS = float(os.getenv('BOT_RESTART_MAX_DELAY_SECONDS', '300'))
+STOP_TIMEOUT_SECONDS = float(os.getenv('BOT_STOP_TIMEOUT_SECONDS', '30'))
+
+
+def shard_ranges(shard_count: int, workers: int) -> List[List[int]]:
+    """Plages contiguës de shards, les premières avec un shard de plus si la division ne tombe pas juste."""
+    size, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Supervisor:
+    def __init__(self):
+        self.processes: Dict[str, asyncio.subprocess.Process] = {}
+        self.stopping = asyncio.Event()
+
+    async def run(self, name: str, args: List[str], env: Dict[str, str]):
+        delay = RESTART_DELAY_SECONDS
+        while not self.stopping.is_set():
+            started = asyncio.get_running_loop().time()
+            process = self.processes[name] = await asyncio.create_subprocess_exec(sys.executable, *args, env=env)
+            code = await process.wait()
+            if self.stopping.is_set():
+                return
+            # Un processus resté en vie plus longtemps que le délai maximal repart avec le délai initial
+            delay = RESTART_DELAY_SECONDS if asyncio.get_running_loop().time() - started > RESTART_MAX_DELAY_SECONDS else delay
+            print(f"[launcher] {name} arrêté (code {code}), relance dans {delay:.0f} s")
+            try:
+                await asyncio.wait_for(self.stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, RESTART_MAX_DELAY_SECONDS)
+
+    async def stop(self, names: List[str]):
+        processes = [self.processes[name] for name in names if name in self.processes]
+        for process in processes:
+            if process.returncode is None:
+                process.terminate()
+        for process in processes:
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                process.kill()
+
+
+async def main():
+    supervisor = Supervisor()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, supervisor.stopping.set)
+    env = dict(os.environ, XP_STORAGE_SOCKET=STORAGE_SOCKET)
+    runners = [asyncio.create_task(supervisor.run('storage', ['-m', 'cogs.xp_core.ipc', '--db', DB_PATH,
+                                                              '--socket', STORAGE_SOCKET], env))]
+    metrics_port = int(os.getenv('XP_METRICS_PORT', '0') or 0)
+    workers = []
+    for index, shard_ids in enumerate(shard_ranges(SHARD_COUNT, WORKERS)):
+        worker_env = dict(env, BOT_SHARD_IDS=','.join(map(str, shard_ids)), BOT_SHARD_COUNT=str(SHARD_COUNT))
+        if metrics_port:
+            # Un port de métriques par worker
+            worker_env['XP_METRICS_PORT'] = str(metrics_port + index)
+        name = f'worker{index} (shards {shard_ids[0]}-{shard_ids[-1]})'
+        workers.append(name)
+        # Les workers attendent le socket du stockage (XP_STORAGE_CONNECT_WAIT_SECONDS), puis la fin de sa migration
+        runners.append(asyncio.create_task(supervisor.run(name, ['bot.py'], worker_env)))
+    print(f"[launcher] {WORKERS} workers, {SHARD_COUNT} shards, stockage sur {STORAGE_SOCKET}")
+    await supervisor.stopping.wait()
+    # Workers d'abord : ils envoient leurs derniers gains au stockage avant qu'il ne ferme la base
+    await supervisor.stop(workers)
+    await supervisor.stop(['storage'])
+    await asyncio.gather(*runners, return_exceptions=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+import asyncio
+
+from cogs.xp_core.admission import AdmissionController
+
+
+class Ledger:
+    """Règlement simulé : crédite chaque entrée comme _settle_deferred, échoue ou bloque à la demande."""
+
+    def __init__(self):
+        self.credited = {}
+        self.fail_at = None
+        self.block_at = None
+        self.blocked = asyncio.Event()
+
+    async def settle(self, items):
+        for index, (key, entry) in enumerate(items):
+            if index == self.fail_at:
+                self.fail_at = None
+                raise RuntimeError("base indisponible")
+            if index == self.block_at:
+                self.block_at = None
+                self.blocked.set()
+                await asyncio.Event().wait()
+            self.credited[key] = self.credited.get(key, 0) + entry.text_xp + entry.voice_xp
+            entry.text_xp = entry.messages = entry.voice_xp = entry.voice_time = 0
+
+
+def _controller(ledger, **kwargs) -> AdmissionController:
+    return AdmissionController(ledger.settle, **kwargs)
+
+
+def test_deferred_gains_are_folded_per_member():
+    controller = _controller(Ledger())
+    controller.defer(1, 2, 'text', 5, messages=1, channel_id=7)
+    controller.defer(1, 2, 'voice', 10, voice_time=1)
+    controller.defer(1, 2, 'text', 5, messages=1)
+    entry = controller.backlog[(1, 2)]
+    assert (entry.text_xp, entry.voice_xp, entry.messages, entry.voice_time, entry.channel_id) == (10, 10, 2, 1, 7)
+    assert controller.deferred == 3
+
+
+def test_full_backlog_sheds_new_members_only():
+    controller = _controller(Ledger(), backlog_size=1)
+    assert controller.defer(1, 1, 'text', 5)
+    assert not controller.defer(1, 2, 'text', 5)
+    assert controller.defer(1, 1, 'text', 5)
+    assert (controller.shed, controller.shed_xp) == (1, 5)
+
+
+def test_admit_respects_inflight_limit():
+    controller = _controller(Ledger(), max_inflight=2)
+    assert controller.admit() and controller.admit()
+    assert not controller.admit()
+    controller.release()
+    assert controller.admit()
+
+
+def test_partial_failure_requeues_only_unsettled_entries():
+    async def scenario():
+        ledger = Ledger()
+        controller = _controller(ledger, settle_chunk=10)
+        for user_id in range(5):
+            controller.defer(1, user_id, 'text', 5)
+        ledger.fail_at = 2
+        assert not await controller._settle_chunk()
+        assert sorted(controller.backlog) == [(1, 2), (1, 3), (1, 4)]
+        assert controller.settled == 2
+        assert await controller._settle_chunk()
+        return ledger.credited, controller
+
+    credited, controller = asyncio.run(scenario())
+    # Chaque membre crédité une seule fois
+    assert credited == {(1, user_id): 5 for user_id in range(5)}
+    assert controller.settled == 5 and not controller.backlog
+
+
+def test_close_settles_the_chunk_interrupted_by_cancellation():
+    async def scenario():
+        ledger = Ledger()
+        controller = _controller(ledger, settle_chunk=10, interval=0.01)
+        for user_id in range(5):
+            controller.defer(1, user_id, 'text', 5)
+        ledger.block_at = 3
+        controller.start()
+        await asyncio.wait_for(ledger.blocked.wait(), 5)
+        # Arrêt pendant un règlement : la tâche est annulée au milieu de la tranche
+        await controller.close()
+        return ledger.credited, controller
+
+    credited, controller = asyncio.run(scenario())
+    assert credited == {(1, user_id): 5 for user_id in range(5)}
+    assert not controller.backlog and controller.settled == 5
+
+
+def test_discard_drops_pending_gains():
+    controller = _controller(Ledger())
+    controller.defer(1, 2, 'text', 5)
+    controller.discard(1, 2)
+    assert not controller.backlog
@@ -0,0 +1,139 @@
+import asyncio
+
+from cogs.xp_core.buffer import MemberTotals, WriteBuffer
+from cogs.xp_core.levels import DEFAULT_CURVE
+from cogs.xp_db import XPDatabase
+
+
+def _buffer(**kwargs) -> WriteBuffer:
+    return WriteBuffer(lambda guild_id: DEFAULT_CURVE, **kwargs)
+
+
+def test_add_folds_gains_per_member():
+    buffer = _buffer()
+    totals = MemberTotals()
+    buffer.add((1, 10), totals, 'text', 30, messages=1, now=100)
+    buffer.add((1, 10), totals, 'text', 30, messages=1, now=160)
+    buffer.add((1, 10), totals, 'voice', 20, voice_time=2, now=170)
+    assert list(buffer.pending) == [(1, 10)]
+    delta = buffer.pending[(1, 10)]
+    assert (delta.text_xp, delta.messages, delta.voice_xp, delta.voice_time) == (60, 2, 20, 2)
+    assert (delta.text_ts, delta.voice_ts) == (160, 170)
+    assert buffer.events == 3
+    xp_rows, history_rows, _, _ = buffer.rows(buffer.pending)
+    assert len(xp_rows) == 1
+    assert sorted(row[2:4] for row in history_rows) == [('text', 60), ('voice', 20)]
+
+
+def test_add_reports_level_up_once():
+    buffer = _buffer()
+    totals = MemberTotals()
+    assert buffer.add((1, 10), totals, 'text', 49) == 0
+    assert buffer.add((1, 10), totals, 'text', 1) == 2
+    assert buffer.add((1, 10), totals, 'text', 1) == 0
+    assert totals.text_level == 2
+
+
+def test_restore_merges_failed_batch_back():
+    buffer = _buffer()
+    totals = MemberTotals()
+    buffer.add((1, 10), totals, 'text', 5, messages=1)
+    batch = buffer.drain()
+    buffer.begin(batch)
+    assert buffer.in_flight((1, 10)) and not buffer.pending
+    buffer.add((1, 10), totals, 'text', 7, messages=1)
+    buffer.restore(batch)
+    assert not buffer.inflight
+    delta = buffer.pending[(1, 10)]
+    assert (delta.text_xp, delta.messages) == (12, 2)
+
+
+def test_load_totals_counts_pending_and_inflight_deltas():
+    buffer = _buffer()
+    totals = MemberTotals()
+    buffer.add((1, 10), totals, 'text', 100)
+    batch = buffer.drain()
+    buffer.begin(batch)
+    buffer.add((1, 10), totals, 'text', 50)
+    # Ligne relue pendant l'écriture du lot : ni le lot ni les nouveaux gains n'y sont encore
+    reloaded = buffer.load_totals((1, 10), (0, 0, 0, 0, 1, 1, 1))
+    assert reloaded.text_xp == 150
+    assert reloaded.text_level == DEFAULT_CURVE.level_for_xp(150)
+    buffer.commit(batch)
+    assert not buffer.in_flight((1, 10)) and buffer.commits == 1
+
+
+def test_eviction_keeps_members_with_unwritten_gains():
+    buffer = _buffer(max_totals=2)
+    buffer.add((1, 10), buffer.load_totals((1, 10), None), 'text', 5)
+    for user_id in range(2, 6):
+        buffer.load_totals((user_id, 10), None)
+    assert (1, 10) in buffer.totals
+    assert len(buffer.totals) == 2
+
+
+def test_flush_race_keeps_drained_deltas_visible(tmp_path):
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            await db.record_xp(1, 10, 5, 'text', messages=1)
+            await db.flush()
+            await db.record_xp(1, 10, 5, 'text', messages=1)
+            pool = db.shards.pool_for(10)
+            release = asyncio.Event()
+
+            async def hold():
+                async with pool.write():
+                    await release.wait()
+
+            # Écrivain occupé : le flush suivant reste bloqué avec son lot drainé
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0.05)
+            flush = asyncio.create_task(db.flush())
+            await asyncio.sleep(0.05)
+            # Totaux expirés : le prochain gain relit la ligne, qui ne contient pas encore le lot
+            db.buffer.totals[(1, 10)].loaded_at -= 10 ** 6
+            await db.record_xp(1, 10, 5, 'text', messages=1)
+            release.set()
+            await holder
+            await flush
+            await db.flush()
+            stats = await db.get_member_stats(1, 10)
+            async with pool.read() as conn:
+                async with conn.execute('SELECT text_xp, messages FROM xp WHERE user_id=1 AND guild_id=10') as cursor:
+                    row = await cursor.fetchone()
+            return (stats.text_xp, stats.messages), tuple(row)
+        finally:
+            await db.close()
+
+    cached, stored = asyncio.run(scenario())
+    assert cached == stored == (15, 3)
+
+
+def test_cached_totals_are_reloaded_after_the_ttl(tmp_path):
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            await db.record_xp(1, 10, 40, 'text', messages=1)
+            await db.flush()
+            # Écriture faite hors de ce processus (autre worker, outil en ligne de commande)
+            async with db.shards.pool_for(10).write() as conn:
+                await conn.execute('UPDATE xp SET text_xp=500 WHERE user_id=1 AND guild_id=10')
+            cached = (await db.get_member_stats(1, 10)).text_xp
+            db.buffer.totals[(1, 10)].loaded_at -= db.buffer.ttl + 1
+            reloaded = (await db.get_member_stats(1, 10)).text_xp
+            # Le gain suivant s'ajoute aux totaux relus
+            await db.record_xp(1, 10, 5, 'text')
+            gained = (await db.get_member_stats(1, 10)).text_xp
+            # Gain en attente : les totaux en mémoire restent la référence même expirés
+            async with db.shards.pool_for(10).write() as conn:
+                await conn.execute('UPDATE xp SET text_xp=1000 WHERE user_id=1 AND guild_id=10')
+            db.buffer.totals[(1, 10)].loaded_at -= db.buffer.ttl + 1
+            pending = (await db.get_member_stats(1, 10)).text_xp
+            return cached, reloaded, gained, pending
+        finally:
+            await db.close()
+
+    assert asyncio.run(scenario()) == (40, 500, 505, 505)
@@ -0,0 +1,46 @@
+from cogs.xp_core.cooldown import CooldownTracker
+
+
+def test_acquire_reserves_member_until_commit():
+    tracker = CooldownTracker(bucket_seconds=10)
+    assert tracker.acquire((1, 2), 100.0)
+    # Lecture du cooldown en cours : un second message du même membre est ignoré
+    assert not tracker.acquire((1, 2), 100.5)
+    tracker.commit((1, 2), 30, 100.0)
+    assert not tracker.acquire((1, 2), 129.0)
+    assert tracker.acquire((1, 2), 130.0)
+    assert tracker.stats()['suppressed'] == 2
+
+
+def test_release_cancels_reservation():
+    tracker = CooldownTracker()
+    assert tracker.acquire((1, 2), 100.0)
+    tracker.release((1, 2))
+    assert tracker.acquire((1, 2), 100.1)
+
+
+def test_zero_cooldown_frees_member_immediately():
+    tracker = CooldownTracker()
+    assert tracker.acquire((1, 2), 100.0)
+    tracker.commit((1, 2), 0, 100.0)
+    assert (1, 2) not in tracker.expires
+    assert tracker.acquire((1, 2), 100.0)
+
+
+def test_expired_entries_are_purged_by_bucket():
+    tracker = CooldownTracker(bucket_seconds=10)
+    for user_id in range(5):
+        tracker.acquire((1, user_id), 100.0)
+        tracker.commit((1, user_id), 5, 100.0)
+    tracker.acquire((1, 99), 200.0)
+    tracker.commit((1, 99), 5, 200.0)
+    assert list(tracker.expires) == [(1, 99)]
+
+
+def test_clear_guild_only_touches_that_guild():
+    tracker = CooldownTracker()
+    tracker.acquire((1, 1), 100.0)
+    tracker.acquire((2, 1), 100.0)
+    tracker.clear_guild(1)
+    assert tracker.acquire((1, 1), 100.0)
+    assert not tracker.acquire((2, 1), 100.0)
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from cogs.xp_core.ipc import StorageClient, StorageError, StorageServer
+from cogs.xp_db import XPDatabase
+
+
+def _with_storage(tmp_path, body, ready: bool = True):
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        server = StorageServer(db, str(tmp_path / 'storage.sock'))
+        client = StorageClient(str(tmp_path / 'storage.sock'))
+        await server.start()
+        try:
+            await db.init()
+            if ready:
+                server.ready.set()
+            return await body(db, server, client)
+        finally:
+            await client.close()
+            await server.close()
+            await db.close()
+
+    return asyncio.run(scenario())
+
+
+def _gated_writes(db, failures: int):
+    # write_rows bloqué jusqu'à release ; les failures premières écritures échouent
+    release = asyncio.Event()
+    calls = []
+    write_rows = db.write_rows
+
+    async def gated(*rows):
+        calls.append(rows)
+        await release.wait()
+        if len(calls) <= failures:
+            raise RuntimeError("disque plein")
+        return await write_rows(*rows)
+
+    db.write_rows = gated
+    return release, calls
+
+
+def _batch(db):
+    # Lot préparé comme par un worker : un gain de 40 XP
+    totals = db.buffer.load_totals((1, 10), None)
+    db.buffer.add((1, 10), totals, 'text', 40, messages=1)
+    rows = db.buffer.rows(db.buffer.drain())
+    db.buffer.invalidate_all()
+    return rows
+
+
+def test_resent_batch_is_applied_once(tmp_path):
+    async def body(db, server, client):
+        rows = _batch(db)
+        await client.call('write_rows', 'batch-1', *rows)
+        # Réponse perdue : le worker renvoie le même lot avec le même identifiant
+        await client.call('write_rows', 'batch-1', *rows)
+        await client.call('write_rows', 'batch-2', *rows)
+        return (await db.get_member_stats(1, 10)).text_xp, server.batches, server.duplicates
+
+    assert _with_storage(tmp_path, body) == (80, 2, 1)
+
+
+def test_resend_during_the_write_waits_for_it(tmp_path):
+    async def body(db, server, client):
+        release, calls = _gated_writes(db, failures=0)
+        rows = _batch(db)
+        first = asyncio.create_task(client.call('write_rows', 'batch-1', *rows))
+        await asyncio.sleep(0.05)
+        # Renvoi pendant l'écriture : pas de seconde écriture, la réponse attend la première
+        resend = asyncio.create_task(client.call('write_rows', 'batch-1', *rows))
+        await asyncio.sleep(0.05)
+        assert not resend.done()
+        release.set()
+        await asyncio.gather(first, resend)
+        return len(calls), (await db.get_member_stats(1, 10)).text_xp, server.batches, server.duplicates
+
+    assert _with_storage(tmp_path, body) == (1, 40, 1, 1)
+
+
+def test_failed_write_fails_the_resend_and_is_retried(tmp_path):
+    async def body(db, server, client):
+        release, calls = _gated_writes(db, failures=1)
+        rows = _batch(db)
+        first = asyncio.create_task(client.call('write_rows', 'batch-1', *rows))
+        await asyncio.sleep(0.05)
+        resend = asyncio.create_task(client.call('write_rows', 'batch-1', *rows))
+        await asyncio.sleep(0.05)
+        release.set()
+        outcomes = await asyncio.gather(first, resend, return_exceptions=True)
+        assert all(isinstance(outcome, StorageError) and 'disque plein' in str(outcome) for outcome in outcomes)
+        # Identifiant oublié après l'échec : le renvoi suivant écrit le lot
+        await client.call('write_rows', 'batch-1', *rows)
+        return len(calls), (await db.get_member_stats(1, 10)).text_xp, server.batches
+
+    assert _with_storage(tmp_path, body) == (2, 40, 1)
+
+
+def test_operations_outside_the_whitelist_are_refused(tmp_path):
+    async def body(db, server, client):
+        await client.call('close')
+
+    with pytest.raises(StorageError):
+        _with_storage(tmp_path, body)
+
+
+def test_not_ready_storage_refuses_writes(tmp_path):
+    async def body(db, server, client):
+        assert await client.call('ready') is False
+        with pytest.raises(StorageError):
+            await client.call('set_cooldown', 10, 5)
+        # wait_ready patiente tant que le processus répond, au-delà du délai de connexion
+        waiter = asyncio.create_task(client.wait_ready(wait=0))
+        await asyncio.sleep(1.5)
+        assert not waiter.done()
+        server.ready.set()
+        await asyncio.wait_for(waiter, 5)
+        await client.call('set_cooldown', 10, 5)
+        return await db.get_cooldown(10)
+
+    assert _with_storage(tmp_path, body, ready=False) == 5
+
+
+def test_unreachable_storage_fails_after_wait(tmp_path):
+    async def scenario():
+        client = StorageClient(str(tmp_path / 'missing.sock'))
+        await client.wait_ready(wait=0)
+
+    with pytest.raises(StorageError):
+        asyncio.run(scenario())
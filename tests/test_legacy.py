@@ -0,0 +1,103 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from cogs.xp_core import settings
+from cogs.xp_core.legacy import iter_json_object
+from cogs.xp_db import XPDatabase
+
+SAMPLES = [
+    '{}',
+    ' { "a" : 1 , "b":[1,2,{"c":"}"}], "d": 12345678901234567890 } ',
+    '{"x":{"y":"\\u00e9\\"}"}, "z": -1.5e3, "t": true, "n": null}',
+    '{"123456789012345678": {"text": 10, "voice": 2}}\n',
+]
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+@pytest.mark.parametrize('read_size', [1, 2, 3, 7, 1000])
+def test_streaming_parser_matches_json_loads(text, read_size):
+    # Petits tampons : clés, chaînes et nombres coupés à toutes les positions
+    assert list(iter_json_object(io.StringIO(text), read_size)) == list(json.loads(text).items())
+
+
+@pytest.mark.parametrize('text', ['[1]', '{"a" 1}', '{"a":1 "b":2}', '{"a":', '{"a":1,'])
+def test_streaming_parser_rejects_invalid_json(text):
+    with pytest.raises(ValueError):
+        list(iter_json_object(io.StringIO(text), 2))
+
+
+def test_streaming_parser_is_lazy():
+    class Source(io.StringIO):
+        reads = 0
+
+        def read(self, size=-1):
+            Source.reads += 1
+            return super().read(size)
+
+    pairs = iter_json_object(Source('{' + ','.join(f'"{i}": {i}' for i in range(1000)) + '}'), 16)
+    assert next(pairs) == ('0', 0)
+    assert Source.reads < 5
+
+
+def test_import_is_idempotent_and_keeps_the_max(tmp_path):
+    xp_path = tmp_path / 'xp_data.json'
+    xp_path.write_text(json.dumps({
+        '1': {'text': 100, 'voice': 10, 'messages': 5, 'voice_time': 2},
+        '2': {'text': 3},
+        'bogus': {'text': 1},
+    }))
+    config_path = tmp_path / 'xp_config.json'
+    config_path.write_text(json.dumps({'10': {'cooldown': 15, 'notify_channel': 55}}))
+
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            await db.set_cooldown(10, 60)
+            await db.record_xp(2, 10, 500, 'text')
+            first = await db.import_legacy_json(str(xp_path), str(config_path), 10)
+            await db.import_legacy_json(str(xp_path), str(config_path), 10)
+            one = await db.get_member_stats(1, 10)
+            two = await db.get_member_stats(2, 10)
+            return (first, (one.text_xp, one.voice_xp, one.messages, one.text_level), two.text_xp,
+                    await db.get_cooldown(10), await db.get_notify_channel(10))
+        finally:
+            await db.close()
+
+    first, one, two, cooldown, channel = asyncio.run(scenario())
+    assert first['xp'] == {'rows': 2, 'skipped': 1}
+    assert one == (100, 10, 5, 2)
+    assert two == 500
+    # Configuration en base plus récente : seul le salon manquant est complété
+    assert (cooldown, channel) == (60, 55)
+
+
+def test_config_import_keeps_only_the_target_guild(tmp_path, monkeypatch):
+    # Lots d'une entrée : un lot entièrement écarté ne doit pas arrêter l'import
+    monkeypatch.setattr(settings, 'LEGACY_IMPORT_BATCH', 1)
+    config_path = tmp_path / 'xp_config.json'
+    config_path.write_text(json.dumps({
+        '20': {'cooldown': 5, 'notify_channel': 66},
+        '10': {'cooldown': 15, 'notify_channel': 55},
+        '30': {'cooldown': 7},
+    }))
+
+    async def scenario(**options):
+        db = XPDatabase(None, str(tmp_path / f"xp_{len(options)}.db"))
+        await db.init()
+        try:
+            result = await db.import_legacy_json(None, str(config_path), 10, **options)
+            return result['config'], [(await db.get_cooldown(g), await db.get_notify_channel(g)) for g in (10, 20, 30)]
+        finally:
+            await db.close()
+
+    stats, configs = asyncio.run(scenario())
+    assert stats == {'rows': 1, 'skipped': 2}
+    assert configs[0] == (15, 55)
+    assert configs[1][1] is None and configs[2][1] is None
+    stats, configs = asyncio.run(scenario(all_guilds=True))
+    assert stats == {'rows': 3, 'skipped': 0}
+    assert configs == [(15, 55), (5, 66), (7, None)]
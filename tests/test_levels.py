@@ -0,0 +1,89 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from cogs.xp_core.levels import DEFAULT_CURVE, MAX_TABLE_LEVEL, LevelCurve, curve_level
+from cogs.xp_core.recalc import recompute_levels
+from cogs.xp_db import XPDatabase
+
+
+def _loop_level(xp_total: int, base: int = 50, exponent: int = 2) -> int:
+    # Boucle d'origine de XPDatabase.add_xp / XPStorage.add_xp, généralisée aux courbes personnalisées
+    level = 1
+    while xp_total >= base * level ** exponent:
+        level += 1
+    return level
+
+
+def test_closed_form_matches_the_original_loop():
+    for xp_total in list(range(0, 20000)) + [50 * n * n + delta for n in range(1, 2000, 37) for delta in (-1, 0, 1)]:
+        assert DEFAULT_CURVE.level_for_xp(xp_total) == _loop_level(xp_total)
+
+
+@pytest.mark.parametrize('base, exponent', [(1, 1), (10, 1), (7, 3), (100, 4), (100000, 2)])
+def test_custom_curves_match_the_loop(base, exponent):
+    curve = LevelCurve(base, exponent)
+    for level in range(1, 60):
+        threshold = base * (level - 1) ** exponent
+        for xp_total in (threshold - 1, threshold, threshold + 1):
+            if xp_total >= 0:
+                assert curve.level_for_xp(xp_total) == _loop_level(xp_total, base, exponent)
+    assert curve.levels_for([0, base, base * 2 ** exponent]) == [curve.level_for_xp(xp) for xp in (0, base, base * 2 ** exponent)]
+
+
+def test_threshold_table_and_progress():
+    curve = LevelCurve(30, 3)
+    assert curve.thresholds[1] == 0 and len(curve.thresholds) == MAX_TABLE_LEVEL + 2
+    for level in (1, 2, 10, MAX_TABLE_LEVEL + 1, MAX_TABLE_LEVEL + 2, 5000):
+        assert curve.xp_for_level(level) == 30 * (level - 1) ** 3
+    assert DEFAULT_CURVE.level_progress(120) == (2, 70, 150)
+    assert DEFAULT_CURVE.xp_to_next_level(120) == 80
+    assert DEFAULT_CURVE.level_for_xp(-5) == 1
+
+
+def test_sql_function_uses_the_server_curve():
+    conn = sqlite3.connect(':memory:')
+    conn.create_function('xp_level', -1, curve_level, deterministic=True)
+    assert conn.execute('SELECT xp_level(200), xp_level(200, 10, 1), xp_level(NULL)').fetchone() == (3, 21, 1)
+    assert LevelCurve(None, None) == DEFAULT_CURVE and DEFAULT_CURVE.is_default
+
+
+def test_curve_change_recomputes_the_server_levels(tmp_path):
+    curve = LevelCurve(10, 1)
+    amounts = {user_id: user_id * 37 for user_id in range(1, 8)}
+
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            for user_id, amount in amounts.items():
+                await db.record_xp(user_id, 10, amount, 'text')
+                await db.record_xp(user_id, 10, amount // 2, 'voice')
+            await db.record_xp(1, 20, 200, 'text')
+            await db.flush()
+            updated = await (await db.set_level_curve(10, 10, 1))
+            cached = await db.get_level(3, 10, 'text')
+            # Tranches de 3 membres : tout est déjà à jour, rien n'est réécrit
+            again = await recompute_levels(db.shards.default, 10, curve, chunk=3)
+        finally:
+            await db.close()
+        # Courbe rechargée au redémarrage
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            reloaded = await db.get_level(3, 10, 'text')
+        finally:
+            await db.close()
+        with sqlite3.connect(tmp_path / 'xp.db') as conn:
+            levels = dict(((row[0], row[1]), row[2:]) for row in conn.execute('SELECT guild_id, user_id, text_level, voice_level FROM xp'))
+        return updated, cached, again, reloaded, levels
+
+    updated, cached, again, reloaded, levels = asyncio.run(scenario())
+    assert updated == len(amounts)
+    assert again == 0
+    assert cached == reloaded == curve.level_for_xp(amounts[3])
+    for user_id, amount in amounts.items():
+        assert levels[(10, user_id)] == (curve.level_for_xp(amount), curve.level_for_xp(amount // 2))
+    # Les autres serveurs gardent la courbe par défaut
+    assert levels[(20, 1)] == (DEFAULT_CURVE.level_for_xp(200), 1)
@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+import time
+
+from cogs.xp_core import settings
+from cogs.xp_core.migrations import LATEST_VERSION
+from cogs.xp_db import XPDatabase
+
+USERS = 60
+GUILDS = ('1', '2', '3')
+
+
+def _create_v1(path: str, now: int):
+    # Schéma d'origine : identifiants en texte, pas de version, historique brut
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE xp (user_id TEXT, guild_id TEXT, text_xp INTEGER DEFAULT 0, voice_xp INTEGER DEFAULT 0,
+        messages INTEGER DEFAULT 0, voice_time INTEGER DEFAULT 0, text_level INTEGER DEFAULT 1,
+        voice_level INTEGER DEFAULT 1, notify_enabled INTEGER DEFAULT 1, PRIMARY KEY (user_id, guild_id))''')
+    conn.execute('CREATE TABLE config (guild_id TEXT PRIMARY KEY, cooldown INTEGER DEFAULT 30, notify_channel INTEGER)')
+    conn.execute('CREATE TABLE xp_history (user_id TEXT, guild_id TEXT, mode TEXT, amount INTEGER, timestamp INTEGER)')
+    for user_id in range(USERS):
+        for guild_id in GUILDS:
+            conn.execute('INSERT INTO xp (user_id, guild_id, text_xp, voice_xp, messages) VALUES (?, ?, 100, 40, 10)',
+                         (str(user_id), guild_id))
+            conn.execute("INSERT INTO xp_history VALUES (?, ?, 'text', 100, ?)", (str(user_id), guild_id, now - 60))
+            conn.execute("INSERT INTO xp_history VALUES (?, ?, 'voice', 40, ?)", (str(user_id), guild_id, now - 60))
+    conn.execute("INSERT INTO config VALUES ('1', 12, 555)")
+    conn.commit()
+    conn.close()
+
+
+def test_v1_to_latest_with_concurrent_writes(tmp_path, monkeypatch):
+    # Petites tranches : la copie passe par plusieurs transactions et par les triggers de recopie
+    monkeypatch.setattr(settings, 'MIGRATION_CHUNK_ROWS', 7)
+    path = str(tmp_path / 'xp.db')
+    _create_v1(path, int(time.time()))
+
+    async def scenario():
+        db = XPDatabase(None, path)
+        await db.init()
+        live = {}
+        try:
+            # Gains reçus pendant la migration, y compris de membres absents de l'ancienne base
+            i = 0
+            while not db._migration_task.done():
+                user_id, guild_id = i % (USERS + 10), 1 + i % 3
+                await db.record_xp(user_id, guild_id, 5, 'text', messages=1)
+                live[(user_id, guild_id)] = live.get((user_id, guild_id), 0) + 5
+                if i % 10 == 0:
+                    await db.flush()
+                i += 1
+                await asyncio.sleep(0)
+            await db._migration_task
+            await db.flush()
+            totals = {}
+            for user_id in range(USERS + 10):
+                for guild_id in (1, 2, 3):
+                    totals[(user_id, guild_id)] = (await db.get_member_stats(user_id, guild_id)).text_xp
+            return db.schema_version, live, totals, await db.get_cooldown(1), await db.get_notify_channel(1)
+        finally:
+            await db.close()
+
+    version, live, totals, cooldown, channel = asyncio.run(scenario())
+    assert version == LATEST_VERSION
+    for (user_id, guild_id), text_xp in totals.items():
+        assert text_xp == (100 if user_id < USERS else 0) + live.get((user_id, guild_id), 0)
+    assert (cooldown, channel) == (12, 555)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION
+    assert conn.execute('SELECT DISTINCT typeof(user_id), typeof(guild_id) FROM xp').fetchall() == [('integer', 'integer')]
+    assert conn.execute('SELECT DISTINCT typeof(mode) FROM xp_history').fetchall() == [('integer',)]
+    # Fenêtres reconstruites depuis l'historique : XP d'origine + gains reçus pendant la migration
+    week = conn.execute('SELECT SUM(text_xp), SUM(voice_xp) FROM xp_periods WHERE period=0').fetchone()
+    assert week == (100 * USERS * len(GUILDS) + sum(live.values()), 40 * USERS * len(GUILDS))
+    conn.close()
+
+
+def test_latest_schema_is_created_fresh(tmp_path):
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            return db.schema_version, db._migration_task
+        finally:
+            await db.close()
+
+    version, task = asyncio.run(scenario())
+    assert version == LATEST_VERSION
+    assert task is None or task.done()
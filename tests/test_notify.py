@@ -0,0 +1,108 @@
+import asyncio
+
+from cogs.xp_core.notify import MESSAGE_LIMIT, LevelUp, LevelUpDispatcher
+
+ROLES = {5: 55, 10: 100, 20: 200}
+
+
+class Role:
+    def __init__(self, role_id: int):
+        self.id = role_id
+        self.mention = f'<@&{role_id}>'
+
+
+class Guild:
+    def get_role(self, role_id: int):
+        # Rôle supprimé du serveur : ignoré
+        return Role(role_id) if role_id != 404 else None
+
+
+class Channel:
+    def __init__(self, channel_id: int = 1):
+        self.id = channel_id
+        self.guild = Guild()
+        self.sent = []
+
+    async def send(self, content: str):
+        self.sent.append(content)
+
+
+class Member:
+    def __init__(self, member_id: int, roles=(), fail: bool = False):
+        self.id = member_id
+        self.mention = f'<@{member_id}>'
+        self.roles = [Role(role_id) for role_id in roles]
+        self.fail = fail
+        self.calls = 0
+
+    async def add_roles(self, *roles):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("Missing Permissions")
+        self.roles.extend(roles)
+
+    @property
+    def role_ids(self):
+        return sorted(role.id for role in self.roles)
+
+
+def _run(events, roles=ROLES, queue_size: int = 100):
+    async def scenario():
+        dispatcher = LevelUpDispatcher(dict(roles), queue_size=queue_size, window=0.01)
+        dispatcher.start()
+        results = [dispatcher.submit(event) for event in events]
+        await dispatcher.close()
+        return dispatcher, results
+
+    return asyncio.run(scenario())
+
+
+def test_skipped_milestones_are_granted():
+    channel, member = Channel(), Member(1)
+    # Gain groupé : du niveau 3 au niveau 12 d'un coup
+    _run([LevelUp(channel, member, 12, True)])
+    assert member.role_ids == [55, 100]
+    assert member.calls == 1
+    assert channel.sent == ["🎉 <@1> passe niveau 12 en texte !\n<@1> a débloqué le rôle <@&55> !\n"
+                            "<@1> a débloqué le rôle <@&100> !"]
+
+
+def test_owned_and_deleted_roles_are_not_granted_again():
+    channel = Channel()
+    owner = Member(1, roles=[55, 100])
+    _run([LevelUp(channel, owner, 11, False)], roles={5: 55, 10: 100, 11: 404})
+    assert owner.calls == 0 and owner.role_ids == [55, 100]
+    assert channel.sent == []
+
+
+def test_batch_keeps_highest_level_per_member_and_isolates_failures():
+    channel = Channel()
+    failing, member = Member(1, fail=True), Member(2)
+    _run([LevelUp(channel, failing, 5, True), LevelUp(channel, member, 4, True), LevelUp(channel, member, 10, True)])
+    assert member.role_ids == [55, 100] and member.calls == 1
+    # Échec d'un membre : l'annonce part quand même, sans rôle annoncé
+    assert len(channel.sent) == 1
+    assert "🎉 <@1> passe niveau 5 en texte !" in channel.sent[0]
+    assert "<@&55> !" not in channel.sent[0].split('<@2>')[0]
+    assert "🎉 <@2> passe niveau 10 en texte !" in channel.sent[0]
+
+
+def test_full_queue_still_grants_missing_roles():
+    channel = Channel()
+    members = [Member(1), Member(2), Member(3, roles=[55])]
+    dispatcher, accepted = _run([LevelUp(channel, members[0], 2, True), LevelUp(channel, members[1], 7, True),
+                                 LevelUp(channel, members[2], 6, True)], queue_size=1)
+    assert accepted == [True, False, False]
+    assert dispatcher.stats()['dropped'] == 2
+    # Paliers franchis attribués sans annonce ; rien à faire pour un membre qui a déjà ses rôles
+    assert members[1].role_ids == [55]
+    assert members[2].calls == 0
+    assert channel.sent == ["🎉 <@1> passe niveau 2 en texte !"]
+
+
+def test_long_batches_are_split_under_the_message_limit():
+    channel = Channel()
+    _run([LevelUp(channel, Member(user_id), 2, True) for user_id in range(200)], queue_size=500)
+    assert len(channel.sent) > 1
+    assert all(len(message) <= MESSAGE_LIMIT for message in channel.sent)
+    assert sum(message.count('🎉') for message in channel.sent) == 200
@@ -0,0 +1,70 @@
+import asyncio
+import calendar
+import sqlite3
+import time
+
+from cogs.xp_core.periods import PERIODS, period_start
+from cogs.xp_db import XPDatabase
+
+WEEK, MONTH = PERIODS['week'], PERIODS['month']
+
+
+def _utc(*date) -> int:
+    return calendar.timegm(date + (0,) * (6 - len(date)))
+
+
+def test_weeks_start_on_monday_utc():
+    monday = _utc(2024, 1, 1)
+    assert period_start(WEEK, _utc(2024, 1, 3, 15, 30)) == monday
+    assert period_start(WEEK, monday) == monday
+    assert period_start(WEEK, monday - 1) == _utc(2023, 12, 25)
+    assert period_start(WEEK, _utc(2024, 1, 7, 23, 59, 59), back=2) == _utc(2023, 12, 18)
+
+
+def test_months_follow_the_calendar():
+    assert period_start(MONTH, _utc(2024, 3, 15, 12)) == _utc(2024, 3, 1)
+    assert period_start(MONTH, _utc(2024, 3, 1)) == _utc(2024, 3, 1)
+    # Février bissextile, puis passage à l'année précédente
+    assert period_start(MONTH, _utc(2024, 3, 1) - 1) == _utc(2024, 2, 1)
+    assert period_start(MONTH, _utc(2024, 1, 20), back=2) == _utc(2023, 11, 1)
+
+
+def test_period_leaderboard_reads_the_current_window_and_old_windows_are_pruned(tmp_path):
+    now = int(time.time())
+    current = period_start(WEEK, now)
+    stale = [period_start(WEEK, now, back) for back in (1, 2)]
+
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            # Semaines précédentes : ignorées par le classement de la semaine, la plus ancienne est purgée
+            async with db.shards.default.write() as conn:
+                await conn.executemany('INSERT INTO xp_periods (period, bucket, guild_id, user_id, text_xp) VALUES (?, ?, 10, 3, 900)',
+                                       [(WEEK, bucket) for bucket in stale])
+            await db.record_xp(1, 10, 50, 'text', messages=1)
+            await db.record_xp(2, 10, 80, 'text', messages=2)
+            await db.record_xp(1, 10, 40, 'text', messages=1)
+            await db.record_xp(2, 11, 500, 'text')
+            await db.flush()
+            weekly = await db.get_leaderboard(10, 'text', period='week')
+            monthly = await db.get_top(10, 'text', period='month')
+            second_page = await db.get_leaderboard(10, 'text', 1, after=(90, 1), period='week')
+            overall = await db.get_leaderboard(10, 'text')
+            await db.prune_periods(db.shards.default, now)
+        finally:
+            await db.close()
+        with sqlite3.connect(tmp_path / 'xp.db') as conn:
+            buckets = sorted({row[0] for row in conn.execute('SELECT bucket FROM xp_periods WHERE period=?', (WEEK,))})
+            messages = conn.execute('SELECT messages FROM xp_periods WHERE period=? AND guild_id=10 AND user_id=1',
+                                    (MONTH,)).fetchone()[0]
+        return weekly, monthly, second_page, overall, buckets, messages
+
+    weekly, monthly, second_page, overall, buckets, messages = asyncio.run(scenario())
+    assert weekly == [(1, 90), (2, 80)]
+    assert monthly == [(1, 90), (2, 80)]
+    assert second_page == [(2, 80)]
+    assert overall[0] == (1, 90)
+    assert messages == 2
+    # PERIOD_KEEP_BUCKETS=2 : la semaine en cours et la précédente sont conservées
+    assert buckets == [stale[0], current]
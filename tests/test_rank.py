@@ -0,0 +1,33 @@
+import asyncio
+
+from cogs.xp_db import XPDatabase
+
+
+def test_rank_counts_members_ahead_on_the_index(tmp_path):
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            # 15 membres : le classement dépasse le top 10 de l'ancienne implémentation
+            for user_id in range(1, 16):
+                await db.record_xp(user_id, 10, user_id * 10, 'text')
+            await db.record_xp(99, 10, 50, 'text')
+            await db.record_xp(1, 20, 1000, 'text')
+            await db.flush()
+            ranks = {user_id: await db.get_rank(user_id, 10, 'text') for user_id in (15, 5, 99, 1)}
+            missing = await db.get_rank(12345, 10, 'text')
+            # Gain du membre : son rang en cache est recalculé
+            await db.record_xp(1, 10, 1000, 'text')
+            await db.flush()
+            climbed = await db.get_rank(1, 10, 'text')
+            return ranks, missing, climbed
+        finally:
+            await db.close()
+
+    ranks, missing, climbed = asyncio.run(scenario())
+    assert ranks[15] == (1, 16)
+    # Ex æquo : même rang, compté sur les membres strictement devant
+    assert ranks[5] == ranks[99] == (11, 16)
+    assert ranks[1] == (16, 16)
+    assert missing is None
+    assert climbed == (1, 16)
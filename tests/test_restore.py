@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from cogs.xp_core.restore import POLICIES
+from cogs.xp_db import XPDatabase
+
+
+async def _open(path) -> XPDatabase:
+    db = XPDatabase(None, str(path))
+    await db.init()
+    return db
+
+
+def _merge(tmp_path, policy: str):
+    async def scenario():
+        # Sauvegarde : 100 XP texte pour le membre 1, 7 pour le membre 2 absent de la base en service
+        source = await _open(tmp_path / 'source.db')
+        try:
+            await source.record_xp(1, 10, 100, 'text', messages=4)
+            await source.record_xp(2, 10, 7, 'text', messages=1)
+            await source.set_cooldown(10, 45)
+            await source.flush()
+            await source.backup(10, str(tmp_path / 'backup.db'))
+        finally:
+            await source.close()
+        target = await _open(tmp_path / f'{policy}.db')
+        try:
+            await target.record_xp(1, 10, 300, 'text', messages=2)
+            await target.set_cooldown(10, 20)
+            result = await target.import_db(str(tmp_path / 'backup.db'), policy)
+            first = await target.get_member_stats(1, 10)
+            second = await target.get_member_stats(2, 10)
+            return result, (first.text_xp, first.messages), (second.text_xp, second.messages), await target.get_cooldown(10)
+        finally:
+            await target.close()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('policy, expected, cooldown', [
+    ('replace', (100, 4), 45),
+    ('max', (300, 4), 20),
+    ('sum', (400, 6), 20),
+])
+def test_merge_policies(tmp_path, policy, expected, cooldown):
+    result, first, second, merged_cooldown = _merge(tmp_path, policy)
+    assert first == expected
+    # Configuration en service conservée, sauf en remplacement
+    assert merged_cooldown == cooldown
+    # Membre absent de la base en service : inséré tel quel quelle que soit la politique
+    assert second == (7, 1)
+    assert result['xp'] == 2
+
+
+def test_every_policy_is_covered():
+    assert set(POLICIES) == {'replace', 'max', 'sum'}
+
+
+def test_unknown_policy_is_rejected(tmp_path):
+    async def scenario():
+        db = await _open(tmp_path / 'xp.db')
+        try:
+            await db.backup(10, str(tmp_path / 'backup.db'))
+            await db.import_db(str(tmp_path / 'backup.db'), 'average')
+        finally:
+            await db.close()
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('shard_count', [1, 3])
+def test_import_keeps_only_the_requested_guilds(tmp_path, shard_count):
+    async def scenario():
+        # Base source avec deux serveurs : l'import depuis le serveur 10 ne touche pas au serveur 20
+        source = await _open(tmp_path / 'source.db')
+        try:
+            await source.record_xp(1, 10, 100, 'text')
+            await source.record_xp(1, 20, 200, 'text')
+            await source.set_cooldown(20, 5)
+        finally:
+            await source.close()
+        target = XPDatabase(None, str(tmp_path / 'target.db'), shard_count=shard_count)
+        await target.init()
+        try:
+            await target.set_cooldown(20, 90)
+            await target.import_db(str(tmp_path / 'source.db'), 'replace', guilds=[10])
+            scoped = ((await target.get_member_stats(1, 10)).text_xp, (await target.get_member_stats(1, 20)).text_xp,
+                      await target.get_cooldown(20))
+            # Outil hors ligne : toute la sauvegarde
+            await target.import_db(str(tmp_path / 'source.db'), 'replace')
+            return scoped, ((await target.get_member_stats(1, 20)).text_xp, await target.get_cooldown(20))
+        finally:
+            await target.close()
+
+    scoped, everything = asyncio.run(scenario())
+    assert scoped == (100, 0, 90)
+    assert everything == (200, 5)
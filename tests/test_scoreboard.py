@@ -0,0 +1,61 @@
+import asyncio
+
+from cogs.xp_core.buffer import MemberTotals
+from cogs.xp_core.scoreboard import ScoreboardCache
+from cogs.xp_db import XPDatabase
+
+
+def _totals(text_xp: int) -> MemberTotals:
+    return MemberTotals(text_xp=text_xp)
+
+
+def test_observe_keeps_the_top_sorted_and_bounded():
+    cache = ScoreboardCache(size=3, ttl=60)
+    cache.put(1, 'text', [(10, 300), (11, 200), (12, 100)])
+    # Gain d'un membre déjà classé, puis entrée d'un nouveau membre, puis membre trop bas
+    cache.observe(1, 12, _totals(250))
+    cache.observe(1, 13, _totals(260))
+    cache.observe(1, 14, _totals(5))
+    assert cache.get(1, 'text') == [(10, 300), (13, 260), (12, 250)]
+    # Égalité : départage par user_id décroissant, comme l'index
+    cache.observe(1, 15, _totals(300))
+    assert cache.get(1, 'text')[:2] == [(15, 300), (10, 300)]
+
+
+def test_entries_expire_and_are_invalidated_per_guild():
+    cache = ScoreboardCache(size=3, ttl=-1)
+    cache.put(1, 'text', [(10, 1)])
+    assert cache.get(1, 'text') is None
+    cache = ScoreboardCache(size=3, ttl=60)
+    cache.put(1, 'text', [(10, 1)])
+    cache.put(1, 'voice', [(10, 1)], period=(0, 123))
+    cache.put(2, 'text', [(10, 1)])
+    cache.invalidate_guild(1)
+    assert cache.get(1, 'text') is None and cache.get(1, 'voice', (0, 123)) is None
+    assert cache.get(2, 'text') == [(10, 1)]
+
+
+def test_top_follows_buffered_gains_and_pages_by_key(tmp_path):
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            for user_id in range(1, 31):
+                await db.record_xp(user_id, 10, user_id, 'text')
+            await db.flush()
+            first = await db.get_top(10, 'text')
+            # Gain pas encore écrit : le top en cache est mis à jour sans relecture
+            await db.record_xp(1, 10, 1000, 'text')
+            updated = await db.get_top(10, 'text')
+            await db.flush()
+            page = await db.get_leaderboard(10, 'text', 5)
+            next_page = await db.get_leaderboard(10, 'text', 5, after=page[-1])
+            return first, updated, page, next_page
+        finally:
+            await db.close()
+
+    first, updated, page, next_page = asyncio.run(scenario())
+    assert first[0] == (30, 30)
+    assert updated[0] == (1, 1001)
+    assert [row[0] for row in page] == [1, 30, 29, 28, 27]
+    assert [row[0] for row in next_page] == [26, 25, 24, 23, 22]
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sqlite3
+from collections import Counter
+
+from cogs.xp_core.shards import ShardRouter, jump_hash, parse_guild_list
+from cogs.xp_db import XPDatabase
+
+GUILDS = [100000000000000000 + guild_id * 7919 for guild_id in range(40)]
+
+
+def test_jump_hash_stays_in_range():
+    for buckets in (1, 2, 5, 16):
+        assert {jump_hash(guild_id, buckets) for guild_id in GUILDS} <= set(range(buckets))
+    assert all(jump_hash(guild_id, 1) == 0 for guild_id in GUILDS)
+
+
+def test_jump_hash_only_moves_keys_to_the_new_bucket():
+    keys = range(1, 5001)
+    for buckets in (1, 2, 3, 7):
+        for key in keys:
+            before, after = jump_hash(key, buckets), jump_hash(key, buckets + 1)
+            assert after in (before, buckets)
+    # Environ 1/(N+1) des clés changent de shard
+    moved = sum(jump_hash(key, 4) != jump_hash(key, 5) for key in keys)
+    assert 800 < moved < 1200
+
+
+def test_jump_hash_is_balanced():
+    counts = Counter(jump_hash(key, 4) for key in range(1, 8001))
+    assert min(counts.values()) > 1700
+
+
+def test_router_paths_and_dedicated_guilds(tmp_path):
+    path = str(tmp_path / 'xp.db')
+    router = ShardRouter(path, 3, dedicated=[GUILDS[0]])
+    assert router.pool_for(GUILDS[0]).db_path == str(tmp_path / f'xp.guild{GUILDS[0]}.db')
+    index = jump_hash(GUILDS[1], 3)
+    assert router.pool_for(GUILDS[1]).db_path == (path if index == 0 else str(tmp_path / f'xp.shard{index}.db'))
+    assert router.layout == f'3:{GUILDS[0]}'
+    assert parse_guild_list(' 1, 2,,3 ') == [1, 2, 3]
+
+
+def _guilds_in(path: str):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute('SELECT DISTINCT guild_id FROM xp')}
+    finally:
+        conn.close()
+
+
+def test_rebalance_moves_each_guild_to_its_shard(tmp_path):
+    path = str(tmp_path / 'xp.db')
+
+    async def open_db(count, dedicated=()):
+        db = XPDatabase(None, path, shard_count=count, dedicated_guilds=list(dedicated))
+        await db.init()
+        return db
+
+    async def totals(db):
+        return {guild_id: (await db.get_member_stats(1, guild_id)).text_xp for guild_id in GUILDS}
+
+    async def scenario():
+        db = await open_db(1)
+        for guild_id in GUILDS:
+            await db.record_xp(1, guild_id, guild_id % 1000, 'text')
+        await db.close()
+        expected = {guild_id: guild_id % 1000 for guild_id in GUILDS}
+
+        db = await open_db(3, [GUILDS[0]])
+        try:
+            assert await totals(db) == expected
+            layout = {pool.db_path: _guilds_in(pool.db_path) for pool in db.shards.pools}
+            for guild_id in GUILDS:
+                assert guild_id in layout[db.shards.pool_for(guild_id).db_path]
+            assert layout[str(tmp_path / f'xp.guild{GUILDS[0]}.db')] == {GUILDS[0]}
+            assert sum(len(guilds) for guilds in layout.values()) == len(GUILDS)
+        finally:
+            await db.close()
+
+        # Retour à un seul fichier : les shards devenus inutiles sont vidés puis supprimés
+        db = await open_db(1)
+        try:
+            assert await totals(db) == expected
+        finally:
+            await db.close()
+        assert _guilds_in(path) == set(GUILDS)
+        assert not [name for name in os.listdir(tmp_path) if '.shard' in name or '.guild' in name]
+
+    asyncio.run(scenario())
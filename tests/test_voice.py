@@ -0,0 +1,72 @@
+import asyncio
+
+from cogs.xp_core import settings
+from cogs.xp_core.voice import VoiceTracker
+from cogs.xp_db import XPDatabase
+
+T0 = 1_700_000_000
+
+
+def _run(tmp_path, body):
+    async def scenario():
+        db = XPDatabase(None, str(tmp_path / 'xp.db'))
+        await db.init()
+        try:
+            return await body(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(scenario())
+
+
+def test_whole_minutes_are_credited_and_seconds_carried_over(tmp_path):
+    async def body(db):
+        voice = VoiceTracker(db)
+        await voice.join(10, 1, 500, now=T0)
+        await voice.sweep(now=T0 + 150)
+        after_sweep = (await db.get_member_stats(1, 10)).voice_time
+        # Les 30 s restantes comptent dans la minute suivante
+        await voice.leave(10, 1, now=T0 + 180)
+        stats = await db.get_member_stats(1, 10)
+        return after_sweep, stats.voice_time, stats.voice_xp, await db.load_voice_sessions()
+
+    after_sweep, minutes, voice_xp, sessions = _run(tmp_path, body)
+    assert after_sweep == 2
+    assert minutes == 3 and voice_xp == 3 * settings.VOICE_XP_PER_MINUTE
+    assert sessions == []
+
+
+def test_move_credits_then_keeps_the_session(tmp_path):
+    async def body(db):
+        voice = VoiceTracker(db)
+        await voice.join(10, 1, 500, now=T0)
+        await voice.move(10, 1, 600, now=T0 + 120)
+        return (await db.get_member_stats(1, 10)).voice_time, await db.load_voice_sessions()
+
+    minutes, sessions = _run(tmp_path, body)
+    assert minutes == 2
+    assert sessions == [(10, 1, 600, T0, T0 + 120)]
+
+
+def test_long_gap_is_capped(tmp_path):
+    async def body(db):
+        voice = VoiceTracker(db)
+        await voice.join(10, 1, 500, now=T0)
+        # Bot arrêté plusieurs heures : le trou est plafonné
+        await voice.sweep(now=T0 + 6 * 3600)
+        return (await db.get_member_stats(1, 10)).voice_time
+
+    assert _run(tmp_path, body) == settings.VOICE_MAX_CREDIT_MINUTES
+
+
+def test_sync_restores_persisted_sessions_and_drops_departed_members(tmp_path):
+    async def body(db):
+        await VoiceTracker(db).join(10, 1, 500, now=T0)
+        await VoiceTracker(db).join(10, 2, 500, now=T0)
+        await VoiceTracker(db).join(20, 3, 700, now=T0)
+        # Redémarrage : le membre 2 est parti, le membre 4 est arrivé ; le serveur 20 est servi ailleurs
+        voice = VoiceTracker(db)
+        await voice.sync({(10, 1): 500, (10, 4): 800}, now=T0 + 60, guild_ids={10})
+        return {key: (session.joined_at, session.channel_id) for key, session in voice.sessions.items()}
+
+    assert _run(tmp_path, body) == {(10, 1): (T0, 500), (10, 4): (T0 + 60, 800)}